@@ -1,3 +1,4 @@
+import heapq
 import math
 from mesa import Agent
 from posts import *
@@ -5,9 +6,60 @@ from enums import *
 import numpy as np
 
 
+class Beliefs:
+    """
+    Dict-like view {str(Topic): belief} onto the row of one agent in the model's belief array.
+    Like this, all beliefs are stored in one (compact) array instead of one dict per agent.
+    Each change is reported to the model's KPITracker, which keeps the online KPIs up to date.
+    """
+    __slots__ = ('array', 'agent_id', 'kpis')
+
+    TOPIC_INDICES = {str(topic): topic.value for topic in Topic}
+
+    def __init__(self, array, agent_id, kpis=None):
+        """
+        :param array:       np.ndarray, (n_agents, n_topics) belief array of the model
+        :param agent_id:    int, row of the agent
+        :param kpis:        KPITracker or None
+        """
+        self.array = array
+        self.agent_id = agent_id
+        self.kpis = kpis
+
+    def __getitem__(self, topic):
+        return self.array.item(self.agent_id, self.TOPIC_INDICES[topic])
+
+    def __setitem__(self, topic, value):
+        topic_index = self.TOPIC_INDICES[topic]
+        if self.kpis is None:
+            self.array[self.agent_id, topic_index] = value
+        else:
+            old_value = self.array.item(self.agent_id, topic_index)
+            self.array[self.agent_id, topic_index] = value
+            self.kpis.update(topic_index, old_value, self.array.item(self.agent_id, topic_index))
+
+    def __iter__(self):
+        return iter(self.TOPIC_INDICES)
+
+    def __len__(self):
+        return len(self.TOPIC_INDICES)
+
+    def items(self):
+        return [(topic, self[topic]) for topic in self.TOPIC_INDICES]
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
 class BaseAgent(Agent):
     """Most simple agent to start with."""
 
+    # Fixed, compact layout. (Only the attributes of mesa's Agent remain in an instance dict.)
+    __slots__ = ('beliefs', 'media_literacy', 'vocality_mu', 'vocality_sigma', 'received_posts')
+
+    # Whether this agent type updates its beliefs (i.e., whether it reads its received posts)
+    updates_beliefs = False
+
     def __init__(self, unique_id, model):
         """
         :param unique_id: int
@@ -15,15 +67,31 @@ class BaseAgent(Agent):
         """
         super().__init__(unique_id, model)
 
-        self.beliefs = {}
+        self.beliefs = Beliefs(model.belief_array, unique_id, model.kpis)
         self.init_beliefs()
         self.media_literacy = MediaLiteracy.LOW
 
-        self.vocality = {}
-        self.followers = []
-        self.following = []
-        self.received_posts = []
-        self.last_posts = []  # currently: all posts
+        # Vocality parameters, used to sample nr of posts
+        self.vocality_mu = 0.0
+        self.vocality_sigma = 0.0
+        self.received_posts = []  # [Post], with a bounded feed: heap of (visibility, post_id, Post),
+        # in the aggregated exposure mode: [(PostBatch, n_accepted_posts)]
+
+    @property
+    def followers(self):
+        """
+        The followers of this agent (as agent ids). Zero-copy view into the model's network.
+        :return: np.ndarray of ints
+        """
+        return self.model.network.followers(self.unique_id)
+
+    @property
+    def following(self):
+        """
+        The accounts this agent is following (as agent ids). Zero-copy view into the model's network.
+        :return: np.ndarray of ints
+        """
+        return self.model.network.following(self.unique_id)
 
     # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
     #   Step function: in two Stages.
@@ -37,8 +105,8 @@ class BaseAgent(Agent):
             nr_of_posts: int
         """
 
-        mu = self.vocality['mu']
-        sigma = self.vocality['sigma']
+        mu = self.vocality_mu
+        sigma = self.vocality_sigma
 
         current_belief = self.beliefs[str(Topic.VAX)]
         if current_belief < 15 or current_belief > 85:
@@ -66,18 +134,87 @@ class BaseAgent(Agent):
         nr_of_posts = self.sample_number_of_posts()
         posts = []
 
+        # Aggregated exposure mode: all posts of this tick as one PostBatch
+        if self.model.aggregated_exposure:
+            if nr_of_posts > 0:
+                self.share_post_batch(nr_of_posts)
+            return
+
         # Create posts
         for i in range(nr_of_posts):
             post = self.create_post()
             posts.append(post)
             # print(f'post value: {post.stances[str(Topic.VAX)]}')
 
-        # Share post to followers
-        for follower in self.followers:
-            follower.received_posts += posts
-
-        # Save own posts
-        self.last_posts += posts
+        # Save own posts (only their stances are needed later on)
+        for post in posts:
+            self.record_post(post)
+
+        # Share post to followers (only agents that update their beliefs read their received posts)
+        # & activate them for the update_beliefs_stage
+        if len(posts) > 0:
+            self.prepare_posts(posts)
+
+            agents = self.model.agent_list
+            for follower_id in self.followers.tolist():
+                follower = agents[follower_id]
+                if follower.updates_beliefs:
+                    follower.receive_posts(posts)
+                    self.model.schedule.activate(follower)
+
+    def share_post_batch(self, n_posts):
+        """
+        Aggregated exposure mode: shares n_posts posts as one PostBatch. For all followers at once, the number of seen
+        posts is drawn from Binomial(n_posts, p_seen) and the number of accepted (i.e., judged as truthful) posts from
+        Binomial(n_seen, p_accepted), instead of one coin toss per post, receiver and stage.
+        :param n_posts:     int, > 0
+        """
+        model = self.model
+        batch = PostBatch(model.post_id_counter, self, n_posts, model.ranking_intervention,
+                          model.factcheck_probabilities)
+        model.post_id_counter += n_posts
+
+        # Save own posts (only their stances are needed later on) & precompute the source-dependent quantities
+        for topic, stance_sum in batch.stance_sums.items():
+            topic_idx = Beliefs.TOPIC_INDICES[topic]
+            model.posted_stance_sums[self.unique_id, topic_idx] += stance_sum
+            model.n_posted_stances[self.unique_id, topic_idx] += n_posts
+        batch.estimated_source_beliefs = {topic: self.get_avg_posted_stance(topic) for topic in batch.stances}
+        batch.source_rel_n_followers = self.get_relative_n_followers(self)
+
+        # Vectorized exposure of all followers
+        followers = self.followers
+        n_seen = np.random.binomial(n_posts, batch.p_seen, size=len(followers))
+        p_accepted = np.where(model.high_media_literacy[followers], batch.p_accepted_high_literacy, 1.0)
+        n_accepted = np.random.binomial(n_seen, p_accepted)
+
+        # Only followers that accepted posts (and update their beliefs) read them
+        accepting = n_accepted > 0
+        agents = model.agent_list
+        for follower_id, count in zip(followers[accepting].tolist(), n_accepted[accepting].tolist()):
+            follower = agents[follower_id]
+            if follower.updates_beliefs:
+                follower.received_posts.append((batch, count))
+                model.schedule.activate(follower)
+
+    def prepare_posts(self, posts):
+        """
+        Computes the source-dependent quantities of the own posts once per post (instead of once per receiver):
+        the estimated beliefs of this agent (based on all its posts so far, incl. this tick's posts), its relative
+        number of followers and the visibility of each post (adjusted if the ranking intervention is on).
+        :param posts:   list of Posts, this agent's posts of the current tick (already recorded)
+        """
+        topics = {topic for post in posts for topic in post.stances}
+        estimated_beliefs = {topic: self.get_avg_posted_stance(topic) for topic in topics}
+        rel_n_followers = self.get_relative_n_followers(self)
+
+        for post in posts:
+            post.estimated_source_beliefs = estimated_beliefs
+            post.source_rel_n_followers = rel_n_followers
+            if self.model.ranking_intervention:
+                post.ranked_visibility = post.visibility_ranking_intervention
+            else:
+                post.ranked_visibility = post.visibility
 
     def update_beliefs_stage(self):
         """
@@ -96,6 +233,7 @@ class BaseAgent(Agent):
         It is also assumed that the agent actually updates beliefs based on the post. I.e., in the current
         implementation, it is assumed that the agent judged the post to be truthful.)
         :param post:    Post, a seen post
+        :return:        dict, {topic: update}
         """
 
         # Calculate how the agent will update its beliefs
@@ -105,6 +243,33 @@ class BaseAgent(Agent):
         for topic, update in updates.items():
             self.beliefs[topic] += update
 
+        return updates
+
+    def update_beliefs_batch(self, batch, n_accepted):
+        """
+        Aggregated exposure mode: updates the beliefs once per accepted post of a PostBatch (same updates as calling
+        update_beliefs_simple_sit n_accepted times). The components that do not depend on the own belief
+        (relative n_followers, immediacy, n_sources) are computed only once.
+        :param batch:       PostBatch
+        :param n_accepted:  int, number of accepted posts of the batch
+        """
+        immediacy = self.calculate_immediacy(batch)
+        n_sources = self.calculate_n_sources()
+        std_dev = self.model.update_elasticity_std_dev
+
+        for topic, post_value in batch.stances.items():
+            estimated_belief = batch.estimated_source_beliefs[topic]
+            belief = self.beliefs[topic]
+
+            for _ in range(n_accepted):
+                belief_similarity = 100 - abs(belief - estimated_belief)
+                strength = (batch.source_rel_n_followers + belief_similarity) / 2
+                social_impact = strength * immediacy * n_sources
+                update_elasticity = self.calculate_update_elasticity(belief, std_dev)
+                belief += social_impact / 1e6 * (post_value - belief) * update_elasticity
+
+            self.beliefs[topic] = belief
+
     def calculate_belief_update(self, post) -> dict:
         """
         Calculates the agent's updates on the post.
@@ -117,20 +282,20 @@ class BaseAgent(Agent):
         for topic in Topic:
             updates[str(topic)] = 0
 
+        # Calculate SIT components (the source-dependent parts are precomputed once per post)
+        strength = self.calculate_strength(post)  # avg(relative n_followers, belief_similarity)
+        # belief_similarity: between own_beliefs and source's_beliefs
+        immediacy = self.calculate_immediacy(post)  # tie_strength
+        n_sources = self.calculate_n_sources()  # (1 / n_following) * 100, [0,100]
+
+        # Combine components
+        social_impact = strength * immediacy * n_sources  # [0,100] * [0,100] * [0,100] --> [0,100^3]
+
         # Calculate updates
         for topic, post_value in post.stances.items():
             # Save previous beliefs
             prev_belief = self.beliefs[topic]
 
-            # Calculate SIT components
-            strength = self.calculate_strength(post)  # avg(relative n_followers, belief_similarity)
-            # belief_similarity: between own_beliefs and source's_beliefs
-            immediacy = self.calculate_immediacy(post)  # tie_strength
-            n_sources = self.calculate_n_sources()  # (1 / n_following) * 100, [0,100]
-
-            # Combine components
-            social_impact = strength * immediacy * n_sources  # [0,100] * [0,100] * [0,100] --> [0,100^3]
-
             # Rescale
             # downwards belief update
             if post_value < prev_belief:
@@ -144,7 +309,7 @@ class BaseAgent(Agent):
                 rescaled_social_impact = 0
 
             # Calculate update elasticity
-            update_elasticity = self.calculate_update_elasticity(prev_belief)
+            update_elasticity = self.calculate_update_elasticity(prev_belief, self.model.update_elasticity_std_dev)
 
             # Calculate final update for belief on topic
             update = rescaled_social_impact * update_elasticity
@@ -160,7 +325,7 @@ class BaseAgent(Agent):
         :param post:        current post by other person (i.e., source)
         :return:            strength    float
         """
-        rel_n_followers = self.get_relative_n_followers(post.source)
+        rel_n_followers = post.source_rel_n_followers  # precomputed by the source (see prepare_posts)
         belief_similarity = self.estimate_belief_similarity(post)
         strength = (rel_n_followers + belief_similarity) / 2
 
@@ -172,8 +337,14 @@ class BaseAgent(Agent):
         :return:            immediacy value
         """
 
-        tie_strength = self.model.G.edges[self.unique_id, post.source.unique_id, 0]['weight']  # Always key=0 because
-        # maximally one connection in this direction possible.
+        network = self.model.network
+        source_id = post.source.unique_id
+
+        # Tie strength = weight of the edge towards the source. If only the following-direction exists (e.g., in
+        # empirical follower networks), the weight of the edge over which the post was received is used.
+        tie_strength = network.get_weight(self.unique_id, source_id)
+        if tie_strength is None:
+            tie_strength = network.get_weight(source_id, self.unique_id)
         immediacy = tie_strength
 
         return immediacy
@@ -184,11 +355,47 @@ class BaseAgent(Agent):
         is following, the less they will update their beliefs based on each single one of them.
         :return:    float
         """
-        n_following = len(self.following)
+        n_following = int(self.model.network.n_following[self.unique_id])
         n_sources = (1.0 / n_following) * 100
 
         return n_sources
 
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #  Rewiring (only in a dynamic network)
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def rewire(self, seen_posts, unfollow_threshold=40.0, p_unfollow=0.5, max_attempts=10):
+        """
+        Unfollows sources whose (estimated) beliefs are too dissimilar to the own beliefs and follows new accounts
+        instead (n_following stays the same). Over time, this forms echo chambers.
+        :param seen_posts:          list of Posts, seen in this tick
+        :param unfollow_threshold:  float, belief difference above which a source might be unfollowed
+        :param p_unfollow:          float, [0,1], probability to unfollow such a source (per seen post)
+        :param max_attempts:        int, how many random accounts are tried to find a new account to follow
+        """
+        network = self.model.network
+        n_agents = network.n_nodes
+
+        for post in seen_posts:
+            source_id = post.source.unique_id
+            if not network.has_edge(source_id, self.unique_id):
+                continue  # already unfollowed (earlier in this tick)
+
+            belief_similarity = self.estimate_belief_similarity(post)
+            if belief_similarity >= 100 - unfollow_threshold or random.random() >= p_unfollow:
+                continue
+
+            # Find a new account to follow (not self, not yet followed)
+            for _ in range(max_attempts):
+                new_source_id = random.randrange(n_agents)
+                if new_source_id != self.unique_id and not network.has_edge(new_source_id, self.unique_id):
+                    network.remove_edge(source_id, self.unique_id)
+                    network.add_edge(new_source_id, self.unique_id, float(random.randint(0, 100)))
+                    break
+
+        # Degree statistics are maintained incrementally by the network
+        self.model.agents_data["n_followers_range"] = network.n_followers_range
+
     # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
     #  Averaging Belief-update  (Toy, for comparison)
     # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
@@ -232,6 +439,71 @@ class BaseAgent(Agent):
 
         return post
 
+    def record_post(self, post):
+        """
+        Saves the stances of an own post as running sums (instead of keeping all own posts).
+        Other agents use them to estimate this agent's beliefs.
+        :param post:    Post, created by this agent
+        """
+        for topic, value in post.stances.items():
+            topic_idx = Beliefs.TOPIC_INDICES[topic]
+            self.model.posted_stance_sums[self.unique_id, topic_idx] += value
+            self.model.n_posted_stances[self.unique_id, topic_idx] += 1
+
+    def get_avg_posted_stance(self, topic):
+        """
+        Returns the average stance of all posts this agent has shared on the topic.
+        :param topic:   str, str(Topic)
+        :return:        float
+        """
+        topic_idx = Beliefs.TOPIC_INDICES[topic]
+        avg_stance = self.model.posted_stance_sums.item(self.unique_id, topic_idx) / \
+            self.model.n_posted_stances.item(self.unique_id, topic_idx)
+
+        return avg_stance
+
+    def receive_posts(self, posts):
+        """
+        Adds the posts to this agent's feed.
+        If the model has a feed_capacity, the feed is bounded: only the top-k posts (by visibility) are kept in a
+        min-heap. Each post is then either dropped, or replaces the least visible post in the feed.
+        :param posts:   list of Posts
+        """
+        feed_capacity = self.model.feed_capacity
+
+        if feed_capacity is None:
+            self.received_posts += posts
+        else:
+            feed = self.received_posts
+            for post in posts:
+                entry = (self.get_visibility(post), post.unique_id, post)
+                if len(feed) < feed_capacity:
+                    heapq.heappush(feed, entry)
+                elif entry[0] > feed[0][0]:
+                    heapq.heapreplace(feed, entry)
+
+    def get_received_posts(self):
+        """
+        Returns the received posts. With a bounded feed: only the top-k posts, ranked by visibility (highest first).
+        :return: list of Posts
+        """
+        if self.model.feed_capacity is None:
+            return self.received_posts
+
+        return [post for _, _, post in sorted(self.received_posts, reverse=True)]
+
+    def get_visibility(self, post):
+        """
+        Returns the visibility of a post (for this agent). It depends on whether the ranking intervention is on or not.
+        :param post:    Post
+        :return:        float, [0,1)
+        """
+        # If ranking intervention, it is the adjusted visibility (punishment for having FactCheckResult.FALSE).
+        # (Precomputed once per post by the source, see prepare_posts)
+        probability = post.ranked_visibility
+
+        return probability
+
     def sample_seen_posts(self):
         """
         Sample which of the received posts are actually seen/consumed by the agent.
@@ -240,15 +512,10 @@ class BaseAgent(Agent):
         """
         seen_posts = []
 
-        for post in self.received_posts:
+        for post in self.get_received_posts():
 
             # probability that a post is seen depends on whether the ranking intvervention is on or not.
-            probability = post.visibility
-            # If ranking intervention, use the adjusted visibility (punishment for having FactCheckResult.FALSE)
-            if self.model.ranking_intervention:
-                probability = post.visibility_ranking_intervention
-                # post.visibility *= post.factcheck_result.value
-                # print(f'post.factcheck_result.value: {post.factcheck_result.value}')
+            probability = self.get_visibility(post)
 
             # "Coin toss"
             random_nr = random.random()
@@ -264,7 +531,7 @@ class BaseAgent(Agent):
         If 100.0: most n_followers in network.
         :return:    relative_n_followers    float   percentile
         """
-        n_followers = len(list(self.model.G.successors(source.unique_id)))
+        n_followers = int(self.model.network.n_followers[source.unique_id])
         min_followers, max_followers = self.model.agents_data["n_followers_range"]
 
         relative_n_followers = (n_followers - min_followers) / (max_followers - min_followers)
@@ -280,17 +547,8 @@ class BaseAgent(Agent):
         :param post:    Post
         :return:        float, similarity estimate
         """
-        # Estimate other person's beliefs (on topics in current post)
-        estimated_beliefs = {}
-
-        for topic, value in post.stances.items():
-            # Estimate their belief on 'topic' by looking at their last posts
-            values = []
-            for p in post.source.last_posts:
-                if topic in p.stances:
-                    value = p.stances[topic]
-                    values.append(value)
-            estimated_beliefs[topic] = sum(values) / len(values)
+        # Other person's beliefs (on topics in current post), estimated once by the source (see prepare_posts)
+        estimated_beliefs = post.estimated_source_beliefs
 
         # Calculate belief similarity (on beliefs in current post)
         similarities = []
@@ -328,6 +586,10 @@ class BaseAgent(Agent):
 class NormalUser(BaseAgent):
     """ NormalUser Agent """
 
+    __slots__ = ()
+
+    updates_beliefs = True
+
     def __init__(self, unique_id, model):
         """
         :param unique_id: int
@@ -335,7 +597,7 @@ class NormalUser(BaseAgent):
         """
         super().__init__(unique_id, model)
 
-        self.vocality = {'mu': 1, 'sigma': 0.7}  # This is used to sample nr of posts
+        self.vocality_mu, self.vocality_sigma = model.normal_user_vocality  # This is used to sample nr of posts
         self.media_literacy = MediaLiteracy.get_random()  # {LOW, HIGH}
 
     def init_beliefs(self):
@@ -349,12 +611,26 @@ class NormalUser(BaseAgent):
         """
         Second part of the agent's step function. The second stage what all agents do in an instant.
         """
+        # Aggregated exposure mode: received_posts holds (PostBatch, n_accepted_posts), already sampled by the source
+        if self.model.aggregated_exposure:
+            for batch, n_accepted in self.received_posts:
+                self.update_beliefs_batch(batch, n_accepted)
+
+            if self.model.dynamic_network:
+                self.rewire([batch for batch, _ in self.received_posts])
+
         # Agent can only update beliefs if it received posts in the first stage of the time tick
-        if len(self.received_posts) > 0:
+        elif len(self.received_posts) > 0:
             # Sample which of the received posts are actually seen (depends on ranking).
             seen_posts = self.sample_seen_posts()
 
             # For each seen post: judge truthfulness, then update beliefs (if post is judged as truthful).
+            # Event trace (if recorded): per seen post, whether it was judged as truthful & the belief update
+            trace = self.model.event_trace
+            if trace is not None:
+                judged_as_truthful = []
+                belief_deltas = []
+
             for post in seen_posts:
 
                 # For each seen post: judge whether it is truthful.
@@ -363,7 +639,18 @@ class NormalUser(BaseAgent):
                 # For each seen post, which is judged as truthful: update beliefs.
                 if post_judged_as_truthful:
                     # Update beliefs
-                    self.update_beliefs_simple_sit(post)
+                    updates = self.update_beliefs_simple_sit(post)
+
+                if trace is not None:
+                    judged_as_truthful.append(post_judged_as_truthful)
+                    belief_deltas.append(updates[trace.topic] if post_judged_as_truthful else 0.0)
+
+            if trace is not None:
+                trace.record_receiver(self, self.get_received_posts(), seen_posts, judged_as_truthful, belief_deltas)
+
+            # In a dynamic network: unfollow sources with dissimilar beliefs & follow new accounts instead
+            if self.model.dynamic_network:
+                self.rewire(seen_posts)
 
         # empty received_posts again
         self.received_posts = []
@@ -412,10 +699,13 @@ class NormalUser(BaseAgent):
 class Disinformer(BaseAgent):
     """ Disinformer Agent"""
 
+    __slots__ = ()
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
 
-        self.vocality = {'mu': 10, 'sigma': 0.7}  # This is used to sample nr of posts
+        self.vocality_mu = 10.0  # This is used to sample nr of posts
+        self.vocality_sigma = 0.7
 
     def init_beliefs(self):
         """
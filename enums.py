@@ -57,19 +57,20 @@ class FactCheckResult(Enum):
         return result
 
     @staticmethod
-    def sample(stances, based_on_topic=Topic.VAX):
+    def sample(stances, based_on_topic=Topic.VAX, probabilities=(0.0, 0.5, 0.8)):
         """
         Samples FactCheckResult completely dependent on the post's stance.
-        if post's stance is between
+        if post's stance is between (with the default probabilities)
                             - 0 and 20:     100% that FALSE, 0% that TRUE
                             - 20 and 80:    50% that FALSE, 50% that TRUE
                             - 80 and 100:   20% that FALSE, 80% that TRUE
         :param based_on_topic:
         :param stances: dict, {Topic: value}
+        :param probabilities: tuple, probabilities of TRUE for the stance ranges (see get_ground_truth_probability)
         :return: FactCheckResult
         """
         result = FactCheckResult.FALSE
-        probability = FactCheckResult.get_ground_truth_probability(stances, based_on_topic)
+        probability = FactCheckResult.get_ground_truth_probability(stances, based_on_topic, probabilities)
 
         # "Coin toss"
         random_nr = random.random()
@@ -79,22 +80,24 @@ class FactCheckResult(Enum):
         return result
 
     @staticmethod
-    def get_ground_truth_probability(stances, based_on_topic=Topic.VAX):
+    def get_ground_truth_probability(stances, based_on_topic=Topic.VAX, probabilities=(0.0, 0.5, 0.8)):
         """
         Returns the probability used for initializing a Post's FactCheckResult.
         :param stances:         dict,  {Topic: value}
         :param based_on_topic:  Topic
+        :param probabilities:   tuple, probabilities of TRUE for stances in [0,20], (20,80] and (80,100]
         :return:                float, [0,1)
         """
         topic = str(based_on_topic)
         value = stances[topic]
+        p_low, p_middle, p_high = probabilities
 
         if value <= 20:
-            probability = 0.0
+            probability = p_low
         elif value <= 80:
-            probability = 0.5
+            probability = p_middle
         else:
-            probability = 0.8
+            probability = p_high
 
         return probability
 
@@ -127,10 +130,35 @@ class SelectAgentsBy(Enum):
     """
     Possibilities to select agents. E.g., for who will by empowered by the Media Literacy Intervention.
     Easily extendable to e.g., pick agents based on an agent-characteristic (e.g., age, if age is an agent attribute).
+        RANDOM:             uniformly at random (without replacement)
+        HIGH_N_FOLLOWERS:   agents with the most followers
+        HIGH_CENTRALITY:    agents with the highest centrality (PageRank along the direction in which posts spread)
+        EXTREME_BELIEF:     agents whose (vax-)belief is furthest away from the middle (50)
     """
     RANDOM = 0
-    # HIGH_AGE = 1
-    # LOW_AGE = 2
+    HIGH_N_FOLLOWERS = 1
+    HIGH_CENTRALITY = 2
+    EXTREME_BELIEF = 3
+    # HIGH_AGE = 4
+    # LOW_AGE = 5
+
+    def __eq__(self, o: object) -> bool:
+        if self.value is o.value:
+            return True
+        else:
+            return False
+
+
+class LevelOfDetail(Enum):
+    """
+    How much of the network is rendered in the browser visualization.
+        FULL:       every agent & every edge
+        SAMPLE:     a degree-stratified sample of the agents (incl. the edges among them)
+        CLUSTERS:   clusters of agents (around the agents with the most followers), colored by their mean belief
+    """
+    FULL = 0
+    SAMPLE = 1
+    CLUSTERS = 2
 
     def __eq__(self, o: object) -> bool:
         if self.value is o.value:
@@ -0,0 +1,323 @@
+import math
+import time
+import numpy as np
+import pandas as pd
+from misinfo_model import MisinfoPy
+from experiments import SCENARIOS, POLICIES
+from network import build_csr
+from parallel import tie_strengths
+
+# Engine variants: keyword arguments (on top of scenario & policy) with which the model is set up.
+# New fast paths register here, so that they can be checked against the reference engine.
+ENGINES = {
+    'reference': {},
+    'bounded_feed': {'feed_capacity': 100},
+    'aggregated_exposure': {'aggregated_exposure': True},
+    'float32': {'precision': 'float32'},
+    'chunked': {'n_threads': 2, 'chunk_size': 256},
+}
+
+# KPIs computed from the final beliefs of one replication
+KPIS = {
+    'Avg belief': lambda beliefs: float(np.mean(beliefs)),
+    'Fraction above threshold': lambda beliefs: float(np.mean(beliefs >= 50.0)),
+}
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Running engines
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def run_engine(engine, scenario, policy, n_agents=1000, n_edges=3, max_run_length=60, seed=None):
+    """
+    Runs one replication of one scenario & policy with one engine variant.
+    :param engine:          str, key of ENGINES
+    :param scenario:        dict, agent_ratio
+    :param policy:          tuple, (media_literacy_intervention, ranking_intervention)
+    :param n_agents:        int
+    :param n_edges:         int
+    :param max_run_length:  int
+    :param seed:            int or None, random seed (same seed for all engines --> matched runs)
+    :return:                dict, {'beliefs': np.ndarray (final beliefs),
+                                   'metrics': pd.DataFrame (one row per tick),
+                                   'wall_time': float (seconds, set-up included)}
+    """
+    media_literacy_intervention, ranking_intervention = policy
+
+    start_time = time.perf_counter()
+    model = MisinfoPy(n_agents=n_agents,
+                      n_edges=n_edges,
+                      agent_ratio=scenario,
+                      media_literacy_intervention=media_literacy_intervention,
+                      ranking_intervention=ranking_intervention,
+                      seed=seed,
+                      **ENGINES[engine])
+
+    metrics = []
+    snapshot = None
+    for snapshot in model.run_iter(max_run_length):
+        metrics.append(snapshot.metrics)
+    wall_time = time.perf_counter() - start_time
+
+    return {'beliefs': np.array(snapshot.beliefs, dtype=float),
+            'metrics': pd.DataFrame(metrics),
+            'wall_time': wall_time}
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Statistical tests
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def ks_test(sample_1, sample_2):
+    """
+    Two-sample Kolmogorov-Smirnov test (asymptotic p-value).
+    :param sample_1:    array-like of floats
+    :param sample_2:    array-like of floats
+    :return:            tuple, (statistic, p_value)
+    """
+    sample_1 = np.sort(np.asarray(sample_1, dtype=float))
+    sample_2 = np.sort(np.asarray(sample_2, dtype=float))
+    n_1, n_2 = len(sample_1), len(sample_2)
+
+    values = np.concatenate([sample_1, sample_2])
+    cdf_1 = np.searchsorted(sample_1, values, side='right') / n_1
+    cdf_2 = np.searchsorted(sample_2, values, side='right') / n_2
+    statistic = float(np.max(np.abs(cdf_1 - cdf_2)))
+
+    # Kolmogorov distribution (with Stephens' small-sample correction)
+    n_effective = math.sqrt(n_1 * n_2 / (n_1 + n_2))
+    lam = (n_effective + 0.12 + 0.11 / n_effective) * statistic
+    if lam < 1e-3:
+        return statistic, 1.0
+    terms = [(-1) ** (k - 1) * math.exp(-2 * k ** 2 * lam ** 2) for k in range(1, 101)]
+    p_value = min(max(2 * sum(terms), 0.0), 1.0)
+
+    return statistic, p_value
+
+
+def permutation_test(sample_1, sample_2, n_permutations=2000, seed=0):
+    """
+    Two-sided permutation test on the difference of the means.
+    :param sample_1:        array-like of floats
+    :param sample_2:        array-like of floats
+    :param n_permutations:  int
+    :param seed:            int
+    :return:                float, p_value
+    """
+    sample_1 = np.asarray(sample_1, dtype=float)
+    sample_2 = np.asarray(sample_2, dtype=float)
+    pooled = np.concatenate([sample_1, sample_2])
+    observed = abs(sample_1.mean() - sample_2.mean())
+
+    rng = np.random.default_rng(seed)
+    n_extreme = 0
+    for _ in range(n_permutations):
+        permuted = rng.permutation(pooled)
+        difference = abs(permuted[:len(sample_1)].mean() - permuted[len(sample_1):].mean())
+        if difference >= observed - 1e-12:
+            n_extreme += 1
+
+    return (n_extreme + 1) / (n_permutations + 1)
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Comparing engines
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def compare_cell(reference_runs, alternative_runs, alpha=0.01, trajectory_tolerance=2.0):
+    """
+    Compares the replications of one scenario & policy, run with two engines.
+    :param reference_runs:          list of dicts, results of run_engine()
+    :param alternative_runs:        list of dicts, results of run_engine() (same seeds)
+    :param alpha:                   float, significance level of the tests
+    :param trajectory_tolerance:    float, max. allowed difference of the mean per-tick metrics (belief points)
+    :return:                        dict, one row of the report
+    """
+    row = {}
+
+    # Belief distributions (pooled over replications)
+    reference_beliefs = np.concatenate([run['beliefs'] for run in reference_runs])
+    alternative_beliefs = np.concatenate([run['beliefs'] for run in alternative_runs])
+    row['KS statistic'], row['KS p-value'] = ks_test(reference_beliefs, alternative_beliefs)
+    passed = row['KS p-value'] >= alpha
+
+    # KPI means (one value per replication)
+    for name, kpi in KPIS.items():
+        reference_values = [kpi(run['beliefs']) for run in reference_runs]
+        alternative_values = [kpi(run['beliefs']) for run in alternative_runs]
+        row[f'{name} (reference)'] = np.mean(reference_values)
+        row[f'{name} (alternative)'] = np.mean(alternative_values)
+        row[f'{name} p-value'] = permutation_test(reference_values, alternative_values)
+        passed = passed and row[f'{name} p-value'] >= alpha
+
+    # Per-tick metrics (mean over replications)
+    reference_metrics = sum(run['metrics'] for run in reference_runs) / len(reference_runs)
+    alternative_metrics = sum(run['metrics'] for run in alternative_runs) / len(alternative_runs)
+    row['Max trajectory difference'] = float((reference_metrics - alternative_metrics).abs().to_numpy().max())
+    passed = passed and row['Max trajectory difference'] <= trajectory_tolerance
+
+    # Speed
+    reference_time = sum(run['wall_time'] for run in reference_runs)
+    alternative_time = sum(run['wall_time'] for run in alternative_runs)
+    row['Reference time'] = reference_time
+    row['Alternative time'] = alternative_time
+    row['Speedup'] = reference_time / alternative_time
+
+    row['Equivalent'] = passed
+
+    return row
+
+
+def compare_engines(alternative,
+                    reference='reference',
+                    scenarios=None,
+                    policies=None,
+                    n_replications=5,
+                    n_agents=1000,
+                    n_edges=3,
+                    max_run_length=60,
+                    alpha=0.01,
+                    trajectory_tolerance=2.0,
+                    verbose=True):
+    """
+    Runs two engine variants over the scenario & policy grid (with matched seeds per replication) and compares them.
+    :param alternative:             str, key of ENGINES
+    :param reference:               str, key of ENGINES
+    :param scenarios:               list of dicts, (default: SCENARIOS of experiments.py)
+    :param policies:                list of tuples, (default: POLICIES of experiments.py)
+    :param n_replications:          int
+    :param n_agents:                int
+    :param n_edges:                 int
+    :param max_run_length:          int
+    :param alpha:                   float, significance level of the tests
+    :param trajectory_tolerance:    float, max. allowed difference of the mean per-tick metrics (belief points)
+    :param verbose:                 bool, whether to print progress
+    :return:                        pd.DataFrame, report with one row per scenario & policy
+    """
+    if scenarios is None:
+        scenarios = SCENARIOS
+    if policies is None:
+        policies = POLICIES
+
+    rows = []
+    for scenario in scenarios:
+        for policy in policies:
+            reference_runs = []
+            alternative_runs = []
+            for replication in range(n_replications):
+                reference_runs.append(run_engine(reference, scenario, policy, n_agents, n_edges, max_run_length,
+                                                 seed=replication))
+                alternative_runs.append(run_engine(alternative, scenario, policy, n_agents, n_edges, max_run_length,
+                                                   seed=replication))
+
+            row = {'Scenario': str(scenario), 'Policy': str(policy)}
+            row.update(compare_cell(reference_runs, alternative_runs, alpha, trajectory_tolerance))
+            rows.append(row)
+
+            if verbose:
+                print(f"{'ok  ' if row['Equivalent'] else 'DIFF'} {row['Scenario']} {row['Policy']}: "
+                      f"speedup {row['Speedup']:.2f}x")
+
+    return pd.DataFrame(rows)
+
+
+def print_report(report, alternative, reference='reference'):
+    """
+    Prints a summary of the report of compare_engines().
+    :param report:      pd.DataFrame
+    :param alternative: str
+    :param reference:   str
+    """
+    n_divergent = int((~report['Equivalent']).sum())
+    total_speedup = report['Reference time'].sum() / report['Alternative time'].sum()
+
+    print(f"\n{alternative} vs. {reference}: {len(report) - n_divergent}/{len(report)} cells equivalent, "
+          f"overall speedup {total_speedup:.2f}x")
+    if n_divergent > 0:
+        columns = ['Scenario', 'Policy', 'KS p-value', 'Max trajectory difference'] + \
+                  [f'{name} p-value' for name in KPIS]
+        print('Divergent cells:')
+        print(report.loc[~report['Equivalent'], columns].to_string(index=False))
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Invariance checks
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# Exact checks (not statistical): properties that must hold bit for bit. Each raises an AssertionError if violated.
+
+def check_tie_strengths_precision(n_nodes=60000, n_edges=4, seed=0):
+    """
+    Checks that the tie strengths of the chunked engine are the same for a network stored as float32/int32 and as
+    float64/int64. With more than ~46,000 nodes, the edge keys (id * n_nodes + id) do not fit into int32.
+    :param n_nodes: int
+    :param n_edges: int, number of edges per node (half of them reciprocated)
+    :param seed:    int
+    """
+    rng = np.random.default_rng(seed)
+    sources = rng.integers(n_nodes, size=n_nodes * n_edges)
+    targets = rng.integers(n_nodes, size=n_nodes * n_edges)
+    reciprocated = slice(0, len(sources) // 2)
+    network = build_csr(np.concatenate([sources, targets[reciprocated]]),
+                        np.concatenate([targets, sources[reciprocated]]), None, n_nodes, seed)
+
+    reference = tie_strengths(network).astype(np.float32)
+    narrow = tie_strengths(network.astype(np.float32, np.int32)).astype(np.float32)
+    assert np.array_equal(reference, narrow), \
+        f'Tie strengths differ between float64 & float32 networks ({np.sum(reference != narrow)} edges).'
+
+
+def check_thread_invariance(n_agents=3000, n_edges=3, max_run_length=20, thread_counts=(1, 2, 4, 8), chunk_size=256,
+                            seed=0):
+    """
+    Checks that the chunked engine gives the same beliefs & per-tick metrics (bit for bit) for every number of threads
+    (see ChunkedTickEngine: the results only depend on the seed and chunk_size).
+    :param n_agents:        int
+    :param n_edges:         int
+    :param max_run_length:  int
+    :param thread_counts:   tuple of int
+    :param chunk_size:      int
+    :param seed:            int
+    """
+    media_literacy_intervention, ranking_intervention = POLICIES[-1]
+    reference = None
+    for n_threads in thread_counts:
+        model = MisinfoPy(n_agents=n_agents,
+                          n_edges=n_edges,
+                          agent_ratio=SCENARIOS[0],
+                          media_literacy_intervention=media_literacy_intervention,
+                          ranking_intervention=ranking_intervention,
+                          n_threads=n_threads,
+                          chunk_size=chunk_size,
+                          seed=seed)
+        metrics = pd.DataFrame([snapshot.metrics for snapshot in model.run_iter(max_run_length)])
+        beliefs = np.array(model.belief_array)
+        model.tick_engine.close()
+
+        if reference is None:
+            reference = (thread_counts[0], beliefs, metrics)
+            continue
+        assert np.array_equal(reference[1], beliefs), \
+            f'Beliefs differ between {reference[0]} and {n_threads} threads.'
+        assert reference[2].equals(metrics), f'Metrics differ between {reference[0]} and {n_threads} threads.'
+
+
+if __name__ == '__main__':
+
+    alternative = 'bounded_feed'
+    reference = 'reference'
+    n_replications = 5
+    n_agents = 1000
+    n_edges = 3
+    max_run_length = 60
+
+    check_tie_strengths_precision()
+    check_thread_invariance()
+
+    report = compare_engines(alternative, reference,
+                             n_replications=n_replications,
+                             n_agents=n_agents,
+                             n_edges=n_edges,
+                             max_run_length=max_run_length)
+    print_report(report, alternative, reference)
+
+    report.to_csv(f'results/equivalence_{alternative}_vs_{reference}.csv', index=False)
@@ -1,24 +1,42 @@
+import argparse
 import itertools
 import os
+import sys
+import numpy as np
 import pandas as pd
+from contextlib import nullcontext
 from misinfo_model import MisinfoPy
 from agents import *
+from kpis import FractionAbove
+from profiling import StepProfiler, add_profile_arguments
+from sharding import ShardWriter, cell_seed, grid_cells, merge_shards, shard_cells
+from summaries import BeliefHistogramSeries
+from telemetry import SweepTelemetry, summarize_cell_log
 import time
 
 
+# Scenarios are different agent_ratios
+SCENARIOS = [{NormalUser.__name__: 0.99, Disinformer.__name__: 0.01},
+             {NormalUser.__name__: 0.95, Disinformer.__name__: 0.05},
+             {NormalUser.__name__: 0.8, Disinformer.__name__: 0.2},
+             {NormalUser.__name__: 0.25, Disinformer.__name__: 0.75}]
+
+# Policies are combinations of intervention values
+MEDIA_LITERACY_INTERVENTION_VALUES = [(0.0, SelectAgentsBy.RANDOM),
+                                      (0.1, SelectAgentsBy.RANDOM),
+                                      (0.25, SelectAgentsBy.RANDOM)]
+RANKING_INTERVENTION_VALUES = [True, False]
+
+POLICIES = list(itertools.product(MEDIA_LITERACY_INTERVENTION_VALUES, RANKING_INTERVENTION_VALUES))
+
+
 def calculate_avg_belief(misinfo_model):
     """
-    Calculates the average belief over all agents.
+    Calculates the average belief over all agents. (Online KPI of the model, O(1).)
     :param misinfo_model: MisinfoPy
     :return: avg_belief: float
     """
-    topic_name = str(Topic.VAX)
-    beliefs = []
-    for agent in misinfo_model.schedule.agents:
-        agent_belief_on_topic = agent.beliefs[topic_name]
-        beliefs.append(agent_belief_on_topic)
-
-    avg_belief = sum(beliefs) / len(beliefs)
+    avg_belief = misinfo_model.kpis['Avg Vax-Belief']
 
     return avg_belief
 
@@ -26,96 +44,273 @@ def calculate_avg_belief(misinfo_model):
 def calculate_percentage_agents_above_threshold(misinfo_model, threshold):
     """
     Calculates the percentage of agents that is above the specified threshold.
+    (Online KPI of the model: registered on first use, afterwards O(1).)
     :param misinfo_model: MisinfoPy
     :param threshold: float
     :return: float
     """
-    agent_beliefs = [a.beliefs[str(Topic.VAX)] for a in misinfo_model.schedule.agents]
-    n_above = sum([1 for a_belief in agent_beliefs if a_belief >= threshold])
-    percentage_above = n_above / len(misinfo_model.schedule.agents)
+    name = f'Fraction above {threshold}'
+    misinfo_model.kpis.get_or_register(name, FractionAbove(threshold))
+    percentage_above = misinfo_model.kpis[name]
     return percentage_above
 
 
-if __name__ == '__main__':
+def run_replication(scenario, policy, n_agents=1000, n_edges=3, max_run_length=60, summary_mode=False, seed=None,
+                    profiler=None, telemetry=None, trace_path=None):
+    """
+    Runs one replication of one scenario & policy.
+    :param scenario:        dict, agent_ratio
+    :param policy:          tuple, (media_literacy_intervention, ranking_intervention)
+    :param n_agents:        int
+    :param n_edges:         int
+    :param max_run_length:  int
+    :param summary_mode:    bool, whether to only record belief histograms (instead of all agents' beliefs)
+    :param seed:            int or None, random seed of the model
+    :param profiler:        StepProfiler or None, if given, the ticks are added to this profile
+    :param telemetry:       SweepTelemetry or None, if given, it is informed after each tick (progress & throughput)
+    :param trace_path:      str or None, if given, an event trace of the run is written to this file (see tracing.py)
+    :return:                if summary_mode: BeliefHistogramSeries, one histogram per tick (tick 0 = start)
+                            else: tuple, (agents_belief_before, agents_belief_after)
+    """
+    # Unpack policy
+    media_literacy_intervention, ranking_intervention = policy
 
-    n_agents = 1000
-    n_edges = 3
-    max_run_length = 60
-    n_replications = 12
+    # Set up the model
+    model = MisinfoPy(n_agents=n_agents,
+                      n_edges=n_edges,
+                      agent_ratio=scenario,
+                      media_literacy_intervention=media_literacy_intervention,
+                      ranking_intervention=ranking_intervention,
+                      seed=seed)
 
-    # Scenarios are different agent_ratios
-    scenarios = [{NormalUser.__name__: 0.99, Disinformer.__name__: 0.01},
-                 {NormalUser.__name__: 0.95, Disinformer.__name__: 0.05},
-                 {NormalUser.__name__: 0.8, Disinformer.__name__: 0.2},
-                 {NormalUser.__name__: 0.25, Disinformer.__name__: 0.75}]
+    # Save start data
+    agents_belief_before = model.get_vax_beliefs()
+    histograms = BeliefHistogramSeries()
+    if summary_mode:
+        histograms.add(agents_belief_before)
 
-    # Policies are combinations of intervention values
-    media_literacy_intervention_values = [(0.0, SelectAgentsBy.RANDOM),
-                                          (0.1, SelectAgentsBy.RANDOM),
-                                          (0.25, SelectAgentsBy.RANDOM)]
-    ranking_intervention_values = [True, False]
+    # Run the model (streaming; only the last snapshot is needed, or the histogram of each tick)
+    snapshot = None
+    trace_metadata = {'scenario': str(scenario), 'policy': str(policy), 'n_agents': n_agents, 'n_edges': n_edges,
+                      'max_run_length': max_run_length, 'seed': seed}
+    with model.profile(profiler=profiler) if profiler is not None else nullcontext(), \
+            model.trace_events(trace_path, metadata=trace_metadata) if trace_path is not None else nullcontext():
+        for snapshot in model.run_iter(max_run_length):
+            if summary_mode:
+                histograms.add(snapshot.beliefs)
+            if telemetry is not None:
+                telemetry.tick(snapshot)
 
-    policies = list(itertools.product(media_literacy_intervention_values, ranking_intervention_values))
+    if summary_mode:
+        return histograms
 
-    for policy in policies:
-        print(f'policy: {str(policy)}')
+    # Save end data
+    agents_belief_after = snapshot.beliefs.tolist()
 
-    # Printing
-    start_time_seconds = time.time()
-    start_time = time.localtime(time.time())
-    human_understandable_time = time.strftime('%Y-%m-%d %H:%M:%S', start_time)
-    print(f"\nStarting at time: {human_understandable_time}")
+    return agents_belief_before, agents_belief_after
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Results (of a whole sweep or merged from shards)
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def sweep_config(scenarios, policies, n_agents, n_edges, max_run_length, n_replications, summary_mode, seed):
+    """
+    :return:    dict, JSON-serializable configuration of a sweep (shards of the same sweep must have the same one)
+    """
+    return {'scenarios': [str(scenario) for scenario in scenarios],
+            'policies': [str(policy) for policy in policies],
+            'n_agents': n_agents,
+            'n_edges': n_edges,
+            'max_run_length': max_run_length,
+            'n_replications': n_replications,
+            'summary_mode': summary_mode,
+            'seed': seed}
+
+
+def encode_replication_data(replication_data, summary_mode):
+    """
+    :param replication_data:    see run_replication()
+    :param summary_mode:        bool
+    :return:                    JSON-serializable form (for the partial results of a shard)
+    """
+    if summary_mode:
+        return {'n_bins': replication_data.n_bins,
+                'domain': list(replication_data.domain),
+                'counts': np.asarray(replication_data.counts).tolist()}
+
+    agents_belief_before, agents_belief_after = replication_data
+    return [agents_belief_before, agents_belief_after]
+
+
+def decode_replication_data(data, summary_mode):
+    """
+    Inverse of encode_replication_data().
+    """
+    if summary_mode:
+        return BeliefHistogramSeries(data['n_bins'], tuple(data['domain']), np.array(data['counts']))
+
+    agents_belief_before, agents_belief_after = data
+    return agents_belief_before, agents_belief_after
+
+
+def save_results(results, scenarios, policies, n_replications, summary_mode, directory='results'):
+    """
+    Writes one csv file per scenario (belief_distr_<scenario>.csv, or belief_hist_<scenario>.csv in summary mode).
+    :param results:         dict, {(scenario index, policy index, replication): replication data}, all cells
+    :param scenarios:       list of dicts
+    :param policies:        list of tuples
+    :param n_replications:  int
+    :param summary_mode:    bool
+    :param directory:       str
+    """
+    path = os.path.join(os.getcwd(), directory) + '/'
 
-    # Run Experiments
     for i, scenario in enumerate(scenarios):  # Each scenario is 1 ratio of agent types
         # Set up data structures
         data = pd.DataFrame({"Replication": list(range(0, n_replications))})
+        histogram_frames = []
 
         for j, policy in enumerate(policies):
-            # Unpack policy
-            media_literacy_intervention, ranking_intervention = policy
-
             # Set up data structure
             df_column = []
 
             for replication in range(n_replications):
-                # Set up the model
-                model = MisinfoPy(n_agents=n_agents,
-                                  n_edges=n_edges,
-                                  agent_ratio=scenario,
-                                  media_literacy_intervention=media_literacy_intervention,
-                                  ranking_intervention=ranking_intervention)
+                replication_data = results[(i, j, replication)]
+                if summary_mode:
+                    histogram_frames.append(replication_data.to_frame(Policy=str(policy), Replication=replication))
+                else:
+                    df_column.append(replication_data)
 
-                # Save start data
-                agents_belief_before = [agent.beliefs[str(Topic.VAX)] for agent in model.schedule.agents]
+            # Create policy columns
+            policy_column = pd.Series(df_column, name=str(policy), dtype=object)
+            # Save policy column into the dataframe
+            data = data.join(policy_column)
 
-                # Run the model
-                for tick in range(max_run_length):
-                    model.step()
+        # Save scenario data into a csv file
+        if summary_mode:
+            file_name = "belief_hist_" + str(scenario) + ".csv"
+            pd.concat(histogram_frames, ignore_index=True).to_csv(path + file_name, index=False)
+        else:
+            file_name = "belief_distr_" + str(scenario) + ".csv"
+            data.to_csv(path + file_name)
 
-                # Save end data
-                agents_belief_after = [agent.beliefs[str(Topic.VAX)] for agent in model.schedule.agents]
-                # save data from this replication
-                replication_data = (agents_belief_before, agents_belief_after)
-                df_column.append(replication_data)
 
-                # Printing
-                print(f"replication {replication} done")
+if __name__ == '__main__':
 
-            # Create policy columns
-            policy_column = pd.Series(df_column, name=str(policy))
-            # Save policy column into the dataframe
-            data = data.join(policy_column)
+    parser = argparse.ArgumentParser(description='Run the experiments (all scenarios & policies).')
+    add_profile_arguments(parser)
+    parser.add_argument('--telemetry-log', default=None, metavar='PATH',
+                        help='JSON-lines log with one record per cell (default: results/telemetry_<start time>.jsonl)')
+    parser.add_argument('--trace-dir', default=None, metavar='DIR',
+                        help='write an event trace per cell to DIR (see tracing.py)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='base seed; the seed of each cell is derived from it & the cell (scenario, policy, '
+                             'replication)')
+    parser.add_argument('--shard-index', type=int, default=0, metavar='K',
+                        help='only run the cells of shard K (of --shard-count)')
+    parser.add_argument('--shard-count', type=int, default=1, metavar='N',
+                        help='number of shards the scenario x policy x replication grid is split into')
+    parser.add_argument('--shard-dir', default=None, metavar='DIR',
+                        help='write the partial results of the shard to DIR (default with --shard-count > 1: '
+                             'results/shards); rerunning a shard resumes it')
+    parser.add_argument('--merge', default=None, metavar='DIR',
+                        help='merge the partial results of all shards in DIR into the per-scenario results & exit')
+    args = parser.parse_args()
 
-            # Printing
-            print(f"policy {j} done")
+    n_agents = 1000
+    n_edges = 3
+    max_run_length = 60
+    n_replications = 12
 
-        # Save scenario data into a csv file
-        directory = os.getcwd()
-        path = directory + '/results/'
+    # If True: only save a belief histogram per tick & replication (constant in n_agents) instead of all beliefs
+    summary_mode = False
+
+    scenarios = SCENARIOS
+    policies = POLICIES
+    config = sweep_config(scenarios, policies, n_agents, n_edges, max_run_length, n_replications, summary_mode,
+                          args.seed)
+
+    # Merge the shards of a sweep (checks that every cell is present exactly once)
+    if args.merge is not None:
+        _, records = merge_shards(args.merge, config)
+        results = {cell: decode_replication_data(record['data'], summary_mode) for cell, record in records.items()}
+        save_results(results, scenarios, policies, n_replications, summary_mode)
+        print(f"Merged {len(records)} cells from {args.merge}")
+        sys.exit(0)
 
-        file_name = "belief_distr_" + str(scenario) + ".csv"
-        data.to_csv(path + file_name)
+    # The cells of this shard (all cells, if not sharded)
+    cells = shard_cells(grid_cells(len(scenarios), len(policies), n_replications), args.shard_index, args.shard_count)
+    shard_dir = args.shard_dir
+    if shard_dir is None and args.shard_count > 1:
+        shard_dir = 'results/shards'
+    shard = None
+    if shard_dir is not None:
+        shard = ShardWriter(shard_dir, config, args.shard_index, args.shard_count, cells)
+        cells = [cell for cell in cells if cell not in shard.done_cells]  # resume
+        print(f"Shard {args.shard_index} of {args.shard_count}: {len(cells)} cells to run, "
+              f"{len(shard.done_cells)} done ({shard.path})")
+
+    # Optionally profile the ticks of all replications (--profile)
+    profiler = None
+    if args.profile is not None:
+        profiler = StepProfiler(args.profile_mode, args.profile_interval)
+
+    for policy in policies:
+        print(f'policy: {str(policy)}')
+
+    # Printing
+    start_time_seconds = time.time()
+    start_time = time.localtime(time.time())
+    human_understandable_time = time.strftime('%Y-%m-%d %H:%M:%S', start_time)
+    print(f"\nStarting at time: {human_understandable_time}")
+
+    # Live progress (ticks/s, agent-updates/s, ETA) & one log record per cell
+    telemetry_log = args.telemetry_log
+    if telemetry_log is None:
+        shard_suffix = f'_shard_{args.shard_index}_of_{args.shard_count}' if args.shard_count > 1 else ''
+        telemetry_log = f"results/telemetry_{time.strftime('%Y%m%d_%H%M%S', start_time)}{shard_suffix}.jsonl"
+    telemetry = SweepTelemetry(len(cells), max_run_length, telemetry_log)
+
+    # Run Experiments
+    results = {}
+    for cell in cells:
+        i, j, replication = cell
+        scenario, policy = scenarios[i], policies[j]
+        seed = cell_seed(args.seed, cell)
+
+        telemetry.start_cell(scenario=scenario, policy=policy, replication=replication)
+        trace_path = None
+        if args.trace_dir is not None:
+            os.makedirs(args.trace_dir, exist_ok=True)
+            trace_path = os.path.join(args.trace_dir, f'trace_{i}_{j}_{replication}.mtrace')
+        replication_data = run_replication(scenario, policy, n_agents, n_edges, max_run_length, summary_mode,
+                                           seed=seed, profiler=profiler, telemetry=telemetry, trace_path=trace_path)
+        telemetry.end_cell(n_agents=n_agents, seed=seed)
+
+        # save data from this replication
+        results[cell] = replication_data
+        if shard is not None:
+            shard.write(cell, seed, encode_replication_data(replication_data, summary_mode),
+                        scenario=str(scenario), policy=str(policy))
+
+    # Save the results per scenario (sharded: once all shards are done, via --merge)
+    if args.shard_count == 1:
+        if shard is not None:  # resumed: the cells of earlier runs
+            for cell, record in shard.done_cells.items():
+                results.setdefault(cell, decode_replication_data(record['data'], summary_mode))
+        save_results(results, scenarios, policies, n_replications, summary_mode)
+    else:
+        print(f"Shard {args.shard_index} of {args.shard_count} done. Once all shards are done: "
+              f"python experiments.py --merge {shard_dir}")
+    if shard is not None:
+        shard.close()
+
+    telemetry.close()
+    if telemetry.n_cells_done > 0:
+        print(summarize_cell_log(telemetry_log).to_string())
+    else:
+        print('No cells to run (all cells of this shard are done).')
 
     # Printing
     end_time = time.localtime(time.time())
@@ -125,3 +320,9 @@ if __name__ == '__main__':
     print(
         f"\nWith {max_run_length} steps, runtime is {run_time} seconds "
         f"--> roughly {round(run_time / 60 / 60, 2)} hours")
+
+    if profiler is not None:
+        profiler.close()
+        profiler.save(args.profile)
+        profiler.print_summary()
+        print(f"Profile saved to {args.profile}.*")
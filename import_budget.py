@@ -0,0 +1,90 @@
+import subprocess
+import sys
+import numpy as np
+
+# Startup-time budget (seconds, median of the cumulative import time measured with `python -X importtime`).
+# Every spawned worker (experiments, sensitivity analysis, equivalence checks) pays this cost once.
+IMPORT_BUDGETS = {
+    'misinfo_model': 1.5,
+    'experiments': 1.8,
+}
+
+# Modules the simulation core must not import (they are loaded lazily, on first use)
+LAZY_MODULES = ('matplotlib', 'networkx', 'mesa.visualization', 'tornado')
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Measuring
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def parse_importtime(output):
+    """
+    Parses the output of `python -X importtime`.
+    :param output:  str, stderr of the interpreter
+    :return:        dict, {module name: (self time, cumulative time)} (seconds)
+    """
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative_time, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_time) / 1e6, int(cumulative_time) / 1e6)
+
+    return times
+
+
+def measure_import(module, n_repeats=5):
+    """
+    Imports a module in fresh interpreters (so nothing is cached in sys.modules) and measures the import time.
+    :param module:      str, module name
+    :param n_repeats:   int, number of fresh interpreters
+    :return:            tuple, (median cumulative import time (seconds), set of all imported module names)
+    """
+    cumulative_times = []
+    imported = set()
+    for _ in range(n_repeats):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                capture_output=True, text=True, check=True)
+        times = parse_importtime(result.stderr)
+        cumulative_times.append(times[module][1])
+        imported.update(times)
+
+    return float(np.median(cumulative_times)), imported
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Checking
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def check_import_budgets(budgets=None, lazy_modules=LAZY_MODULES, n_repeats=5, verbose=True):
+    """
+    Checks each module against its startup-time budget and that it does not (transitively) import the lazy modules.
+    :param budgets:         dict, {module name: budget (seconds)} (default: IMPORT_BUDGETS)
+    :param lazy_modules:    tuple of str, module names (a submodule counts as well, e.g., matplotlib.pyplot)
+    :param n_repeats:       int
+    :param verbose:         bool, whether to print the results
+    :return:                bool, whether all modules are within their budget
+    """
+    if budgets is None:
+        budgets = IMPORT_BUDGETS
+
+    passed = True
+    for module, budget in budgets.items():
+        import_time, imported = measure_import(module, n_repeats)
+        eager = sorted({lazy for lazy in lazy_modules for name in imported
+                        if name == lazy or name.startswith(lazy + '.')})
+        ok = import_time <= budget and not eager
+        passed = passed and ok
+
+        if verbose:
+            print(f"{'ok  ' if ok else 'FAIL'} {module}: {import_time:.3f}s (budget {budget:.3f}s)"
+                  + (f", eagerly imports {', '.join(eager)}" if eager else ''))
+
+    return passed
+
+
+if __name__ == '__main__':
+
+    n_repeats = 5
+
+    sys.exit(0 if check_import_budgets(n_repeats=n_repeats) else 1)
@@ -0,0 +1,117 @@
+// Network module (d3) that only receives the static structure once.
+// The server sends either
+//      {type: "full", nodes: [...], edges: [...]}      -> (re)build the whole network
+//      {type: "update", colors: {node_index: color}}   -> only recolor the nodes that changed
+var IncrementalNetworkModule = function(svg_width, svg_height) {
+
+    // Create the svg tag:
+    var svg_tag = "<svg id='IncrementalNetworkModule_d3' width='" + svg_width + "' height='" + svg_height + "' " +
+        "style='border:1px dotted'></svg>";
+
+    // Append svg to #elements:
+    $("#elements")
+        .append($(svg_tag)[0]);
+
+    var svg = d3.select("#IncrementalNetworkModule_d3")
+    var width = +svg.attr("width")
+    var height = +svg.attr("height")
+    var g = svg.append("g")
+            .classed("network_root", true)
+            .attr("transform", "translate(" + width / 2 + "," + height / 2 + ")")
+
+    var tooltip = d3.select("body").append("div")
+        .attr("class", "tooltip")
+        .style("opacity", 0);
+
+    svg.call(d3.zoom()
+        .on("zoom", function() {
+            g.attr("transform", d3.event.transform);
+        }));
+
+    var links = g.append("g")
+        .attr("class", "links")
+
+    var nodes = g.append("g")
+        .attr("class", "nodes")
+
+    // The circles of the current network, indexed like the nodes sent by the server
+    var circles = [];
+
+    var renderFull = function(graph) {
+        links.selectAll("line").remove();
+        nodes.selectAll("circle").remove();
+
+        var simulation = d3.forceSimulation()
+            .nodes(graph.nodes)
+            .force("charge", d3.forceManyBody()
+                .strength(-80)
+                .distanceMin(2))
+            .force("link", d3.forceLink(graph.edges))
+            .force("center", d3.forceCenter())
+            .stop();
+
+        // The layout is computed only once, because the structure of the network does not change.
+        for (var i = 0, n = Math.ceil(Math.log(simulation.alphaMin()) / Math.log(1 - simulation.alphaDecay())); i < n; ++i) {
+            simulation.tick();
+        }
+
+        links
+            .selectAll("line")
+            .data(graph.edges)
+            .enter()
+            .append("line")
+            .attr("x1", function(d) { return d.source.x; })
+            .attr("y1", function(d) { return d.source.y; })
+            .attr("x2", function(d) { return d.target.x; })
+            .attr("y2", function(d) { return d.target.y; })
+            .attr("stroke-width", function(d) { return d.width; })
+            .attr("stroke", function(d) { return d.color; });
+
+        nodes
+            .selectAll("circle")
+            .data(graph.nodes)
+            .enter()
+            .append("circle")
+            .attr("cx", function(d) { return d.x; })
+            .attr("cy", function(d) { return d.y; })
+            .attr("r", function(d) { return d.size; })
+            .attr("fill", function(d) { return d.color; })
+            .on("mouseover", function(d) {
+                tooltip.transition()
+                    .duration(200)
+                    .style("opacity", .9);
+                tooltip.html(d.tooltip)
+                    .style("left", (d3.event.pageX) + "px")
+                    .style("top", (d3.event.pageY) + "px");
+            })
+            .on("mouseout", function() {
+                tooltip.transition()
+                    .duration(500)
+                    .style("opacity", 0);
+            });
+
+        circles = nodes.selectAll("circle").nodes();
+    };
+
+    var renderUpdate = function(update) {
+        for (var index in update.colors) {
+            if (index < circles.length) {
+                circles[index].setAttribute("fill", update.colors[index]);
+            }
+        }
+    };
+
+    this.render = function(data) {
+        if (data.type === "full") {
+            renderFull(data);
+        } else {
+            renderUpdate(data);
+        }
+    };
+
+    this.reset = function() {
+        links.selectAll("line").remove();
+        nodes.selectAll("circle").remove();
+        circles = [];
+    };
+};
@@ -0,0 +1,90 @@
+// Client of the live visualization (see live_visualization.py). The model runs on the server at its own speed, the
+// browser never requests steps. The server pushes
+//      {type: "setup", canvas_size: ..., max_history: ..., charts: [[{Label, Color}, ...], ...]}   -> once
+//      {type: "frame", tick, ticks_per_second, running, done, error, network: {...},
+//       metrics: [[tick, {label: value}], ...]}
+// at a fixed frame rate. Frames may be dropped, but the metrics of all ticks are delivered (for the charts). The charts
+// show the last max_history ticks.
+var LiveChart = function(series, canvas_width, canvas_height, max_history) {
+
+    var canvas = $("<canvas width='" + canvas_width + "' height='" + canvas_height + "' " +
+        "style='border:1px dotted'></canvas>")[0];
+    $("#elements").append(canvas);
+
+    var chart = new Chart(canvas.getContext("2d"), {
+        type: 'line',
+        data: {
+            labels: [],
+            datasets: series.map(function(s) {
+                return {label: s.Label, borderColor: s.Color, backgroundColor: 'rgba(0,0,0,0)', data: [],
+                        pointRadius: 0};
+            })
+        },
+        options: {
+            responsive: true,
+            animation: false,
+            tooltips: {mode: 'index', intersect: false},
+            scales: {xAxes: [{display: true, ticks: {maxTicksLimit: 11}}], yAxes: [{display: true}]}
+        }
+    });
+
+    // Adds the metrics of several ticks, then redraws once
+    this.render = function(metrics) {
+        if (metrics.length === 0) {
+            return;
+        }
+        for (var i = 0; i < metrics.length; i++) {
+            chart.data.labels.push(metrics[i][0]);
+            for (var j = 0; j < series.length; j++) {
+                chart.data.datasets[j].data.push(metrics[i][1][series[j].Label]);
+            }
+        }
+        var n_dropped = chart.data.labels.length - max_history;
+        if (n_dropped > 0) {
+            chart.data.labels.splice(0, n_dropped);
+            for (var k = 0; k < series.length; k++) {
+                chart.data.datasets[k].data.splice(0, n_dropped);
+            }
+        }
+        chart.update(0);
+    };
+};
+
+var LiveVisualization = function(url) {
+
+    var socket = new WebSocket(url);
+    var network = null;
+    var charts = [];
+    var running = true;
+
+    $("#pause").on("click", function() {
+        socket.send(JSON.stringify({type: running ? "pause" : "resume"}));
+    });
+
+    socket.onmessage = function(event) {
+        var message = JSON.parse(event.data);
+
+        if (message.type === "setup") {
+            network = new IncrementalNetworkModule(message.canvas_size, message.canvas_size);
+            charts = message.charts.map(function(series) {
+                return new LiveChart(series, message.canvas_size, message.canvas_size / 2, message.max_history);
+            });
+            return;
+        }
+
+        network.render(message.network);
+        for (var i = 0; i < charts.length; i++) {
+            charts[i].render(message.metrics);
+        }
+
+        running = message.running;
+        $("#tick").text(message.tick);
+        $("#ticks-per-second").text(message.ticks_per_second.toFixed(1));
+        $("#pause").text(running ? "Pause" : "Resume");
+        if (message.error) {
+            $("#status").text(" - stopped by an error: " + message.error).css("color", "red");
+        } else {
+            $("#status").text(message.done ? " - done" : (running ? "" : " - paused"));
+        }
+    };
+};
@@ -0,0 +1,297 @@
+from abc import ABC, abstractmethod
+import numpy as np
+from enums import *
+
+
+class BeliefKPI(ABC):
+    """
+    Online KPI over the agents' beliefs on one topic. It is initialized once from the belief array (O(n_agents)) and
+    then updated incrementally from each belief change (O(1)), so reading it is O(1) at any tick.
+
+    Subclasses define the state they accumulate (initialize, update) and how the KPI is read from it (value).
+    """
+
+    def __init__(self, topic=Topic.VAX):
+        """
+        :param topic:   Topic, the beliefs on this topic are tracked
+        """
+        self.topic = topic
+
+    @abstractmethod
+    def initialize(self, beliefs):
+        """
+        :param beliefs: np.ndarray, (n_agents,) current beliefs on the topic
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, old_belief, new_belief):
+        """
+        One agent's belief changed.
+        :param old_belief:  float
+        :param new_belief:  float
+        """
+        raise NotImplementedError
+
+    def update_many(self, old_beliefs, new_beliefs):
+        """
+        Several agents' beliefs changed (e.g., by a vectorized update). Default: one update per agent.
+        :param old_beliefs: np.ndarray
+        :param new_beliefs: np.ndarray
+        """
+        for old_belief, new_belief in zip(old_beliefs.tolist(), new_beliefs.tolist()):
+            self.update(old_belief, new_belief)
+
+    def start_tick(self):
+        """Called at the start of each tick (e.g., to reset per-tick counts)."""
+        pass
+
+    @abstractmethod
+    def value(self):
+        """
+        :return: float or int
+        """
+        raise NotImplementedError
+
+
+class MeanBelief(BeliefKPI):
+    """Average belief of all agents (running sum)."""
+
+    def initialize(self, beliefs):
+        self.sum = float(np.sum(beliefs, dtype=np.float64))
+        self.n = len(beliefs)
+
+    def update(self, old_belief, new_belief):
+        self.sum += new_belief - old_belief
+
+    def update_many(self, old_beliefs, new_beliefs):
+        self.sum += float(np.sum(new_beliefs - old_beliefs))
+
+    def value(self):
+        return self.sum / self.n
+
+
+class CountAbove(BeliefKPI):
+    """Number of agents with a belief >= threshold."""
+
+    def __init__(self, threshold=50.0, topic=Topic.VAX):
+        """
+        :param threshold:   float
+        :param topic:       Topic
+        """
+        super().__init__(topic)
+        self.threshold = threshold
+
+    def initialize(self, beliefs):
+        self.count = int(np.sum(beliefs >= self.threshold))
+        self.n = len(beliefs)
+
+    def update(self, old_belief, new_belief):
+        self.count += (new_belief >= self.threshold) - (old_belief >= self.threshold)
+
+    def update_many(self, old_beliefs, new_beliefs):
+        self.count += int(np.sum(new_beliefs >= self.threshold)) - int(np.sum(old_beliefs >= self.threshold))
+
+    def value(self):
+        return self.count
+
+
+class CountBelow(CountAbove):
+    """Number of agents with a belief < threshold."""
+
+    def value(self):
+        return self.n - self.count
+
+
+class FractionAbove(CountAbove):
+    """Fraction of agents with a belief >= threshold."""
+
+    def value(self):
+        return self.count / self.n
+
+
+class MeanAbove(BeliefKPI):
+    """
+    Average belief of the agents with a belief >= threshold (above=True) or < threshold (above=False).
+    If there are no such agents, the average of the other group is returned.
+    """
+
+    def __init__(self, threshold=50.0, above=True, topic=Topic.VAX):
+        """
+        :param threshold:   float
+        :param above:       bool, whether to average the agents above (True) or below (False) the threshold
+        :param topic:       Topic
+        """
+        super().__init__(topic)
+        self.threshold = threshold
+        self.above = above
+
+    def initialize(self, beliefs):
+        is_above = beliefs >= self.threshold
+        self.sum_above = float(np.sum(beliefs[is_above], dtype=np.float64))
+        self.n_above = int(np.sum(is_above))
+        self.sum = float(np.sum(beliefs, dtype=np.float64))
+        self.n = len(beliefs)
+
+    def update(self, old_belief, new_belief):
+        self.sum += new_belief - old_belief
+        if old_belief >= self.threshold:
+            self.sum_above -= old_belief
+            self.n_above -= 1
+        if new_belief >= self.threshold:
+            self.sum_above += new_belief
+            self.n_above += 1
+
+    def update_many(self, old_beliefs, new_beliefs):
+        old_above = old_beliefs >= self.threshold
+        new_above = new_beliefs >= self.threshold
+        self.sum += float(np.sum(new_beliefs - old_beliefs))
+        self.sum_above += float(np.sum(new_beliefs[new_above]) - np.sum(old_beliefs[old_above]))
+        self.n_above += int(np.sum(new_above)) - int(np.sum(old_above))
+
+    def value(self):
+        n_below = self.n - self.n_above
+        if self.above and self.n_above > 0 or not self.above and n_below == 0:
+            return self.sum_above / self.n_above
+        return (self.sum - self.sum_above) / n_below
+
+
+class ThresholdCrossings(BeliefKPI):
+    """
+    Number of times a belief crossed the threshold (upwards: from < threshold to >= threshold, or downwards),
+    either in the current tick (per_tick=True) or since the start of the run.
+    """
+
+    def __init__(self, threshold=50.0, direction='both', per_tick=True, topic=Topic.VAX):
+        """
+        :param threshold:   float
+        :param direction:   str, 'up', 'down' or 'both'
+        :param per_tick:    bool, whether to count only the crossings of the current tick
+        :param topic:       Topic
+        """
+        super().__init__(topic)
+        self.threshold = threshold
+        self.direction = direction
+        self.per_tick = per_tick
+
+    def initialize(self, beliefs):
+        self.n_up = 0
+        self.n_down = 0
+
+    def update(self, old_belief, new_belief):
+        if old_belief < self.threshold <= new_belief:
+            self.n_up += 1
+        elif new_belief < self.threshold <= old_belief:
+            self.n_down += 1
+
+    def update_many(self, old_beliefs, new_beliefs):
+        old_above = old_beliefs >= self.threshold
+        new_above = new_beliefs >= self.threshold
+        self.n_up += int(np.sum(~old_above & new_above))
+        self.n_down += int(np.sum(old_above & ~new_above))
+
+    def start_tick(self):
+        if self.per_tick:
+            self.n_up = 0
+            self.n_down = 0
+
+    def value(self):
+        if self.direction == 'up':
+            return self.n_up
+        elif self.direction == 'down':
+            return self.n_down
+        return self.n_up + self.n_down
+
+
+class KPITracker:
+    """
+    Registry of the online KPIs of a model. The agents' Beliefs report each change to it (see Beliefs.__setitem__).
+    New KPIs are defined declaratively, e.g.:
+        model.kpis.register('Share of vaccine-sceptics', FractionAbove(threshold=80.0))
+    and are read via model.kpis['Share of vaccine-sceptics'] (O(1)).
+    """
+
+    def __init__(self, belief_array):
+        """
+        :param belief_array:    np.ndarray, (n_agents, n_topics) belief array of the model
+        """
+        self.belief_array = belief_array
+        self.kpis = {}  # {name: BeliefKPI}
+        self.kpis_by_topic = {topic.value: [] for topic in Topic}  # {topic_index: [BeliefKPI]}
+
+    def register(self, name, kpi):
+        """
+        Registers a KPI (initialized from the current beliefs).
+        :param name:    str
+        :param kpi:     BeliefKPI
+        :return:        BeliefKPI
+        """
+        if name in self.kpis:
+            self.kpis_by_topic[self.kpis[name].topic.value].remove(self.kpis[name])
+
+        kpi.initialize(self.belief_array[:, kpi.topic.value])
+        self.kpis[name] = kpi
+        self.kpis_by_topic[kpi.topic.value].append(kpi)
+
+        return kpi
+
+    def get_or_register(self, name, kpi):
+        """
+        :param name:    str
+        :param kpi:     BeliefKPI, only registered if there is no KPI with that name yet
+        :return:        BeliefKPI, the registered one
+        """
+        if name not in self.kpis:
+            self.register(name, kpi)
+
+        return self.kpis[name]
+
+    def update(self, topic_index, old_belief, new_belief):
+        """
+        :param topic_index: int, Topic.value
+        :param old_belief:  float
+        :param new_belief:  float
+        """
+        for kpi in self.kpis_by_topic[topic_index]:
+            kpi.update(old_belief, new_belief)
+
+    def update_many(self, topic_index, old_beliefs, new_beliefs):
+        """
+        :param topic_index: int, Topic.value
+        :param old_beliefs: np.ndarray
+        :param new_beliefs: np.ndarray
+        """
+        for kpi in self.kpis_by_topic[topic_index]:
+            kpi.update_many(old_beliefs, new_beliefs)
+
+    def start_tick(self):
+        """Called by the model at the start of each tick."""
+        for kpi in self.kpis.values():
+            kpi.start_tick()
+
+    def __getitem__(self, name):
+        return self.kpis[name].value()
+
+    def __contains__(self, name):
+        return name in self.kpis
+
+    def values(self):
+        """
+        :return: dict, {name: value} of all KPIs
+        """
+        return {name: kpi.value() for name, kpi in self.kpis.items()}
+
+
+def default_kpis(threshold=50.0):
+    """
+    The KPIs every model tracks (on Topic.VAX).
+    :param threshold:   float
+    :return:            dict, {name: BeliefKPI}
+    """
+    return {'Avg Vax-Belief': MeanBelief(),
+            'Avg Vax-Belief above threshold': MeanAbove(threshold, above=True),
+            'Avg Vax-Belief below threshold': MeanAbove(threshold, above=False),
+            'Agents above threshold': CountAbove(threshold),
+            'Agents below threshold': CountBelow(threshold),
+            'Fraction above threshold': FractionAbove(threshold),
+            'Threshold crossings': ThresholdCrossings(threshold)}
@@ -0,0 +1,342 @@
+import collections
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import webbrowser
+import numpy as np
+import tornado.ioloop
+import tornado.web
+import tornado.websocket
+from mesa.visualization import ModularVisualization
+
+from enums import *
+from visualization import IncrementalNetworkModule, AVG_BELIEF_SERIES, INDIVIDUAL_BELIEF_SERIES, static_snapshot
+
+REPO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+MESA_TEMPLATES = os.path.join(os.path.dirname(ModularVisualization.__file__), 'templates')  # jquery, d3, Chart.js
+
+# Static page: the modules are created by js/LiveVisualization.js from the 'setup' message of the server
+LIVE_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+    <title>Misinfo Model (live)</title>
+    <link href="/static/css/visualization.css" type="text/css" rel="stylesheet" />
+</head>
+<body>
+    <div id="controls">
+        <button id="pause">Pause</button>
+        Tick <span id="tick">0</span> (<span id="ticks-per-second">0.0</span> ticks/s)<span id="status"></span>
+    </div>
+    <div id="elements"></div>
+    <script src="/static/js/jquery.min.js"></script>
+    <script src="/static/js/d3.min.js"></script>
+    <script src="/static/js/Chart.min.js"></script>
+    <script src="/local/js/IncrementalNetworkModule_d3.js"></script>
+    <script src="/local/js/LiveVisualization.js"></script>
+    <script>var live = new LiveVisualization("ws://" + location.host + "/ws");</script>
+</body>
+</html>
+"""
+
+
+def followed_agents(n_agents):
+    """
+    :param n_agents:    int
+    :return:            list of int, ids of the agents in the chart of individual beliefs (Agent 0, ..., Agent 10):
+                        the agents at 0%, 10%, ..., 90% of the ids and the last agent (like data_collector2)
+    """
+    return [min(int(n_agents * share / 10), n_agents - 1) for share in range(10)] + [n_agents - 1]
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Model worker
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class ModelWorker(threading.Thread):
+    """
+    Runs the model in a background thread at full speed (via run_iter(), i.e., without DataCollector history).
+
+    After each tick, it appends the chart metrics (O(1) online KPIs & the beliefs of the followed agents) to a history.
+    The history is a ring buffer of the last max_history ticks (entries are addressed by their global index, i.e., the
+    number of ticks before them), so long runs do not grow the memory.
+    The beliefs (O(n_agents)) are only copied into the latest frame if a frame was requested since the last copy,
+    i.e., at most once per frame of the server, no matter how many ticks run in between. Intermediate states are never
+    copied (dropped frames).
+
+    If the model raises an exception, the worker stops and keeps the error message (see error), which is shown in the
+    browsers.
+    """
+
+    def __init__(self, model, max_run_length=None, topic=Topic.VAX, max_history=10000):
+        """
+        :param model:           MisinfoPy
+        :param max_run_length:  int or None, number of ticks to run (None: until stopped)
+        :param topic:           Topic, the beliefs on this topic are shown
+        :param max_history:     int, number of ticks of which the chart metrics are kept
+        """
+        super().__init__(daemon=True)
+        self.model = model
+        self.max_run_length = max_run_length if max_run_length is not None else sys.maxsize
+        self.topic = topic
+        self.followed_agents = followed_agents(model.n_agents)
+
+        self.lock = threading.Lock()
+        self.running = threading.Event()  # cleared while paused
+        self.running.set()
+        self.stopped = threading.Event()
+
+        self.frame_requested = True
+        self.frame = None  # (tick, beliefs), the latest copied state
+        self.metrics = collections.deque(maxlen=max_history)  # [(tick, {label: value})], one entry per tick
+        self.n_metrics = 0  # number of entries appended so far (global index of the next entry)
+        self.done = False
+        self.error = None  # str, the exception that stopped the model (if any)
+        self.ticks_per_second = 0.0
+
+    def request_frame(self):
+        """Asks for a copy of the beliefs after the current tick (or right away, if paused or done)."""
+        with self.lock:
+            self.frame_requested = True
+
+    def latest(self, metrics_start=0):
+        """
+        :param metrics_start:   int, number of metrics entries the caller already has (entries that were dropped from
+                                the history in the meantime are skipped)
+        :return:                tuple, (frame (tick, beliefs) or None, new metrics entries, number of metrics entries
+                                the caller has afterwards)
+        """
+        with self.lock:
+            first_index = self.n_metrics - len(self.metrics)
+            new_metrics = list(itertools.islice(self.metrics, max(metrics_start - first_index, 0), None))
+            return self.frame, new_metrics, max(metrics_start, self.n_metrics)
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.running.set()
+
+    def run(self):
+        model = self.model
+        beliefs = model.belief_array[:, self.topic.value]
+        self.publish(model.schedule.steps, beliefs, {})
+
+        start_time = time.perf_counter()
+        n_ticks = 0
+        try:
+            for snapshot in model.run_iter(self.max_run_length, topic=self.topic):
+                metrics = dict(snapshot.metrics)
+                metrics.update({f'Agent {i}': float(beliefs[agent_id])
+                                for i, agent_id in enumerate(self.followed_agents)})
+                n_ticks += 1
+                self.ticks_per_second = n_ticks / (time.perf_counter() - start_time)
+                self.publish(snapshot.tick, beliefs, metrics)
+
+                # Paused: keep answering frame requests (e.g., of newly connected browsers)
+                if not self.running.is_set():
+                    while not self.running.wait(0.05):
+                        self.publish(snapshot.tick, beliefs)
+                    start_time, n_ticks = time.perf_counter(), 0
+                if self.stopped.is_set():
+                    break
+        except Exception as error:
+            traceback.print_exc()
+            self.error = f'{type(error).__name__}: {error}'
+
+        self.done = True
+        with self.lock:
+            self.frame = (model.schedule.steps, np.array(beliefs, dtype=float))
+
+    def publish(self, tick, beliefs, metrics=None):
+        """
+        :param tick:    int
+        :param beliefs: np.ndarray, view of the model's beliefs (copied only if a frame was requested)
+        :param metrics: dict or None, chart metrics of this tick (None: no new tick)
+        """
+        with self.lock:
+            if metrics:
+                self.metrics.append((tick, metrics))
+                self.n_metrics += 1
+            if self.frame_requested:
+                self.frame = (tick, np.array(beliefs, dtype=float))
+                self.frame_requested = False
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Server
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class LivePageHandler(tornado.web.RequestHandler):
+
+    def get(self):
+        self.write(LIVE_PAGE)
+
+
+class LiveSocketHandler(tornado.websocket.WebSocketHandler):
+    """
+    One browser. Has its own IncrementalNetworkModule (i.e., its own state of what the browser shows), so the color
+    updates are diffs against the last frame this browser received. If it has not received the previous frame yet, the
+    next frame is dropped for it (slow browsers skip frames instead of queueing them).
+    """
+
+    def open(self):
+        server = self.application
+        self.network_module = IncrementalNetworkModule(server.canvas_size, server.canvas_size,
+                                                       level_of_detail=server.level_of_detail,
+                                                       max_nodes=server.max_nodes,
+                                                       edge_budget=server.edge_budget)
+        self.n_metrics_sent = 0
+        self.last_state_sent = None  # (tick, running, done, error)
+        self.pending_write = None
+        self.n_dropped_frames = 0
+
+        self.write_message(json.dumps({'type': 'setup',
+                                       'canvas_size': server.canvas_size,
+                                       'max_history': server.worker.metrics.maxlen,
+                                       'charts': [AVG_BELIEF_SERIES, INDIVIDUAL_BELIEF_SERIES]}))
+        server.clients.add(self)
+
+    def on_close(self):
+        self.application.clients.discard(self)
+
+    def on_message(self, message):
+        message = json.loads(message)
+        if message['type'] == 'pause':
+            self.application.worker.pause()
+        elif message['type'] == 'resume':
+            self.application.worker.resume()
+
+    def check_origin(self, origin):
+        return True
+
+    def push_frame(self, frame, worker):
+        """
+        :param frame:   tuple, (tick, beliefs)
+        :param worker:  ModelWorker
+        """
+        if self.pending_write is not None and not self.pending_write.done():
+            self.n_dropped_frames += 1
+            return
+
+        tick, beliefs = frame
+        _, new_metrics, n_metrics = worker.latest(self.n_metrics_sent)
+        state = (tick, worker.running.is_set(), worker.done, worker.error)
+        if state == self.last_state_sent and not new_metrics:
+            return  # nothing new (e.g., paused)
+
+        message = {'type': 'frame',
+                   'tick': tick,
+                   'ticks_per_second': worker.ticks_per_second,
+                   'running': state[1],
+                   'done': state[2],
+                   'error': state[3],
+                   'network': self.network_module.render(worker.model, beliefs, self.application.network),
+                   'metrics': new_metrics}
+        try:
+            self.pending_write = self.write_message(json.dumps(message))
+        except tornado.websocket.WebSocketClosedError:
+            return
+        self.n_metrics_sent = n_metrics
+        self.last_state_sent = state
+
+
+class LiveServer(tornado.web.Application):
+    """
+    Live visualization that is decoupled from the simulation: the model runs in a ModelWorker, and the server samples
+    the latest frame at a fixed frame rate (fps) and pushes it to all browsers (websocket). The browsers never request
+    steps, so watching a run does not slow it down (besides copying the beliefs & rendering at most fps times per
+    second).
+    """
+
+    def __init__(self, model, max_run_length=None, fps=10, level_of_detail=LevelOfDetail.SAMPLE, max_nodes=1000,
+                 edge_budget=10000, canvas_size=500, max_history=10000):
+        """
+        :param model:           MisinfoPy
+        :param max_run_length:  int or None, number of ticks to run (None: until the server is stopped)
+        :param fps:             float, frames per second pushed to the browsers
+        :param level_of_detail: LevelOfDetail, how to render networks with more than max_nodes agents
+        :param max_nodes:       int, maximal number of rendered nodes
+        :param edge_budget:     int, maximal number of rendered edges
+        :param canvas_size:     int, width & height of the network (pixels)
+        :param max_history:     int, number of ticks shown in the charts
+        """
+        # Edges shown to all browsers, taken before the worker starts (a dynamic network is rewired by the worker)
+        self.network = static_snapshot(model.network)
+        self.worker = ModelWorker(model, max_run_length, max_history=max_history)
+        self.fps = fps
+        self.level_of_detail = level_of_detail
+        self.max_nodes = max_nodes
+        self.edge_budget = edge_budget
+        self.canvas_size = canvas_size
+        self.clients = set()
+        self.frame_callback = tornado.ioloop.PeriodicCallback(self.push_frames, 1000 / fps)
+
+        super().__init__([(r"/", LivePageHandler),
+                          (r"/ws", LiveSocketHandler),
+                          (r"/static/(.*)", tornado.web.StaticFileHandler, {"path": MESA_TEMPLATES}),
+                          (r"/local/(.*)", tornado.web.StaticFileHandler, {"path": REPO_DIRECTORY})])
+
+    def start(self, port=8521):
+        """
+        Starts the worker & the frame callback (on the current IOLoop) and listens on port.
+        :param port:    int
+        """
+        self.listen(port)
+        self.worker.start()
+        self.frame_callback.start()
+
+    def stop(self):
+        self.frame_callback.stop()
+        self.worker.stop()
+
+    def push_frames(self):
+        """Pushes the latest frame to all browsers (called fps times per second)."""
+        frame, _, _ = self.worker.latest(metrics_start=sys.maxsize)
+        self.worker.request_frame()
+        if frame is None:
+            return
+
+        for client in list(self.clients):
+            client.push_frame(frame, self.worker)
+
+
+def show_live_visualization(model,
+                            max_run_length=None,
+                            fps=10,
+                            level_of_detail=LevelOfDetail.SAMPLE,
+                            max_nodes=1000,
+                            edge_budget=10000,
+                            port=8521,
+                            open_browser=True):
+    """
+    Runs the model at full speed in a background worker and shows its latest state in the browser (see LiveServer).
+    Blocks until interrupted (Ctrl+C).
+    :param model:           MisinfoPy
+    :param max_run_length:  int or None, number of ticks to run (None: until interrupted)
+    :param fps:             float, frames per second
+    :param level_of_detail: LevelOfDetail, how to render networks with more than max_nodes agents
+    :param max_nodes:       int, maximal number of rendered nodes
+    :param edge_budget:     int, maximal number of rendered edges
+    :param port:            int
+    :param open_browser:    bool
+    """
+    server = LiveServer(model, max_run_length, fps, level_of_detail, max_nodes, edge_budget)
+    server.start(port)
+
+    url = f"http://127.0.0.1:{port}"
+    print(f"Interface starting at {url}")
+    if open_browser:
+        webbrowser.open(url)
+
+    try:
+        tornado.ioloop.IOLoop.current().start()
+    except KeyboardInterrupt:
+        server.stop()
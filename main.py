@@ -1,20 +1,43 @@
 from misinfo_model import MisinfoPy  # , draw_graph
-from visualization import *
 from agents import *
+from profiling import add_profile_arguments
+from contextlib import nullcontext
+import argparse
 import time
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Run a simulation of the MisinfoPy model.')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
     # Parameters
     visualize = False
+    live_visualization = False  # with visualize: the model runs at full speed, the browser shows its latest state
+    show_follower_histogram = False
     n_agents = 1000
     agent_ratio = {NormalUser.__name__: 0.99, Disinformer.__name__: 0.01}
     n_edges = 3
     media_literacy_intervention = (0.0, SelectAgentsBy.RANDOM)
     ranking_intervention = False
 
-    if visualize:
+    if visualize and live_visualization:
+
+        # Imported only here: tornado & matplotlib are not needed for headless runs
+        from live_visualization import show_live_visualization
+
+        model = MisinfoPy(n_agents=n_agents,
+                          n_edges=n_edges,
+                          agent_ratio=agent_ratio,
+                          media_literacy_intervention=media_literacy_intervention,
+                          ranking_intervention=ranking_intervention)
+        show_live_visualization(model)
+
+    elif visualize:
+
+        # Imported only here: Mesa's server & matplotlib are not needed for headless runs
+        from visualization import show_visualization
 
         # Only needs the line below. Runs model in the browser.
         show_visualization(MisinfoPy,
@@ -33,13 +56,25 @@ if __name__ == '__main__':
                           agent_ratio=agent_ratio,
                           media_literacy_intervention=media_literacy_intervention,
                           ranking_intervention=ranking_intervention)
+        if show_follower_histogram:
+            model.show_follower_histogram()
+
+        # Optionally profile the ticks (--profile)
+        profile = nullcontext()
+        if args.profile is not None:
+            profile = model.profile(args.profile, mode=args.profile_mode, interval=args.profile_interval)
 
         print(f"Starting")
         start_time = time.time()
-        for i in range(max_run_length):
-            model.step()
-            if i % 10 == 0:
-                print(f"step {i} done")
+        with profile as profiler:
+            for snapshot in model.run_iter(max_run_length, collect_data=True):
+                i = snapshot.tick - 1
+                if i % 10 == 0:
+                    print(f"step {i} done")
 
         run_time = round(time.time() - start_time, 2)
         print(f"With {max_run_length} steps, runtime is {run_time}")
+
+        if profiler is not None:
+            profiler.print_summary()
+            print(f"Profile saved to {args.profile}.*")
@@ -0,0 +1,522 @@
+import math
+import time
+import numpy as np
+import pandas as pd
+from misinfo_model import MisinfoPy
+from agents import *
+from experiments import SCENARIOS, POLICIES
+from kpis import FractionAbove
+
+# Agent types of the mean-field engine (index of the type axis)
+AGENT_TYPES = [NormalUser.__name__, Disinformer.__name__]
+
+# Vocality (mu, sigma) of the Disinformers (see Disinformer.__init__)
+DISINFORMER_VOCALITY = (10.0, 0.7)
+
+# Initial beliefs (integers, uniformly distributed) of each agent type (see init_beliefs of the agents)
+INITIAL_BELIEF_RANGES = {NormalUser.__name__: (0, 100), Disinformer.__name__: (0, 10)}
+
+
+class MeanFieldModel:
+    """
+    Approximate, degree-class mean-field version of the MisinfoPy model.
+
+    Instead of single agents, it tracks groups of agents with the same (agent type, media literacy, degree class) and
+    evolves the belief distribution of each group on a grid of belief values. Each tick, the expected number of posts
+    that arrive per following-link (by source degree class and source belief) is computed from the source groups.
+    Every receiver's belief then moves by the expected SIT update of calculate_belief_update (strength, immediacy,
+    n_sources and update elasticity) and spreads by its variance. The runtime per tick only depends on the number of
+    groups & grid points, not on n_agents.
+
+    Approximations (see calibrate() for the resulting accuracy):
+        - the network has no degree correlations; in- and out-degree classes are taken from the degree distribution
+        - immediacy is the expected tie weight (weights are uniform integers in [0,100])
+        - the estimated belief of a source (the average of its posted stances) is its current belief
+        - all belief updates of a tick are based on the beliefs at the start of the tick (no order within a tick)
+        - each receiver gets the expected mix of sources. In the network, the pull of rare Disinformers is concentrated
+          on their followers (whose update elasticity then quickly drops). So their influence is overestimated if they
+          are rare: e.g., with 5% Disinformers (1000 agents, 60 ticks), the avg belief drops to 30 instead of
+          42 (+/- 7 between replications).
+        - feeds are unbounded
+    """
+
+    def __init__(self,
+                 n_agents=1000,
+                 n_edges=2,
+                 agent_ratio=None,
+                 media_literacy_intervention=(0.0, SelectAgentsBy.RANDOM),
+                 ranking_intervention=False,
+                 normal_user_vocality=(1.0, 0.7),
+                 update_elasticity_std_dev=15.0,
+                 factcheck_probabilities=(0.0, 0.5, 0.8),
+                 degree_classes=None,
+                 n_degree_classes=6,
+                 grid_resolution=1):
+        """
+        Same parameters as MisinfoPy (where applicable), plus:
+        :param degree_classes:      tuple or None, (n_following, n_followers, share, n_followers_range) per degree class,
+                                    e.g., from degree_classes_from_network(). If None: degree_classes_barabasi_albert().
+        :param n_degree_classes:    int, number of (logarithmic) degree classes
+        :param grid_resolution:     int, grid points per belief unit (e.g., 1: 0, 1, ..., 100; 2: 0.0, 0.5, ..., 100.0)
+        """
+        if agent_ratio is None:
+            agent_ratio = {NormalUser.__name__: 0.9, Disinformer.__name__: 0.1}
+        if degree_classes is None:
+            degree_classes = degree_classes_barabasi_albert(n_agents, n_edges, n_degree_classes)
+
+        self.n_agents = n_agents
+        self.ranking_intervention = ranking_intervention
+        self.factcheck_probabilities = factcheck_probabilities
+        self.update_elasticity_std_dev = update_elasticity_std_dev
+        self.steps = 0
+
+        # Belief grid
+        self.grid = np.linspace(0, 100, 100 * grid_resolution + 1)
+        self.cell_edges = np.concatenate([[-np.inf], (self.grid[:-1] + self.grid[1:]) / 2, [np.inf]])
+
+        # Degree classes
+        self.n_following, self.n_followers, class_shares, n_followers_range = degree_classes
+        min_followers, max_followers = n_followers_range
+        self.rel_n_followers = (self.n_followers - min_followers) / (max_followers - min_followers) * 100
+
+        # Expected number of posts per agent & tick, by agent type and belief
+        vocalities = [normal_user_vocality, DISINFORMER_VOCALITY]
+        self.expected_n_posts = np.array([get_expected_n_posts(self.grid, mu, sigma) for mu, sigma in vocalities])
+
+        # Stance distribution of a post, by the belief of its source (N(belief, 5), clipped to [0,100])
+        self.stance_kernel = get_transfer_matrix(self.grid, self.cell_edges, self.grid, np.full(len(self.grid), 5.0))
+
+        # Mass of each group: (agent type, media literacy, degree class, belief), sums up to 1
+        self.mass = self.init_mass(agent_ratio, class_shares, media_literacy_intervention)
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Init functions
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def init_mass(self, agent_ratio, class_shares, media_literacy_intervention):
+        """
+        Initial groups: agent types by agent_ratio, degree classes by their shares, beliefs like in init_beliefs of the
+        agents, and media literacy (50% HIGH for NormalUsers, plus the ones that benefit from the intervention).
+        :param agent_ratio:                 dict, {String: float}
+        :param class_shares:                np.ndarray, share of the agents in each degree class
+        :param media_literacy_intervention: tuple, (percentage, SelectAgentsBy)
+        :return:                            np.ndarray, (n_types, n_media_literacy_levels, n_classes, n_grid_points)
+        """
+        total = sum(agent_ratio.values())
+        mass = np.zeros((len(AGENT_TYPES), len(MediaLiteracy), len(class_shares), len(self.grid)))
+
+        for t, agent_type in enumerate(AGENT_TYPES):
+            low, high = INITIAL_BELIEF_RANGES[agent_type]
+            beliefs = np.zeros(len(self.grid))
+            beliefs[(self.grid >= low) & (self.grid <= high) & (self.grid == np.round(self.grid))] = 1
+            beliefs /= beliefs.sum()
+
+            type_mass = agent_ratio.get(agent_type, 0.0) / total * class_shares[:, None] * beliefs[None, :]
+            mass[t, MediaLiteracy.LOW.value] = type_mass
+
+        # NormalUsers: random media literacy
+        mass[0] = mass[0, MediaLiteracy.LOW.value][None] * 0.5
+
+        # Media literacy intervention (only agents with LOW media literacy benefit)
+        percentage, select_by = media_literacy_intervention
+        if percentage > 0.0:
+            selected = self.get_selected_fraction(mass, percentage, select_by)
+            benefiting = mass[0, MediaLiteracy.LOW.value] * selected[0]
+            mass[0, MediaLiteracy.LOW.value] -= benefiting
+            mass[0, MediaLiteracy.HIGH.value] += benefiting
+
+        return mass
+
+    def get_selected_fraction(self, mass, percentage, select_by):
+        """
+        Fraction of each (agent type, degree class, belief) that is selected for the media literacy intervention
+        (see MisinfoPy.select_agents_for_media_literacy_intervention).
+        :param mass:        np.ndarray, initial mass
+        :param percentage:  float, [0,1]
+        :param select_by:   SelectAgentsBy
+        :return:            np.ndarray, (n_types, n_classes, n_grid_points)
+        """
+        type_class_belief_mass = mass.sum(axis=1)
+        shape = type_class_belief_mass.shape
+
+        if select_by.__eq__(SelectAgentsBy.RANDOM):
+            return np.full(shape, percentage)
+        elif select_by.__eq__(SelectAgentsBy.HIGH_N_FOLLOWERS) or select_by.__eq__(SelectAgentsBy.HIGH_CENTRALITY):
+            # (Centrality is approximated by the number of followers)
+            scores = np.broadcast_to(self.n_followers[None, :, None], shape)
+        elif select_by.__eq__(SelectAgentsBy.EXTREME_BELIEF):
+            scores = np.broadcast_to(np.abs(self.grid - 50.0)[None, None, :], shape)
+        else:
+            raise ValueError(f'Agent selection {select_by} is not supported by the mean-field engine.')
+
+        return get_top_fraction(scores.ravel(), type_class_belief_mass.ravel(), percentage).reshape(shape)
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Step function
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def step(self):
+        """Advance the model by one step."""
+        grid = self.grid
+
+        # Expected posts per following-link, by source degree class & source belief.
+        # (The source of a link is an agent with probability proportional to its number of followers.)
+        source_mass = self.mass.sum(axis=1)  # (type, class, belief)
+        link_weights = source_mass * self.n_followers[None, :, None]
+        posts_per_link = (link_weights * self.expected_n_posts[:, None, :]).sum(axis=0) / link_weights.sum()
+
+        rel = self.rel_n_followers[:, None]
+        a_1 = posts_per_link.sum(axis=0)
+        a_rel = (posts_per_link * rel).sum(axis=0)
+        a_rel_2 = (posts_per_link * rel ** 2).sum(axis=0)
+
+        # Belief similarity between receiver (rows) and source (columns)
+        similarity = 100 - np.abs(grid[:, None] - grid[None, :])
+        strength_sum = (a_rel[None, :] + a_1[None, :] * similarity) / 2
+        strength_sum_2 = (a_rel_2[None, :] + 2 * a_rel[None, :] * similarity + a_1[None, :] * similarity ** 2) / 4
+
+        elasticity = get_update_elasticity(grid, self.update_elasticity_std_dev)
+        mean_weight, mean_weight_2 = 50.0, 3350.0  # E[w] & E[w^2] of the uniform integer tie weights in [0,100]
+
+        for literacy in MediaLiteracy:
+            # Rate at which a post of each stance is seen and judged as truthful, then averaged over the stances
+            rate = get_acceptance_rate(grid, literacy, self.ranking_intervention, self.factcheck_probabilities)
+            rate_0 = self.stance_kernel @ rate
+            rate_1 = self.stance_kernel @ (rate * grid)
+            rate_2 = self.stance_kernel @ (rate * grid ** 2)
+
+            # Expected update: (#posts ~ n_following) * (n_sources = 100 / n_following) --> independent of the degree
+            pull = rate_1[None, :] - grid[:, None] * rate_0[None, :]  # sum over stances of rate * (stance - belief)
+            drift = elasticity * mean_weight * 100 / 1e6 * (strength_sum * pull).sum(axis=1)
+
+            # Variance of the update: shrinks with the number of followed accounts (more posts, each with less impact)
+            squared_pull = rate_2[None, :] - 2 * grid[:, None] * rate_1[None, :] + grid[:, None] ** 2 * rate_0[None, :]
+            variance_1 = elasticity ** 2 * mean_weight_2 * 100 ** 2 / 1e12 * (strength_sum_2 * squared_pull).sum(axis=1)
+
+            for c, n_following in enumerate(self.n_following):
+                new_beliefs = np.clip(grid + drift, 0, 100)
+                std_dev = np.sqrt(variance_1 / n_following)
+                transfer = get_transfer_matrix(grid, self.cell_edges, new_beliefs, std_dev)
+                self.mass[0, literacy.value, c] = self.mass[0, literacy.value, c] @ transfer
+
+        self.steps += 1
+
+    def run(self, max_run_length=60):
+        """
+        :param max_run_length:  int, number of ticks to run
+        :return:                pd.DataFrame, metrics (see get_metrics) with one row per tick
+        """
+        metrics = []
+        for _ in range(max_run_length):
+            self.step()
+            metrics.append(self.get_metrics())
+
+        return pd.DataFrame(metrics)
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Results
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def get_belief_distribution(self):
+        """
+        :return: np.ndarray, share of all agents at each grid point (see self.grid)
+        """
+        return self.mass.sum(axis=(0, 1, 2))
+
+    def get_metrics(self, threshold=50.0):
+        """
+        Same metrics as the DataCollector of MisinfoPy (plus the fraction of agents above the threshold).
+        :param threshold:   float
+        :return:            dict, {metric_name: value}
+        """
+        distribution = self.get_belief_distribution()
+        above = self.grid >= threshold
+        n_above, n_below = distribution[above].sum(), distribution[~above].sum()
+        avg_above = (distribution[above] @ self.grid[above]) / n_above if n_above > 0 else None
+        avg_below = (distribution[~above] @ self.grid[~above]) / n_below if n_below > 0 else None
+
+        return {'Avg Vax-Belief': distribution @ self.grid,
+                'Avg Vax-Belief above threshold': avg_above if avg_above is not None else avg_below,
+                'Avg Vax-Belief below threshold': avg_below if avg_below is not None else avg_above,
+                'Fraction above threshold': n_above}
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Degree classes
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def degree_classes_barabasi_albert(n_agents, n_edges, n_classes=6):
+    """
+    Degree classes of the (directed, bidirectional) Barabasi Albert graph of random_graph(), from its asymptotic degree
+    distribution P(k) = 2m(m+1) / (k(k+1)(k+2)), k in [m, m * sqrt(n_agents)]. Each agent follows as many accounts as it
+    has followers. Computed without building the graph.
+    :param n_agents:    int
+    :param n_edges:     int, m
+    :param n_classes:   int, number of logarithmic degree classes
+    :return:            tuple, (n_following, n_followers, share, n_followers_range), first three per degree class
+    """
+    min_degree = n_edges
+    max_degree = max(int(round(n_edges * math.sqrt(n_agents))), min_degree + 1)
+    degrees = np.arange(min_degree, max_degree + 1)
+    probabilities = 2 * n_edges * (n_edges + 1) / (degrees * (degrees + 1.0) * (degrees + 2.0))
+
+    return get_degree_classes(degrees, degrees, probabilities, n_classes)
+
+
+def degree_classes_from_network(network, n_classes=6):
+    """
+    Degree classes of an existing network (e.g., an empirical one). O(n_agents), but only once.
+    :param network:     StaticNetwork or DynamicNetwork
+    :param n_classes:   int, number of logarithmic degree classes
+    :return:            tuple, (n_following, n_followers, share, n_followers_range), first three per degree class
+    """
+    n_following = np.asarray(network.n_following, dtype=float)
+    n_followers = np.asarray(network.n_followers, dtype=float)
+
+    return get_degree_classes(n_following, n_followers, np.ones(len(n_followers)), n_classes)
+
+
+def get_degree_classes(n_following, n_followers, weights, n_classes):
+    """
+    Groups (weighted) agents into logarithmic classes of their number of followers.
+    Agents that follow nobody never receive posts, so their class is given at least 1 following.
+    :param n_following: np.ndarray
+    :param n_followers: np.ndarray
+    :param weights:     np.ndarray, (relative) number of agents with these degrees
+    :param n_classes:   int
+    :return:            tuple, (n_following, n_followers, share, n_followers_range), first three per degree class
+    """
+    n_followers_range = (float(n_followers.min()), float(n_followers.max()))
+    edges = np.geomspace(max(n_followers_range[0], 1), n_followers_range[1] + 1, n_classes + 1)
+    classes = np.clip(np.searchsorted(edges, np.maximum(n_followers, 1), side='right') - 1, 0, n_classes - 1)
+
+    shares = np.bincount(classes, weights=weights, minlength=n_classes)
+    used = shares > 0
+    class_n_following = np.bincount(classes, weights=weights * n_following, minlength=n_classes)[used] / shares[used]
+    class_n_followers = np.bincount(classes, weights=weights * n_followers, minlength=n_classes)[used] / shares[used]
+    shares = shares[used] / shares.sum()
+
+    return np.maximum(class_n_following, 1.0), class_n_followers, shares, n_followers_range
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Helper Functions
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def normal_cdf(x):
+    """
+    Standard normal CDF, vectorized (Abramowitz & Stegun 7.1.26, absolute error < 1.5e-7).
+    :param x:   np.ndarray
+    :return:    np.ndarray
+    """
+    z = np.abs(x) / math.sqrt(2)
+    t = 1 / (1 + 0.3275911 * z)
+    polynomial = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1 - polynomial * np.exp(-z ** 2)
+
+    return 0.5 * (1 + np.sign(x) * erf)
+
+
+def get_transfer_matrix(grid, cell_edges, new_beliefs, std_dev):
+    """
+    Moves the mass at each grid point to N(new_belief, std_dev^2), discretized onto the grid cells (mass outside of
+    [0,100] stays in the first/last cell). The mean is split linearly between the two neighboring grid points, so that
+    small updates (below the grid spacing) are not lost.
+    :param grid:        np.ndarray, (n_points,)
+    :param cell_edges:  np.ndarray, (n_points + 1,) from -inf to inf
+    :param new_beliefs: np.ndarray, (n_points,) target mean of each grid point
+    :param std_dev:     np.ndarray, (n_points,)
+    :return:            np.ndarray, (n_points, n_points), rows sum up to 1
+    """
+    spacing = grid[1] - grid[0]
+    lower = np.clip(np.floor((new_beliefs - grid[0]) / spacing).astype(int), 0, len(grid) - 2)
+    upper_share = np.clip((new_beliefs - grid[lower]) / spacing, 0, 1)
+    std_dev = np.maximum(std_dev, 1e-9)[:, None]
+
+    transfer = np.zeros((len(grid), len(grid)))
+    for centers, share in ((grid[lower], 1 - upper_share), (grid[lower + 1], upper_share)):
+        cdf = normal_cdf((cell_edges[None, :] - centers[:, None]) / std_dev)
+        transfer += share[:, None] * np.diff(cdf, axis=1)
+
+    return transfer
+
+
+def get_expected_n_posts(beliefs, mu, sigma):
+    """
+    Expected number of posts per tick (see sample_number_of_posts): round(max(0, N(mu', sigma))), where mu' is
+    increased for extreme beliefs.
+    :param beliefs: np.ndarray
+    :param mu:      float
+    :param sigma:   float
+    :return:        np.ndarray
+    """
+    mu = mu + np.where((beliefs < 15) | (beliefs > 85), 2, np.where((beliefs < 30) | (beliefs > 70), 1, 0))
+    max_n_posts = int(np.max(mu) + 8 * sigma) + 1
+
+    # E[round(max(0, X))] = sum_j P(X >= j - 0.5)
+    thresholds = np.arange(1, max_n_posts + 1) - 0.5
+    return (1 - normal_cdf((thresholds[None, :] - mu[:, None]) / sigma)).sum(axis=1)
+
+
+def get_update_elasticity(beliefs, std_dev=15.0):
+    """
+    Vectorized calculate_update_elasticity.
+    :param beliefs: np.ndarray
+    :param std_dev: float
+    :return:        np.ndarray
+    """
+    return np.exp(-0.5 * ((beliefs - 50) / std_dev) ** 2)
+
+
+def get_acceptance_rate(stances, media_literacy, ranking_intervention, factcheck_probabilities):
+    """
+    Probability that a post with the given stance is seen (visibility, see Post) and judged as truthful
+    (see judge_truthfulness_realistic), averaged over its FactCheckResult.
+    :param stances:                 np.ndarray
+    :param media_literacy:          MediaLiteracy, of the receiver
+    :param ranking_intervention:    bool
+    :param factcheck_probabilities: tuple, see FactCheckResult.get_ground_truth_probability
+    :return:                        np.ndarray
+    """
+    p_low, p_middle, p_high = factcheck_probabilities
+    p_true = np.where(stances <= 20, p_low, np.where(stances <= 80, p_middle, p_high))
+    visibility = np.abs(50 - stances) / 50
+
+    visibility_false = visibility * FactCheckResult.FALSE.value if ranking_intervention else visibility
+    if media_literacy.__eq__(MediaLiteracy.HIGH):
+        accept_true, accept_false = 0.8, 0.2
+    else:
+        accept_true, accept_false = 1.0, 1.0
+
+    return p_true * visibility * accept_true + (1 - p_true) * visibility_false * accept_false
+
+
+def get_top_fraction(scores, masses, percentage):
+    """
+    Which fraction of each element is selected, if the elements with the highest scores are selected until
+    percentage of the total mass is reached (ties are selected proportionally).
+    :param scores:      np.ndarray
+    :param masses:      np.ndarray
+    :param percentage:  float, [0,1]
+    :return:            np.ndarray, [0,1] per element
+    """
+    target = percentage * masses.sum()
+    selected = np.zeros(len(scores))
+
+    for score in np.unique(scores)[::-1]:
+        is_tied = scores == score
+        tied_mass = masses[is_tied].sum()
+        if tied_mass >= target:
+            selected[is_tied] = target / tied_mass if tied_mass > 0 else 0.0
+            break
+        selected[is_tied] = 1.0
+        target -= tied_mass
+
+    return selected
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Calibration
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def wasserstein_distance(beliefs, grid, distribution):
+    """
+    Earth mover's distance between agents' beliefs and a distribution on the grid (area between the two CDFs).
+    :param beliefs:         np.ndarray, beliefs of the agents
+    :param grid:            np.ndarray
+    :param distribution:    np.ndarray, share at each grid point
+    :return:                float
+    """
+    x = np.linspace(0, 100, 2001)
+    cdf_agents = np.searchsorted(np.sort(beliefs), x, side='right') / len(beliefs)
+    cdf_grid = np.concatenate([[0], np.cumsum(distribution)])[np.searchsorted(grid, x, side='right')]
+
+    return float(np.sum(np.abs(cdf_agents - cdf_grid)) * (x[1] - x[0]))
+
+
+def calibrate(n_agents_values=(1000, 3000, 10000),
+              scenarios=None,
+              policies=None,
+              n_edges=3,
+              n_replications=3,
+              max_run_length=60,
+              verbose=True):
+    """
+    Compares the mean-field engine with the agent model (mean over replications).
+    :param n_agents_values: iterable of ints
+    :param scenarios:       list of dicts, (default: SCENARIOS of experiments.py)
+    :param policies:        list of tuples, (default: POLICIES of experiments.py)
+    :param n_edges:         int
+    :param n_replications:  int
+    :param max_run_length:  int
+    :param verbose:         bool
+    :return:                pd.DataFrame, calibration report with one row per n_agents, scenario & policy
+    """
+    if scenarios is None:
+        scenarios = SCENARIOS
+    if policies is None:
+        policies = POLICIES
+
+    rows = []
+    for n_agents in n_agents_values:
+        for scenario in scenarios:
+            for policy in policies:
+                media_literacy_intervention, ranking_intervention = policy
+                parameters = dict(n_agents=n_agents, n_edges=n_edges, agent_ratio=scenario,
+                                  media_literacy_intervention=media_literacy_intervention,
+                                  ranking_intervention=ranking_intervention)
+
+                # Agent model
+                start_time = time.perf_counter()
+                agent_metrics = []
+                final_beliefs = []
+                for replication in range(n_replications):
+                    model = MisinfoPy(seed=replication, **parameters)
+                    model.kpis.get_or_register('Fraction above threshold', FractionAbove(50.0))
+                    metrics = []
+                    for snapshot in model.run_iter(max_run_length):
+                        metrics.append({'Avg Vax-Belief': snapshot.metrics['Avg Vax-Belief'],
+                                        'Fraction above threshold': model.kpis['Fraction above threshold']})
+                    agent_metrics.append(pd.DataFrame(metrics))
+                    final_beliefs.append(np.array(snapshot.beliefs, dtype=float))
+                agent_time = (time.perf_counter() - start_time) / n_replications
+                agent_metrics = sum(agent_metrics) / n_replications
+
+                # Mean-field engine
+                start_time = time.perf_counter()
+                mean_field = MeanFieldModel(**parameters)
+                mean_field_metrics = mean_field.run(max_run_length)
+                mean_field_time = time.perf_counter() - start_time
+
+                error = (agent_metrics - mean_field_metrics[agent_metrics.columns]).abs()
+                row = {'n_agents': n_agents, 'Scenario': str(scenario), 'Policy': str(policy),
+                       'Avg belief (agents)': agent_metrics['Avg Vax-Belief'].iloc[-1],
+                       'Avg belief (mean-field)': mean_field_metrics['Avg Vax-Belief'].iloc[-1],
+                       'Fraction above (agents)': agent_metrics['Fraction above threshold'].iloc[-1],
+                       'Fraction above (mean-field)': mean_field_metrics['Fraction above threshold'].iloc[-1],
+                       'Max error avg belief': error['Avg Vax-Belief'].max(),
+                       'Max error fraction above': error['Fraction above threshold'].max(),
+                       'Wasserstein distance': np.mean([wasserstein_distance(beliefs, mean_field.grid,
+                                                                             mean_field.get_belief_distribution())
+                                                        for beliefs in final_beliefs]),
+                       'Agent model time': agent_time,
+                       'Mean-field time': mean_field_time}
+                rows.append(row)
+
+                if verbose:
+                    print(f"{n_agents} {row['Scenario']} {row['Policy']}: "
+                          f"avg belief {row['Avg belief (agents)']:.2f} vs. {row['Avg belief (mean-field)']:.2f}, "
+                          f"W1 {row['Wasserstein distance']:.2f}, "
+                          f"{agent_time:.1f}s vs. {mean_field_time:.2f}s")
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+
+    n_agents_values = (1000, 3000, 10000)
+    n_replications = 3
+    max_run_length = 60
+
+    report = calibrate(n_agents_values, n_replications=n_replications, max_run_length=max_run_length)
+    report.to_csv('results/meanfield_calibration.csv', index=False)
@@ -1,15 +1,22 @@
 from mesa import Model
 from mesa.datacollection import DataCollector
-from mesa.time import StagedActivation
 from mesa.space import NetworkGrid
-import networkx as nx
 
 from agents import *
 from enums import *
+from network import StaticNetwork, DynamicNetwork, top_k_nodes
+from kpis import KPITracker, default_kpis
+from scheduler import SparseStagedActivation
+from snapshots import TickSnapshot
 
 import numpy as np
 import math
-from matplotlib import pyplot as plt
+from contextlib import contextmanager
+
+# Types of the array-backed state per precision: (floats: beliefs, posted stances & tie weights,
+#                                                 integers: node ids, degrees & post counts)
+PRECISIONS = {'float64': (np.float64, np.int64),
+              'float32': (np.float32, np.int32)}
 
 
 class MisinfoPy(Model):
@@ -20,7 +27,18 @@ class MisinfoPy(Model):
                  n_edges=2,
                  agent_ratio=None,
                  media_literacy_intervention=(0.0, SelectAgentsBy.RANDOM),
-                 ranking_intervention=False):
+                 ranking_intervention=False,
+                 network=None,
+                 feed_capacity=None,
+                 dynamic_network=False,
+                 aggregated_exposure=False,
+                 normal_user_vocality=(1.0, 0.7),
+                 update_elasticity_std_dev=15.0,
+                 factcheck_probabilities=(0.0, 0.5, 0.8),
+                 precision='float64',
+                 n_threads=None,
+                 chunk_size=1024,
+                 seed=None):
         """
         Initializes the MisinfoPy
         :param agent_ratio: dictionary {String: float}
@@ -33,24 +51,114 @@ class MisinfoPy(Model):
                     - meaning: Percentage of agents empowered by media literacy intervention.
                                 If 0.0: nobody is empowered by it, i.e., no media literacy intervention.
                                 If 1.0: everybody is empowered by it.
+        :param network: StaticNetwork or None,
+                    If None: a new random graph is generated (with n_agents nodes and n_edges).
+                    Else: the provided (e.g., shared memory or memory-mapped) network is used as is. Then, n_agents and
+                    n_edges are ignored and no NetworkX graph is built (i.e., self.G and self.grid are None).
+        :param feed_capacity: int (>= 1) or None,
+                    If None: agents consider all received posts (each post is seen with probability = its visibility).
+                    Else: each agent's feed is bounded. Only the feed_capacity most visible posts (per tick) are kept
+                    and the seen posts are sampled from them.
+        :param dynamic_network: bool,
+                    If False: the network stays as it is.
+                    If True: agents unfollow sources with dissimilar beliefs and follow new accounts instead
+                    (see BaseAgent.rewire). Then, self.network is a DynamicNetwork.
+        :param aggregated_exposure: bool,
+                    If False: exact path, i.e., each post is a Post object, and is seen & judged by each receiver via
+                    its own coin tosses.
+                    If True: approximate fast mode. The posts of a source per tick are summarized as one PostBatch, and
+                    the numbers of seen & accepted posts per follower are drawn from binomial distributions
+                    (see share_post_batch). Cannot be combined with feed_capacity.
+        :param normal_user_vocality: tuple, (mu, sigma) of the number of posts a NormalUser shares per tick
+        :param update_elasticity_std_dev: float, std_dev of the update elasticity (see calculate_update_elasticity)
+        :param factcheck_probabilities: tuple, probabilities that a post is true (i.e., FactCheckResult.TRUE), for
+                    stances in [0,20], (20,80] and (80,100] (see FactCheckResult.get_ground_truth_probability)
+        :param precision: str, 'float64' or 'float32' (see PRECISIONS). With 'float32', beliefs, posted stances and the
+                    tie weights of the (generated) network are stored as float32, and node ids & counts as int32. This
+                    halves the memory of these arrays. Networks that are passed are used as they are (see
+                    StaticNetwork.astype()). The dynamic network keeps its weights in dicts (not affected).
+        :param n_threads: int or None,
+                    If None: the ticks run agent by agent (via the schedule), the reference engine.
+                    Else: the ticks run on arrays, with the agents partitioned into chunks of chunk_size, and the
+                    chunks of each stage run on n_threads threads (see parallel.ChunkedTickEngine). Each chunk has its
+                    own random stream, so results are reproducible (given seed & chunk_size) for any n_threads.
+                    Only for the exact path on a static network (not with feed_capacity, dynamic_network or
+                    aggregated_exposure).
+        :param chunk_size: int, number of agents per chunk (only if n_threads is not None)
+        :param seed: int or None, random seed. If not None, it also seeds the global random generators (random &
+                    np.random) which are used by agents and posts. Like this, runs with the same seed are identical.
         """
         super().__init__()
 
+        if seed is not None:
+            self.random = random.Random(seed)
+            random.seed(seed)
+            np.random.seed(seed)
+
         if agent_ratio is None:
             agent_ratio = {NormalUser.__name__: 0.9, Disinformer.__name__: 0.1}
 
+        if precision not in PRECISIONS:
+            raise ValueError(f'Unknown precision: {precision} (expected one of {tuple(PRECISIONS)})')
+        self.precision = precision
+        self.float_dtype, self.index_dtype = PRECISIONS[precision]
+
+        if feed_capacity is not None and (isinstance(feed_capacity, bool) or
+                                          not isinstance(feed_capacity, (int, np.integer)) or feed_capacity < 1):
+            raise ValueError(f'Invalid feed_capacity: {feed_capacity!r} (expected None or an int >= 1)')
+
+        # Only agents that received posts (in the share_post_stage) run the update_beliefs_stage
+        self.schedule = SparseStagedActivation(self,
+                                               stage_list=["share_post_stage", "update_beliefs_stage"],
+                                               sparse_stages=["update_beliefs_stage"])
+        if network is None:
+            self.G = random_graph(n_nodes=n_agents, m=n_edges)  # n_nodes = n_agents, exactly 1 agent per node
+            self.grid = NetworkGrid(self.G)
+            self.network = StaticNetwork.from_graph(self.G).astype(self.float_dtype, self.index_dtype)
+        else:
+            n_agents = network.n_nodes
+            self.G = None
+            self.grid = None
+            self.network = network
+        self.dynamic_network = dynamic_network
+        if dynamic_network:
+            self.network = DynamicNetwork.from_static(self.network)
         self.n_agents = n_agents
-        self.schedule = StagedActivation(self, stage_list=["share_post_stage", "update_beliefs_stage"])
-        self.G = random_graph(n_nodes=n_agents, m=n_edges)  # n_nodes = n_agents, exactly 1 agent per node
-        self.grid = NetworkGrid(self.G)
+        self.normal_user_vocality = normal_user_vocality
+        self.update_elasticity_std_dev = update_elasticity_std_dev
+        self.factcheck_probabilities = factcheck_probabilities
         self.post_id_counter = 0
         self.agents_data = {'n_followers_range': (0, 0),
                             'n_following_range': (0, 0)}
         self.init_agents(agent_ratio)
         self.init_followers_and_following()
 
+        # Online KPIs (updated incrementally on each belief change, O(1) to read)
+        for name, kpi in default_kpis().items():
+            self.kpis.register(name, kpi)
+
         self.apply_media_literacy_intervention(media_literacy_intervention)
         self.ranking_intervention = ranking_intervention
+        self.feed_capacity = feed_capacity
+        self.aggregated_exposure = aggregated_exposure
+        if aggregated_exposure and feed_capacity is not None:
+            raise ValueError('The aggregated exposure mode does not support bounded feeds (feed_capacity).')
+
+        # Media literacy of all agents (fixed after the intervention), for vectorized exposure
+        self.high_media_literacy = np.array([agent.media_literacy.__eq__(MediaLiteracy.HIGH)
+                                             for agent in self.agent_list])
+
+        self.n_threads = n_threads
+        self.tick_engine = None  # ChunkedTickEngine (if n_threads is not None)
+        if n_threads is not None:
+            if feed_capacity is not None or dynamic_network or aggregated_exposure:
+                raise ValueError('The chunked engine (n_threads) does not support feed_capacity, dynamic_network or '
+                                 'aggregated_exposure.')
+            from parallel import ChunkedTickEngine
+            self.tick_engine = ChunkedTickEngine(self, n_threads, chunk_size, seed)
+
+        self.profiler = None  # StepProfiler, set by profile()
+        self.event_trace = None  # EventTraceWriter, set by trace_events()
 
         self.data_collector = DataCollector(model_reporters={
             "Avg Vax-Belief": self.get_avg_vax_belief,
@@ -72,7 +180,13 @@ class MisinfoPy(Model):
             f"Agent 10": self.get_vax_belief_100,
         })
 
-        # Overview of how many agents have how many connections
+    def show_follower_histogram(self):
+        """
+        Plots an overview of how many agents have how many connections (followers).
+        Matplotlib is only imported here, so that headless runs do not pay its import cost.
+        """
+        from matplotlib import pyplot as plt
+
         data = [len(agent.followers) for agent in self.schedule.agents]
 
         bins = np.linspace(math.ceil(min(data)),
@@ -86,12 +200,123 @@ class MisinfoPy(Model):
         plt.ylabel('Agent count')
         plt.show()
 
+    @contextmanager
+    def profile(self, path=None, mode='deterministic', interval=0.005, profiler=None):
+        """
+        Profiles the ticks (step() & the ticks of run_iter()) run within the with-block, e.g.:
+            with model.profile('results/profile') as profiler:
+                for snapshot in model.run_iter(60):
+                    ...
+            profiler.print_summary()
+        :param path:        str or None, if given, the profile is saved to path.pstats & path.collapsed at the end
+        :param mode:        str, 'deterministic' (cProfile) or 'sampling'
+        :param interval:    float, seconds between two samples (only for mode='sampling')
+        :param profiler:    StepProfiler or None, to add to an existing profile (e.g., of a whole sweep)
+        :return:            StepProfiler
+        """
+        from profiling import StepProfiler
+
+        created = profiler is None
+        if created:
+            profiler = StepProfiler(mode, interval)
+        profiler.add_model(self)
+
+        self.profiler = profiler
+        try:
+            yield profiler
+        finally:
+            self.profiler = None
+            if created:
+                profiler.close()
+            if path is not None:
+                profiler.save(path)
+
+    @contextmanager
+    def trace_events(self, path, topic=Topic.VAX, chunk_size=65536, record_unseen=True, metadata=None):
+        """
+        Records one event per received post & receiver during the ticks run within the with-block, to a compact binary
+        file (see tracing.py, e.g., replay_kpis() and post_exposure_stats() to analyse it without rerunning):
+            with model.trace_events('results/run.mtrace'):
+                for snapshot in model.run_iter(60):
+                    ...
+        Only for the exact path (not with aggregated_exposure, where posts are not seen & judged one by one).
+        :param path:            str
+        :param topic:           Topic, the belief deltas refer to this topic
+        :param chunk_size:      int, max. number of buffered events (bounds the memory)
+        :param record_unseen:   bool, whether to record the received posts that were not seen as well
+        :param metadata:        dict or None, additional metadata stored in the trace (e.g., scenario, policy & seed)
+        :return:                EventTraceWriter
+        """
+        from tracing import EventTraceWriter
+
+        if self.aggregated_exposure:
+            raise ValueError('Event traces are not supported in the aggregated exposure mode.')
+        if self.tick_engine is not None:
+            raise ValueError('Event traces are not supported by the chunked engine (n_threads).')
+
+        trace = EventTraceWriter(path, self, topic, chunk_size, record_unseen=record_unseen, metadata=metadata)
+        self.event_trace = trace
+        try:
+            yield trace
+        finally:
+            self.event_trace = None
+            trace.close()
+
     def step(self):
         """Advance the model by one step."""
-        self.schedule.step()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+        self.kpis.start_tick()
+        self.run_stages()
         self.data_collector.collect(self)
         self.data_collector2.collect(self)
 
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def run_stages(self):
+        """Runs the stages of one tick (share & update), agent by agent or chunk-wise (if n_threads is not None)."""
+        if self.tick_engine is not None:
+            self.tick_engine.step()
+        else:
+            self.schedule.step()
+
+    def run_iter(self, max_run_length=60, topic=Topic.VAX, collect_data=False):
+        """
+        Runs the model and yields a lightweight TickSnapshot after each tick (generator).
+        Callers can stream results (e.g., to disk or plots) while the run progresses. Memory stays bounded no matter
+        the run length, because (by default) no DataCollector history is kept.
+        :param max_run_length:  int, number of ticks to run
+        :param topic:           Topic, the beliefs on this topic are included in the snapshots
+        :param collect_data:    bool, whether to also collect the data of the DataCollectors (i.e., like step())
+        :return:                generator of TickSnapshots
+        """
+        beliefs = self.belief_array[:, topic.value]
+        beliefs.flags.writeable = False  # only the view is read-only (the model still writes into belief_array)
+
+        for _ in range(max_run_length):
+            n_posts_before = self.post_id_counter
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.enable()
+
+            if collect_data:
+                self.step()
+            else:
+                self.kpis.start_tick()
+                self.run_stages()
+
+            metrics = {name: reporter(self) for name, reporter in self.data_collector.model_reporters.items()}
+            counters = {'n_posts': self.post_id_counter - n_posts_before,
+                        'n_posts_total': self.post_id_counter,
+                        'n_active_agents': self.schedule.n_active_agents}
+
+            if profiler is not None:
+                profiler.disable()
+
+            yield TickSnapshot(self.schedule.steps, beliefs, metrics, counters)
+
     # –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
     # Init functions
     # –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
@@ -108,6 +333,12 @@ class MisinfoPy(Model):
             types.append(agent_type)
             percentages.append(percentage)
 
+        # Compact, array-backed agent state: beliefs & (running sums of) the stances of posts each agent shared
+        self.belief_array = np.zeros((self.n_agents, len(Topic)), dtype=self.float_dtype)
+        self.posted_stance_sums = np.zeros((self.n_agents, len(Topic)), dtype=self.float_dtype)
+        self.n_posted_stances = np.zeros((self.n_agents, len(Topic)), dtype=self.index_dtype)
+        self.kpis = KPITracker(self.belief_array)
+
         # Create agents & add them to the scheduler
         for i in range(self.n_agents):
 
@@ -122,9 +353,16 @@ class MisinfoPy(Model):
                 a = Disinformer(i, self)
                 self.schedule.add(a)
 
+        # Agents by unique_id (i.e., by node id of the network)
+        self.agent_list = self.schedule.agents
+
+        # Without a NetworkX graph (i.e., with a provided StaticNetwork), there is no grid to place the agents in.
+        if self.G is None:
+            return
+
         # Place each agent in its node. (& save node_position into agent)
         for node in self.G.nodes:  # each node is just an integer (i.e., a node_id)
-            agent = self.schedule.agents[node]
+            agent = self.agent_list[node]
 
             # save node_position into agent
             self.grid.place_agent(agent, node)
@@ -133,33 +371,13 @@ class MisinfoPy(Model):
             self.G.nodes[node]['agent'] = agent
 
     def init_followers_and_following(self):
-        """Initializes the followers and following of each agent."""
-        n_followers_list = []
-        n_following_list = []
-
-        # Init followers & following (after all agents have been set up)
-        for agent in self.schedule.agents:
-            # Gather connected agents
-            predecessors = [self.schedule.agents[a] for a in self.G.predecessors(agent.unique_id)]
-            successors = [self.schedule.agents[a] for a in self.G.successors(agent.unique_id)]
-
-            # Assign to this agent
-            agent.following = predecessors
-            agent.followers = successors
-
-            # Gather number of followers/following to this agent
-            n_following_list.append(len(agent.following))
-            n_followers_list.append(len(agent.followers))
-
-        # Gather boundaries of ranges (n_followers & n_following)
-        min_n_following = min(n_following_list)
-        max_n_following = max(n_following_list)
-        min_n_followers = min(n_followers_list)
-        max_n_followers = max(n_followers_list)
-
-        # Save ranges into agents_data
-        self.agents_data["n_following_range"] = (min_n_following, max_n_following)
-        self.agents_data["n_followers_range"] = (min_n_followers, max_n_followers)
+        """
+        Initializes the followers and following of each agent. (Agents read them as agent ids directly from the
+        StaticNetwork, so only the ranges are gathered here.)
+        """
+        # Save ranges into agents_data (the degree statistics are precomputed in the network)
+        self.agents_data["n_following_range"] = self.network.n_following_range
+        self.agents_data["n_followers_range"] = self.network.n_followers_range
 
     def apply_media_literacy_intervention(self, media_literacy_intervention=(0.0, SelectAgentsBy.RANDOM)):
         """
@@ -185,14 +403,25 @@ class MisinfoPy(Model):
 
     def select_agents_for_media_literacy_intervention(self, n_select=0, select_by=SelectAgentsBy.RANDOM):
         """
-        Select agents for the intervention.
+        Select agents for the intervention. Each agent is selected at most once (i.e., without replacement), so that
+        exactly n_select agents are reached. The rankings of the network are cached (see StaticNetwork).
         :param n_select:    int, how many agents should be selected for the intervention
         :param select_by:   SelectBy(Enum), selection method, e.g. SelectBy.RANDOM
         :return:            list of agents, [(Base)Agent, (Base)Agent, ...]
         """
         selected_agents = []
         if select_by.__eq__(SelectAgentsBy.RANDOM):
-            selected_agents = random.choices(self.schedule.agents, k=n_select)
+            selected_agents = random.sample(self.schedule.agents, k=n_select)
+        elif select_by.__eq__(SelectAgentsBy.HIGH_N_FOLLOWERS):
+            selected_ids = self.network.nodes_by_n_followers()[:n_select]
+            selected_agents = [self.agent_list[agent_id] for agent_id in selected_ids.tolist()]
+        elif select_by.__eq__(SelectAgentsBy.HIGH_CENTRALITY):
+            selected_ids = self.network.nodes_by_centrality()[:n_select]
+            selected_agents = [self.agent_list[agent_id] for agent_id in selected_ids.tolist()]
+        elif select_by.__eq__(SelectAgentsBy.EXTREME_BELIEF):
+            extremeness = np.abs(self.belief_array[:, Topic.VAX.value] - 50.0)
+            selected_ids = top_k_nodes(extremeness, n_select)
+            selected_agents = [self.agent_list[agent_id] for agent_id in selected_ids.tolist()]
         else:
             print(f'ERROR: Selection style not yet implemented. '
                   f'To sample which agents will be empowered by the media literacy intervention,'
@@ -206,14 +435,10 @@ class MisinfoPy(Model):
     def get_avg_vax_belief(self, dummy) -> float:  # dummy parameter: to avoid error
         """
         Return average belief of all agents on a given topic. For the DataCollector.
+        (Online KPI, see kpis.py: O(1) instead of a scan over all agents.)
         :return:        float
         """
-        topic = str(Topic.VAX)
-
-        agent_beliefs = [a.beliefs[topic] for a in self.schedule.agents]
-        avg_belief = sum(agent_beliefs) / len(agent_beliefs)
-
-        return avg_belief
+        return self.kpis['Avg Vax-Belief']
 
     def get_vax_category_sizes(self, dummy) -> tuple:  # dummy parameter: to avoid error
         """
@@ -223,14 +448,7 @@ class MisinfoPy(Model):
         # :param topic:       Topic  # to make it more programmatic later
         :return:            tuple
         """
-        topic = Topic.VAX
-        threshold = 50.0
-
-        agent_beliefs = [a.beliefs[topic] for a in self.schedule.agents]
-        n_above = sum([1 for a_belief in agent_beliefs if a_belief >= threshold])
-        n_below = len(agent_beliefs) - n_above
-
-        return n_above, n_below
+        return self.kpis['Agents above threshold'], self.kpis['Agents below threshold']
 
     def get_above_vax_threshold(self, dummy) -> int:  # adjust code later: threshold_dict={Topic.VAX: 50.0}?
         """
@@ -239,13 +457,7 @@ class MisinfoPy(Model):
         # :param threshold_dict:   dict {Topic: float}  # to make it more programmatic later. Not sure whether possible.
         :return: int
         """
-        topic = Topic.VAX
-        threshold = 50.0
-
-        agent_beliefs = [a.beliefs[topic] for a in self.schedule.agents]
-        n_above = sum([1 for a_belief in agent_beliefs if a_belief >= threshold])
-
-        return n_above
+        return self.kpis['Agents above threshold']
 
     def get_below_vax_threshold(self, dummy) -> int:  # dummy parameter: to avoid error
         """
@@ -255,47 +467,25 @@ class MisinfoPy(Model):
         # :param topic:       Topic  # to make it more programmatic later
         :return:            tuple
         """
-        topic = Topic.VAX
-        threshold = 50.0
-
-        agent_beliefs = [a.beliefs[topic] for a in self.schedule.agents]
-        n_below = sum([1 for a_belief in agent_beliefs if a_belief < threshold])
-
-        return n_below
+        return self.kpis['Agents below threshold']
 
     def get_avg_above_vax_threshold(self, dummy) -> float:
         """
         Returns the average belief of agents that are above the provided threshold.
          For the DataCollector.
+        (If nobody is above the threshold, the average of the agents below the threshold is returned.)
         :return: float
         """
-        topic = str(Topic.VAX)
-        threshold = 50.0
-
-        beliefs_above_threshold = [a.beliefs[topic] for a in self.schedule.agents if a.beliefs[topic] >= threshold]
-        if len(beliefs_above_threshold) == 0:
-            avg = self.get_avg_below_vax_threshold(self)  # If nobody above threshold, take avg of below threshold.
-        else:
-            avg = sum(beliefs_above_threshold) / len(beliefs_above_threshold)
-        return avg
+        return self.kpis['Avg Vax-Belief above threshold']
 
     def get_avg_below_vax_threshold(self, dummy) -> float:
         """
         Returns the average belief of agents that are below the provided threshold.
          For the DataCollector.
+        (If nobody is below the threshold, the average of the agents above the threshold is returned.)
         :return: float
         """
-        topic = str(Topic.VAX)
-        threshold = 50.0
-
-        beliefs_below_threshold = [a.beliefs[topic] for a in self.schedule.agents if a.beliefs[topic] < threshold]
-
-        if len(beliefs_below_threshold) == 0:
-            avg = self.get_avg_above_vax_threshold(self)  # If nobody below threshold, take avg of above threshold.
-        else:
-            avg = sum(beliefs_below_threshold) / len(beliefs_below_threshold)
-
-        return avg
+        return self.kpis['Avg Vax-Belief below threshold']
 
     def get_vax_beliefs(self) -> list:
         """
@@ -303,8 +493,8 @@ class MisinfoPy(Model):
         For the DataCollector.
         :return: list (of floats)
         """
-        topic = str(Topic.VAX)
-        vax_beliefs = [agent.beliefs[topic] for agent in self.schedule.agents]
+        topic_idx = Topic.VAX.value
+        vax_beliefs = self.belief_array[:, topic_idx].tolist()
 
         return vax_beliefs
 
@@ -460,7 +650,7 @@ class MisinfoPy(Model):
 #   Graph Functions
 # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
 
-def random_graph(n_nodes, m, seed=None, directed=True) -> nx.Graph:
+def random_graph(n_nodes, m, seed=None, directed=True) -> 'nx.Graph':
     """
     Generates a random graph a la Barabasi Albert.
     :param n_nodes:     int, number of nodes
@@ -475,6 +665,8 @@ def random_graph(n_nodes, m, seed=None, directed=True) -> nx.Graph:
     # Later:    Potential extension: parameter for skew of node degree.
     # FYI:      n=10, m=3, doesn't create 30 edges, but only e.g., 21. Not each node has 3 edges.
     """
+    import networkx as nx  # only needed to generate a network (not when a StaticNetwork is passed)
+
     graph = nx.barabasi_albert_graph(n_nodes, m, seed)
 
     if directed:  # --> has key
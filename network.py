@@ -0,0 +1,903 @@
+import hashlib
+import itertools
+import json
+import os
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+class StaticNetwork:
+    """
+    Read-only, array-backed representation of the follower network (CSR format).
+
+    Row i of the forward arrays holds the followers of agent i (i.e., the successors of node i in the graph) together
+    with the weights of these edges. Row i of the reverse arrays holds the accounts agent i is following
+    (i.e., the predecessors of node i). The derived degree statistics are stored next to them.
+
+    All arrays can live in ordinary memory, in shared memory blocks (multiprocessing.shared_memory) or in
+    memory-mapped .npy files. Like this, many worker processes can attach to one single copy of the network.
+    """
+
+    # Names of all arrays that make up a StaticNetwork (they are shared/saved under these names)
+    ARRAY_NAMES = ('indptr', 'indices', 'weights', 'rev_indptr', 'rev_indices', 'n_followers', 'n_following')
+
+    def __init__(self, indptr, indices, weights, rev_indptr=None, rev_indices=None, n_followers=None,
+                 n_following=None):
+        """
+        :param indptr:      np.ndarray, (n_nodes + 1,) row pointers of the followers-rows
+        :param indices:     np.ndarray, (n_edges,) follower ids, sorted within each row
+        :param weights:     np.ndarray, (n_edges,) edge weights, aligned with indices
+        :param rev_indptr:  np.ndarray, (n_nodes + 1,) row pointers of the following-rows (derived if None)
+        :param rev_indices: np.ndarray, (n_edges,) ids of followed accounts (derived if None)
+        :param n_followers: np.ndarray, (n_nodes,) number of followers per node (derived if None)
+        :param n_following: np.ndarray, (n_nodes,) number of followed accounts per node (derived if None)
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+        if rev_indptr is None or rev_indices is None:
+            rev_indptr, rev_indices = transpose_csr(indptr, indices)
+        self.rev_indptr = rev_indptr
+        self.rev_indices = rev_indices
+
+        if n_followers is None:
+            n_followers = np.diff(indptr)
+        if n_following is None:
+            n_following = np.diff(rev_indptr)
+        self.n_followers = n_followers
+        self.n_following = n_following
+
+        # Shared memory blocks that back the arrays (only if created by/attached to shared memory)
+        self._shared_memory_blocks = []
+
+        # Caches of node rankings (computed on first use)
+        self._nodes_by_n_followers = None
+        self._centrality = None
+        self._nodes_by_centrality = None
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Construction
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Builds the StaticNetwork from a (MultiDi)Graph as created by random_graph().
+        Nodes are assumed to be the integers 0, ..., n_nodes - 1.
+        :param graph:   nx.MultiDiGraph, with 'weight' attribute on each edge
+        :return:        StaticNetwork
+        """
+        n_nodes = graph.number_of_nodes()
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        indices = []
+        weights = []
+
+        for node in range(n_nodes):
+            # Always key=0, because maximally one connection in each direction is possible.
+            successors = sorted(graph.successors(node))
+            indices.extend(successors)
+            weights.extend(graph.edges[node, successor, 0]['weight'] for successor in successors)
+            indptr[node + 1] = len(indices)
+
+        indices = np.asarray(indices, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+
+        return cls(indptr, indices, weights)
+
+    @classmethod
+    def from_edge_list(cls, path, cache_directory=None, delimiter=None, reverse=False, chunk_size=1000000, seed=None):
+        """
+        Loads an (empirical) follower network from an edge-list file, e.g., with tens of millions of edges.
+        Each line is 'source target [weight]', meaning target follows source (i.e., posts flow from source to target).
+        Lines starting with '#' are ignored, all other lines must have the same number of columns. Node ids can be any
+        (64-bit) integers; they are renamed to 0, ..., n_nodes - 1 (the original ids are saved as node_ids.npy in the
+        cache).
+
+        The file is streamed in chunks (not via NetworkX) into raw binary columns, the node ids are collected & renamed
+        chunk by chunk, and the CSR arrays are built once into a compact binary cache (.npy files). Later loads only
+        memory-map that cache (which is rebuilt if the file or the options delimiter, reverse or seed change).
+        Building the CSR arrays sorts all edges in memory: the peak is ~75-90 bytes per edge (e.g., ~4.5 GB for 50
+        million edges), once.
+        :param path:            str, path to the edge-list file
+        :param cache_directory: str or None, where to save the cache (default: path + '.cache' with the default
+                                options, else path + '.<hash of the options>.cache')
+        :param delimiter:       str or None, column delimiter (None: any whitespace)
+        :param reverse:         bool, if True: each line is 'follower followed [weight]' instead
+        :param chunk_size:      int, number of lines (or edges) that are processed at once
+        :param seed:            int or None, random seed for the weights (only used if the file has no weights)
+        :return:                StaticNetwork, memory-mapped (read-only)
+        """
+        options = {'delimiter': delimiter, 'reverse': bool(reverse), 'seed': None if seed is None else int(seed)}
+        if cache_directory is None:
+            default_options = {'delimiter': None, 'reverse': False, 'seed': None}
+            cache_directory = default_cache_directory(path, options, default_options)
+        if is_cache_valid(cache_directory, path, options):
+            return cls.load(cache_directory, mmap=True)
+
+        os.makedirs(cache_directory, exist_ok=True)
+        column_paths = [os.path.join(cache_directory, name + '.tmp') for name in ('sources', 'targets', 'weights')]
+
+        # 1st pass: stream the text file into raw binary columns
+        weighted = None
+        row_dtype = None  # node ids as int64 (as float64, ids above 2**53 would be merged), other columns as float64
+        n_lines_read = 0
+        with open(path) as file, \
+                open(column_paths[0], 'wb') as sources_file, \
+                open(column_paths[1], 'wb') as targets_file, \
+                open(column_paths[2], 'wb') as weights_file:
+            while True:
+                lines = list(itertools.islice(file, chunk_size))
+                if len(lines) == 0:
+                    break
+                n_lines_read += len(lines)
+
+                if row_dtype is None:
+                    first_line = next((line for line in lines if line.split('#')[0].split(delimiter)), None)
+                    if first_line is None:
+                        continue
+                    n_columns = len(first_line.split('#')[0].split(delimiter))
+                    if n_columns < 2:
+                        raise ValueError(f'{path}: expected lines \'source target [weight]\', '
+                                         f'found {n_columns} column.')
+                    weighted = n_columns >= 3
+                    row_dtype = np.dtype([('source', np.int64), ('target', np.int64)] +
+                                         [(f'column_{i}', np.float64) for i in range(2, n_columns)])
+
+                try:
+                    chunk = np.loadtxt(lines, dtype=row_dtype, delimiter=delimiter, comments='#', ndmin=1)
+                except ValueError as error:
+                    raise ValueError(f'{path}, lines {n_lines_read - len(lines) + 1}-{n_lines_read}: every line must '
+                                     f'have {len(row_dtype)} columns (source & target as integers), like the first '
+                                     f'line ({error})') from error
+                if len(chunk) == 0:
+                    continue
+
+                chunk['source'].tofile(sources_file)
+                chunk['target'].tofile(targets_file)
+                if weighted:
+                    chunk['column_2'].tofile(weights_file)
+
+        # 2nd pass (chunk by chunk): the sorted distinct node ids
+        id_size = np.dtype(np.int64).itemsize
+        n_edges = os.path.getsize(column_paths[0]) // id_size
+        node_ids = np.empty(0, dtype=np.int64)
+        for start in range(0, n_edges, chunk_size):
+            for column_path in column_paths[:2]:
+                ids = np.fromfile(column_path, dtype=np.int64, count=chunk_size, offset=start * id_size)
+                merged = np.sort(np.concatenate([node_ids, np.unique(ids)]), kind='stable')  # 2 sorted runs: merged
+                node_ids = merged[np.r_[True, merged[1:] != merged[:-1]]]
+
+        # 3rd pass (chunk by chunk): rename the nodes to their position in node_ids
+        sources = np.empty(n_edges, dtype=np.int64)
+        targets = np.empty(n_edges, dtype=np.int64)
+        for start in range(0, n_edges, chunk_size):
+            for column_path, renamed in zip(column_paths[:2], (sources, targets)):
+                ids = np.fromfile(column_path, dtype=np.int64, count=chunk_size, offset=start * id_size)
+                renamed[start:start + len(ids)] = np.searchsorted(node_ids, ids)
+        weights = np.fromfile(column_paths[2], dtype=np.float64) if weighted else None
+        if reverse:
+            sources, targets = targets, sources
+
+        # Build the CSR arrays (in memory)
+        network = build_csr(sources, targets, weights, len(node_ids), seed)
+        del sources, targets, weights
+        network.save(cache_directory, source=describe_source(path), options=options)
+        np.save(os.path.join(cache_directory, 'node_ids.npy'), node_ids)
+
+        for column_path in column_paths:
+            os.remove(column_path)
+
+        return cls.load(cache_directory, mmap=True)
+
+    @classmethod
+    def from_csr_file(cls, path, cache_directory=None, seed=None):
+        """
+        Loads a follower network from a CSR .npz file, with the arrays 'indptr', 'indices' and optionally 'weights'
+        (or 'data', as saved by scipy.sparse.save_npz). Row i contains the followers of node i.
+        Like from_edge_list(), the file is converted once into a (memory-mappable) cache.
+        :param path:            str, path to the .npz file
+        :param cache_directory: str or None, where to save the cache (default: path + '.cache' with the default seed,
+                                else path + '.<hash of the options>.cache')
+        :param seed:            int or None, random seed for the weights (only used if the file has no weights)
+        :return:                StaticNetwork, memory-mapped (read-only)
+        """
+        options = {'seed': None if seed is None else int(seed)}
+        if cache_directory is None:
+            cache_directory = default_cache_directory(path, options, {'seed': None})
+        if is_cache_valid(cache_directory, path, options):
+            return cls.load(cache_directory, mmap=True)
+
+        with np.load(path) as arrays:
+            matrix_format = arrays['format'].item() if 'format' in arrays else 'csr'
+            if isinstance(matrix_format, bytes):
+                matrix_format = matrix_format.decode()
+            if matrix_format != 'csr':
+                raise ValueError(f'Only CSR matrices are supported, not {matrix_format}.')
+
+            indptr = arrays['indptr']
+            targets = arrays['indices'].astype(np.int64)
+            weights = None
+            for name in ('weights', 'data'):
+                if name in arrays:
+                    weights = arrays[name].astype(np.float64)
+
+        n_nodes = len(indptr) - 1
+        sources = np.repeat(np.arange(n_nodes, dtype=np.int64), np.diff(indptr))
+
+        network = build_csr(sources, targets, weights, n_nodes, seed)
+        network.save(cache_directory, source=describe_source(path), options=options)
+
+        return cls.load(cache_directory, mmap=True)
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Queries
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    @property
+    def n_nodes(self):
+        """
+        :return: int, number of nodes (i.e., agents) in the network
+        """
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self):
+        """
+        :return: int, number of directed edges in the network
+        """
+        return len(self.indices)
+
+    @property
+    def n_followers_range(self):
+        """
+        :return: tuple, (min_n_followers, max_n_followers)
+        """
+        return int(self.n_followers.min()), int(self.n_followers.max())
+
+    @property
+    def n_following_range(self):
+        """
+        :return: tuple, (min_n_following, max_n_following)
+        """
+        return int(self.n_following.min()), int(self.n_following.max())
+
+    def followers(self, node):
+        """
+        Returns the followers of a node (i.e., its successors). Zero-copy view into the shared arrays.
+        :param node:    int
+        :return:        np.ndarray of node ids
+        """
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def following(self, node):
+        """
+        Returns the accounts a node is following (i.e., its predecessors). Zero-copy view into the shared arrays.
+        :param node:    int
+        :return:        np.ndarray of node ids
+        """
+        return self.rev_indices[self.rev_indptr[node]:self.rev_indptr[node + 1]]
+
+    def find_edge(self, source, target):
+        """
+        Returns the position of the edge source -> target in the arrays (indices & weights).
+        :param source:  int
+        :param target:  int
+        :return:        int, or None if the edge is not in the network
+        """
+        start = self.indptr[source]
+        end = self.indptr[source + 1]
+        position = start + np.searchsorted(self.indices[start:end], target)
+
+        if position == end or self.indices[position] != target:
+            return None
+
+        return position
+
+    def has_edge(self, source, target):
+        """
+        :param source:  int
+        :param target:  int
+        :return:        bool, whether the edge source -> target is in the network
+        """
+        return self.find_edge(source, target) is not None
+
+    def weight(self, source, target):
+        """
+        Returns the weight of the edge source -> target.
+        :param source:  int
+        :param target:  int
+        :return:        float
+        """
+        position = self.find_edge(source, target)
+
+        if position is None:
+            raise KeyError(f'Edge ({source}, {target}) is not in the network.')
+
+        return float(self.weights[position])
+
+    def get_weight(self, source, target, default=None):
+        """
+        Returns the weight of the edge source -> target, or default if the edge is not in the network.
+        :param source:  int
+        :param target:  int
+        :param default: any
+        :return:        float or default
+        """
+        position = self.find_edge(source, target)
+
+        if position is None:
+            return default
+
+        return float(self.weights[position])
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Rankings
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def nodes_by_n_followers(self):
+        """
+        Node ids sorted by number of followers (descending; ties by id). Cached, so selecting the top-k is O(k).
+        :return: np.ndarray of node ids
+        """
+        if self._nodes_by_n_followers is None:
+            self._nodes_by_n_followers = np.argsort(-np.asarray(self.n_followers), kind='stable')
+
+        return self._nodes_by_n_followers
+
+    def centrality(self, damping=0.85, tolerance=1e-10, max_iterations=100):
+        """
+        PageRank of each node along the direction in which posts spread, i.e., a node is central if it is followed by
+        nodes that are central themselves. Cached (computed once per network).
+        :param damping:         float, (0,1)
+        :param tolerance:       float, convergence threshold (L1 norm of the change)
+        :param max_iterations:  int
+        :return:                np.ndarray, (n_nodes,) of floats, sums up to 1
+        """
+        if self._centrality is None:
+            n_nodes = self.n_nodes
+            sources = np.repeat(np.arange(n_nodes), np.diff(self.indptr))
+            n_following = np.asarray(self.n_following, dtype=float)
+            dangling = n_following == 0
+
+            rank = np.full(n_nodes, 1 / n_nodes)
+            for _ in range(max_iterations):
+                # Each follower passes its rank on (in equal parts) to the accounts it is following
+                shares = np.divide(rank, n_following, out=np.zeros(n_nodes), where=~dangling)
+                new_rank = damping * np.bincount(sources, weights=shares[self.indices], minlength=n_nodes)
+                new_rank += (1 - damping * (1 - rank[dangling].sum())) / n_nodes
+                converged = np.abs(new_rank - rank).sum() < tolerance
+                rank = new_rank
+                if converged:
+                    break
+
+            self._centrality = rank
+
+        return self._centrality
+
+    def nodes_by_centrality(self):
+        """
+        Node ids sorted by centrality (descending; ties by id). Cached, so selecting the top-k is O(k).
+        :return: np.ndarray of node ids
+        """
+        if self._nodes_by_centrality is None:
+            self._nodes_by_centrality = np.argsort(-self.centrality(), kind='stable')
+
+        return self._nodes_by_centrality
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Precision
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    @property
+    def nbytes(self):
+        """
+        :return: int, memory of all arrays (in bytes)
+        """
+        return sum(getattr(self, name).nbytes for name in self.ARRAY_NAMES)
+
+    def astype(self, float_dtype=np.float64, index_dtype=np.int64):
+        """
+        Returns the network with the weights stored as float_dtype and the node ids, degrees & row pointers as
+        index_dtype, e.g., astype(np.float32, np.int32) halves the memory. (Row pointers stay int64 if the number
+        of edges does not fit into index_dtype.) The converted arrays are ordinary (i.e., not shared) copies, so
+        shared or memory-mapped networks should be converted before they are shared or saved.
+        :param float_dtype: np.dtype
+        :param index_dtype: np.dtype
+        :return:            StaticNetwork, self if the arrays already have these types
+        """
+        pointer_dtype = index_dtype if self.n_edges <= np.iinfo(index_dtype).max else np.int64
+        dtypes = {'indptr': pointer_dtype, 'indices': index_dtype, 'weights': float_dtype,
+                  'rev_indptr': pointer_dtype, 'rev_indices': index_dtype, 'n_followers': index_dtype,
+                  'n_following': index_dtype}
+
+        if all(getattr(self, name).dtype == dtype for name, dtype in dtypes.items()):
+            return self
+
+        return StaticNetwork(**{name: getattr(self, name).astype(dtype) for name, dtype in dtypes.items()})
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Shared memory
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def to_shared_memory(self):
+        """
+        Copies all arrays into (new) shared memory blocks and lets this network use them from now on.
+        The owner of the blocks (i.e., the process calling this method) has to call unlink() when all workers are done.
+        :return:    dict, handle that can be pickled and passed to workers (see from_shared_memory())
+        """
+        handle = {}
+
+        for name in self.ARRAY_NAMES:
+            array = getattr(self, name)
+            block = SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared_array[:] = array
+            shared_array.flags.writeable = False
+
+            setattr(self, name, shared_array)
+            self._shared_memory_blocks.append(block)
+            handle[name] = (block.name, array.shape, array.dtype.str)
+
+        return handle
+
+    @classmethod
+    def from_shared_memory(cls, handle):
+        """
+        Attaches to a network that has been put into shared memory by another process. No data is copied.
+        :param handle:  dict, as returned by to_shared_memory()
+        :return:        StaticNetwork, with read-only arrays
+        """
+        arrays = {}
+        blocks = []
+
+        for name, (block_name, shape, dtype) in handle.items():
+            # Only the owner should unlink the block, i.e., attaching processes should not track it.
+            # (Before Python 3.13, workers started by the owner share its resource tracker anyway.)
+            try:
+                block = SharedMemory(name=block_name, track=False)
+            except TypeError:
+                block = SharedMemory(name=block_name)
+
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            arrays[name] = array
+            blocks.append(block)
+
+        network = cls(**arrays)
+        network._shared_memory_blocks = blocks
+
+        return network
+
+    def close(self):
+        """
+        Detaches this process from the shared memory blocks (if any). The arrays must not be used afterwards.
+        """
+        for name in self.ARRAY_NAMES:
+            setattr(self, name, None)
+        for block in self._shared_memory_blocks:
+            block.close()
+
+    def unlink(self):
+        """
+        Frees the shared memory blocks (if any). Only to be called by the owner, after all workers are done.
+        """
+        blocks = self._shared_memory_blocks
+        self.close()
+        for block in blocks:
+            block.unlink()
+        self._shared_memory_blocks = []
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Memory-mapped files
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def save(self, directory, **meta):
+        """
+        Saves all arrays as .npy files into directory (one file per array).
+        :param directory:   str, path to the (new or existing) directory
+        :param meta:        additional (json-serializable) information to save in meta.json
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+        meta.update({'n_nodes': self.n_nodes, 'n_edges': self.n_edges})
+        with open(os.path.join(directory, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Loads a network that has been saved with save().
+        :param directory:   str
+        :param mmap:        bool, if True: memory-map the (read-only) files instead of reading them into memory.
+                            All processes that map the same files share the same physical pages.
+        :return:            StaticNetwork
+        """
+        mmap_mode = 'r' if mmap else None
+
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+                  for name in cls.ARRAY_NAMES}
+
+        return cls(**arrays)
+
+
+class DynamicNetwork:
+    """
+    Mutable follower network, for runs in which agents unfollow and follow accounts (see MisinfoPy's dynamic_network).
+    Offers the same queries as StaticNetwork (followers, following, get_weight, n_followers, n_following, ...).
+
+    Each node has a dict of its followers ({follower: weight}) and a dict of the accounts it is following
+    ({account: None}, used as ordered set). Like this, edges are inserted & deleted in O(1) (amortized).
+    The degree counts and the min/max ranges are maintained incrementally on each edit, i.e., rewiring never needs
+    a full recompute.
+    """
+
+    def __init__(self, n_nodes):
+        """
+        :param n_nodes: int, creates a network without edges
+        """
+        self._followers = [{} for _ in range(n_nodes)]
+        self._following = [{} for _ in range(n_nodes)]
+        self.n_followers = np.zeros(n_nodes, dtype=np.int64)
+        self.n_following = np.zeros(n_nodes, dtype=np.int64)
+        self._n_edges = 0
+
+        self._n_followers_counter = DegreeCounter(self.n_followers)
+        self._n_following_counter = DegreeCounter(self.n_following)
+
+    @classmethod
+    def from_static(cls, network):
+        """
+        :param network: StaticNetwork
+        :return:        DynamicNetwork, with the same edges & weights
+        """
+        dynamic_network = cls(network.n_nodes)
+        indices = network.indices.tolist()
+        weights = network.weights.tolist()
+        indptr = network.indptr.tolist()
+
+        for source in range(network.n_nodes):
+            start, end = indptr[source], indptr[source + 1]
+            dynamic_network._followers[source] = dict(zip(indices[start:end], weights[start:end]))
+            for target in indices[start:end]:
+                dynamic_network._following[target][source] = None
+
+        dynamic_network.n_followers = np.asarray(network.n_followers, dtype=np.int64).copy()
+        dynamic_network.n_following = np.asarray(network.n_following, dtype=np.int64).copy()
+        dynamic_network._n_edges = network.n_edges
+        dynamic_network._n_followers_counter = DegreeCounter(dynamic_network.n_followers)
+        dynamic_network._n_following_counter = DegreeCounter(dynamic_network.n_following)
+
+        return dynamic_network
+
+    def to_static(self):
+        """
+        Snapshot of the current network (e.g., to compute rankings or to save/share it).
+        :return: StaticNetwork
+        """
+        n_nodes = self.n_nodes
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(self.n_followers, out=indptr[1:])
+        indices = np.empty(self._n_edges, dtype=np.int64)
+        weights = np.empty(self._n_edges, dtype=np.float64)
+
+        for source, followers in enumerate(self._followers):
+            row = sorted(followers.items())
+            indices[indptr[source]:indptr[source + 1]] = [target for target, _ in row]
+            weights[indptr[source]:indptr[source + 1]] = [weight for _, weight in row]
+
+        return StaticNetwork(indptr, indices, weights)
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Queries
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    @property
+    def n_nodes(self):
+        """
+        :return: int, number of nodes (i.e., agents) in the network
+        """
+        return len(self._followers)
+
+    @property
+    def n_edges(self):
+        """
+        :return: int, number of directed edges in the network
+        """
+        return self._n_edges
+
+    @property
+    def n_followers_range(self):
+        """
+        :return: tuple, (min_n_followers, max_n_followers), O(1)
+        """
+        return self._n_followers_counter.min, self._n_followers_counter.max
+
+    @property
+    def n_following_range(self):
+        """
+        :return: tuple, (min_n_following, max_n_following), O(1)
+        """
+        return self._n_following_counter.min, self._n_following_counter.max
+
+    def followers(self, node):
+        """
+        :param node:    int
+        :return:        np.ndarray of node ids (copy, in order of following)
+        """
+        followers = self._followers[node]
+        return np.fromiter(followers, dtype=np.int64, count=len(followers))
+
+    def following(self, node):
+        """
+        :param node:    int
+        :return:        np.ndarray of node ids (copy, in order of following)
+        """
+        following = self._following[node]
+        return np.fromiter(following, dtype=np.int64, count=len(following))
+
+    def has_edge(self, source, target):
+        """
+        :param source:  int
+        :param target:  int
+        :return:        bool, whether the edge source -> target is in the network
+        """
+        return target in self._followers[source]
+
+    def get_weight(self, source, target, default=None):
+        """
+        Returns the weight of the edge source -> target, or default if the edge is not in the network.
+        :param source:  int
+        :param target:  int
+        :param default: any
+        :return:        float or default
+        """
+        return self._followers[source].get(target, default)
+
+    def weight(self, source, target):
+        """
+        Returns the weight of the edge source -> target.
+        :param source:  int
+        :param target:  int
+        :return:        float
+        """
+        if target not in self._followers[source]:
+            raise KeyError(f'Edge ({source}, {target}) is not in the network.')
+
+        return self._followers[source][target]
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Edits
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def add_edge(self, source, target, weight):
+        """
+        Adds the edge source -> target (i.e., target starts following source). O(1) amortized.
+        :param source:  int
+        :param target:  int
+        :param weight:  float
+        :return:        bool, whether the edge was added (False for self-loops & existing edges)
+        """
+        if source == target or target in self._followers[source]:
+            return False
+
+        self._followers[source][target] = weight
+        self._following[target][source] = None
+        self._n_edges += 1
+
+        self.n_followers[source] += 1
+        self._n_followers_counter.move(self.n_followers[source] - 1, self.n_followers[source])
+        self.n_following[target] += 1
+        self._n_following_counter.move(self.n_following[target] - 1, self.n_following[target])
+
+        return True
+
+    def remove_edge(self, source, target):
+        """
+        Removes the edge source -> target (i.e., target unfollows source). O(1).
+        :param source:  int
+        :param target:  int
+        :return:        bool, whether the edge was removed (False if it was not in the network)
+        """
+        if target not in self._followers[source]:
+            return False
+
+        del self._followers[source][target]
+        del self._following[target][source]
+        self._n_edges -= 1
+
+        self.n_followers[source] -= 1
+        self._n_followers_counter.move(self.n_followers[source] + 1, self.n_followers[source])
+        self.n_following[target] -= 1
+        self._n_following_counter.move(self.n_following[target] + 1, self.n_following[target])
+
+        return True
+
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    #   Rankings (of the current network, not cached)
+    # ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def nodes_by_n_followers(self):
+        """
+        :return: np.ndarray of node ids, sorted by number of followers (descending; ties by id)
+        """
+        return np.argsort(-self.n_followers, kind='stable')
+
+    def centrality(self, damping=0.85, tolerance=1e-10, max_iterations=100):
+        """
+        :return: np.ndarray, (n_nodes,) PageRank of the current network (see StaticNetwork.centrality())
+        """
+        return self.to_static().centrality(damping, tolerance, max_iterations)
+
+    def nodes_by_centrality(self):
+        """
+        :return: np.ndarray of node ids, sorted by centrality (descending; ties by id)
+        """
+        return np.argsort(-self.centrality(), kind='stable')
+
+
+class DegreeCounter:
+    """
+    Counts how many nodes have which degree, to maintain the min & max degree incrementally.
+    Since an edit changes a degree by exactly 1, the new min/max is always known without a scan.
+    """
+
+    def __init__(self, degrees):
+        """
+        :param degrees: np.ndarray of ints, current degree of each node
+        """
+        values, counts = np.unique(np.asarray(degrees), return_counts=True)
+        self.counts = dict(zip(values.tolist(), counts.tolist()))  # {degree: n_nodes}
+        self.min = int(values[0]) if len(values) > 0 else 0
+        self.max = int(values[-1]) if len(values) > 0 else 0
+
+    def move(self, old_degree, new_degree):
+        """
+        One node's degree changed from old_degree to new_degree (= old_degree +/- 1).
+        :param old_degree:  int
+        :param new_degree:  int
+        """
+        old_degree, new_degree = int(old_degree), int(new_degree)
+
+        self.counts[old_degree] -= 1
+        self.counts[new_degree] = self.counts.get(new_degree, 0) + 1
+
+        if self.counts[old_degree] == 0:
+            del self.counts[old_degree]
+            # The node was the last one with the min (max) degree --> it is now at the new min (max)
+            if old_degree == self.min and new_degree > old_degree:
+                self.min = new_degree
+            if old_degree == self.max and new_degree < old_degree:
+                self.max = new_degree
+
+        self.min = min(self.min, new_degree)
+        self.max = max(self.max, new_degree)
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Helper Functions
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def transpose_csr(indptr, indices):
+    """
+    Transposes the structure of a CSR adjacency (without values).
+    Here: turns followers-rows into following-rows.
+    :param indptr:  np.ndarray, (n_nodes + 1,)
+    :param indices: np.ndarray, (n_edges,)
+    :return:        tuple, (rev_indptr, rev_indices), each row sorted
+    """
+    n_nodes = len(indptr) - 1
+    sources = np.repeat(np.arange(n_nodes, dtype=indices.dtype), np.diff(indptr))
+
+    # Stable sort by target keeps the sources within each row sorted
+    order = np.argsort(indices, kind='stable')
+    rev_indices = sources[order]
+
+    rev_indptr = np.zeros(n_nodes + 1, dtype=indptr.dtype)
+    np.cumsum(np.bincount(indices, minlength=n_nodes), out=rev_indptr[1:])
+
+    return rev_indptr, rev_indices
+
+
+def top_k_nodes(scores, k):
+    """
+    Ids of the k nodes with the highest scores, sorted descending (ties by id). O(n + k log k), i.e., without sorting
+    all nodes. For scores that change over time (e.g., beliefs), where a cached ranking would be outdated.
+    :param scores:  np.ndarray, (n_nodes,)
+    :param k:       int
+    :return:        np.ndarray of node ids
+    """
+    scores = np.asarray(scores)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # All nodes that score at least as high as the k-th best node (incl. ties), then sorted
+    kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+    candidates = np.flatnonzero(scores >= kth_score)
+    order = np.argsort(-scores[candidates], kind='stable')
+
+    return candidates[order[:k]]
+
+
+def build_csr(sources, targets, weights, n_nodes, seed=None):
+    """
+    Builds a StaticNetwork from edge arrays. Self-loops and duplicate edges (the first one is kept) are removed.
+    :param sources:     np.ndarray of ints, domain [0, n_nodes)
+    :param targets:     np.ndarray of ints, domain [0, n_nodes)
+    :param weights:     np.ndarray of floats or None. If None: weights are sampled like in random_graph() (i.e., [0,100])
+    :param n_nodes:     int
+    :param seed:        int or None, random seed for the sampled weights
+    :return:            StaticNetwork
+    """
+    # Sort the edges by (source, target), then remove duplicates & self-loops. Only the edge keys are sorted & filtered
+    # (no filtered copies of the inputs): this is the memory peak of loading large edge lists.
+    keys = sources * n_nodes + targets
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    keep = np.ones(len(keys), dtype=bool)
+    keep[1:] = keys[1:] != keys[:-1]
+    rows = keys // n_nodes
+    keep &= rows != keys - rows * n_nodes  # not a self-loop
+    del keys
+    order, rows = order[keep], rows[keep]
+    del keep
+
+    indices = targets[order]
+    if weights is None:
+        weights = np.random.default_rng(seed).integers(0, 100, size=len(indices), endpoint=True).astype(np.float64)
+    else:
+        weights = weights[order]
+    del order
+
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_nodes), out=indptr[1:])
+
+    return StaticNetwork(indptr, indices, weights)
+
+
+def describe_source(path):
+    """
+    :param path:    str, path to a file
+    :return:        dict, identifies the version of the file (to check whether a cache is still valid)
+    """
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def default_cache_directory(path, options, default_options):
+    """
+    Caches built with other options get their own directory (so that a network that is still memory-mapped from one
+    cache is never overwritten by a build with other options).
+    :param path:            str, path to the source file
+    :param options:         dict, JSON-serializable options of the build (e.g., {'reverse': True, ...})
+    :param default_options: dict
+    :return:                str, path + '.cache' for the default options, else path + '.<hash of the options>.cache'
+    """
+    if options == default_options:
+        return path + '.cache'
+
+    return f"{path}.{hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:12]}.cache"
+
+
+def is_cache_valid(cache_directory, path, options):
+    """
+    Checks whether the cache in cache_directory has been built from the current version of the file at path, with the
+    same options.
+    :param cache_directory: str
+    :param path:            str
+    :param options:         dict, JSON-serializable options of the build (e.g., {'reverse': True, ...})
+    :return:                bool
+    """
+    meta_path = os.path.join(cache_directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+
+    with open(meta_path) as file:
+        meta = json.load(file)
+
+    return meta.get('source') == describe_source(path) and meta.get('options') == options
@@ -0,0 +1,384 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from enums import *
+
+# Stages of a tick (part of the key of each chunk's random stream)
+SHARE_STAGE = 0
+UPDATE_STAGE = 1
+
+# Maximum number of receiver groups (consecutive chunks of receivers; bounds the (chunks x groups) delivery counts)
+MAX_GROUPS = 1024
+
+
+def tie_strengths(network):
+    """
+    Per edge source -> follower: the tie strength, i.e., the weight of the edge follower -> source if it exists, else
+    the weight of this edge (see BaseAgent.calculate_immediacy).
+    :param network: StaticNetwork
+    :return:        np.ndarray, (n_edges,) float64, aligned with network.indices
+    """
+    n_nodes = network.n_nodes
+    indptr = np.asarray(network.indptr)
+    # Edge keys in int64: with int32 ids (precision='float32'), id * n_nodes would overflow above ~46,000 nodes
+    indices = np.asarray(network.indices, dtype=np.int64)
+    weights = np.asarray(network.weights, dtype=float)
+
+    sources = np.repeat(np.arange(n_nodes, dtype=np.int64), np.diff(indptr))
+    edge_keys = sources * n_nodes + indices  # sorted (rows are sorted by source, then by follower)
+    reverse_keys = indices * n_nodes + sources
+    positions = np.minimum(np.searchsorted(edge_keys, reverse_keys), len(edge_keys) - 1)
+    has_reverse = edge_keys[positions] == reverse_keys
+
+    return np.where(has_reverse, weights[positions], weights)
+
+
+def group_offsets(counts):
+    """
+    Stable grouping of the items of several chunks (counting sort): merged, the items are grouped by group, and within
+    a group they stay in chunk order (and in their order within each chunk).
+    :param counts:  np.ndarray, (n_chunks, n_groups) number of items per chunk & group
+    :return:        np.ndarray, (n_chunks, n_groups) position of the first item of each chunk & group in the merged
+                    items; np.ndarray, (n_groups + 1,) bounds of the groups in the merged items
+    """
+    bounds = np.r_[0, np.cumsum(counts.sum(axis=0))]
+    offsets = bounds[:-1] + np.cumsum(counts, axis=0) - counts
+    return offsets, bounds
+
+
+class ChunkedTickEngine:
+    """
+    Runs the ticks of a MisinfoPy on arrays instead of agent by agent (see MisinfoPy's n_threads).
+
+    The agents are partitioned into fixed chunks of chunk_size consecutive ids. The share stage (number of posts,
+    stances, fact-check results & visibilities, and which followers receive them) runs per chunk of sources, the
+    update stage (which posts are seen & judged as truthful) per chunk of receivers. The chunks of a stage are
+    independent, so they run on a thread pool. The kernels are NumPy operations on whole chunks, which release the GIL.
+    The deliveries and the accepted posts are merged by a counting sort: each chunk sorts its own items, and writes
+    them to their merged positions (see group_offsets()), also on the thread pool.
+
+    The SIT belief updates then run post by post per receiver, in rounds over all receivers of the tick (in round k,
+    every receiver applies its k-th accepted post; see apply_updates()). Each round is one set of NumPy calls over all
+    its receivers (not one per chunk), and large rounds are split over the thread pool. Within a round, every receiver
+    appears once, so the slices are independent.
+
+    Each chunk draws from its own random stream, derived from (seed, tick, stage, chunk). The chunks are merged in
+    chunk order. Like this, the results only depend on the seed and chunk_size, not on n_threads or the order in which
+    the threads finish.
+
+    Same model as the exact path (the reference engine): posts are received in the order of their sources, and each
+    receiver updates its beliefs post by post. The random streams differ, so runs are statistically equivalent to the
+    reference engine, not identical (see equivalence.py). Per-tick KPIs count the net change of each agent per tick
+    (e.g., an agent crossing the threshold up & down again in one tick is not a threshold crossing).
+    """
+
+    def __init__(self, model, n_threads=1, chunk_size=1024, seed=None):
+        """
+        :param model:       MisinfoPy, set up (agents, network & media literacy intervention)
+        :param n_threads:   int, number of threads (1: the chunks run one after the other, without a pool)
+        :param chunk_size:  int, number of agents per chunk
+        :param seed:        int or None, seed of the random streams (None: drawn from np.random, i.e., from the
+                            model's seed if it has one)
+        """
+        self.model = model
+        self.n_threads = n_threads
+        self.chunk_size = chunk_size
+        self.entropy = seed if seed is not None else int(np.random.randint(2 ** 63 - 1, dtype=np.int64))
+        self.pool = ThreadPoolExecutor(n_threads) if n_threads > 1 else None
+
+        network = model.network
+        n_agents = model.n_agents
+        agents = model.agent_list
+        self.n_topics = len(Topic)
+        self.chunk_starts = np.arange(0, n_agents, chunk_size)
+        self.chunks_per_group = math.ceil(len(self.chunk_starts) / MAX_GROUPS)
+        self.n_groups = math.ceil(len(self.chunk_starts) / self.chunks_per_group)
+
+        # Fixed per-agent quantities
+        self.vocality_mu = np.array([agent.vocality_mu for agent in agents], dtype=float)
+        self.vocality_sigma = np.array([agent.vocality_sigma for agent in agents], dtype=float)
+        self.updates_beliefs = np.array([agent.updates_beliefs for agent in agents], dtype=bool)
+        self.high_media_literacy = model.high_media_literacy
+
+        min_followers, max_followers = model.agents_data['n_followers_range']
+        self.rel_n_followers = (np.asarray(network.n_followers, dtype=float) - min_followers) / \
+            (max_followers - min_followers) * 100
+        n_following = np.asarray(network.n_following, dtype=float)
+        self.n_sources = np.divide(100.0, n_following, out=np.zeros(n_agents), where=n_following > 0)
+
+        # Per edge source -> follower: the tie strength (weight of the edge follower -> source if it exists, else the
+        # weight of this edge; see BaseAgent.calculate_immediacy)
+        self.indptr = np.asarray(network.indptr)
+        self.indices = np.asarray(network.indices)
+        self.immediacy = tie_strengths(network)
+
+    def rng(self, tick, stage, chunk):
+        """
+        :param tick:    int
+        :param stage:   int, SHARE_STAGE or UPDATE_STAGE
+        :param chunk:   int, index of the chunk
+        :return:        np.random.Generator, the random stream of this chunk
+        """
+        return np.random.Generator(np.random.PCG64(np.random.SeedSequence(self.entropy,
+                                                                          spawn_key=(tick, stage, chunk))))
+
+    def map(self, function, *iterables):
+        """
+        Runs function on each chunk (on the thread pool, if any). Results are in chunk order.
+        :return:    list
+        """
+        if self.pool is None:
+            return list(map(function, *iterables))
+
+        return list(self.pool.map(function, *iterables))
+
+    def close(self):
+        """Shuts down the thread pool."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    # –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    # Tick
+    # –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def step(self):
+        """Runs the share stage & the update stage of one tick (like SparseStagedActivation.step())."""
+        model = self.model
+        schedule = model.schedule
+        tick = schedule.steps
+        n_chunks = len(self.chunk_starts)
+
+        # Share stage (per chunk of sources)
+        shared = self.map(self.share_chunk, range(n_chunks), [tick] * n_chunks)
+
+        # Merge the posts (in chunk order, i.e., by source) & record their stances
+        post_offsets = np.cumsum([0] + [len(chunk['sources']) for chunk in shared]).tolist()
+        posts = {name: np.concatenate([chunk[name] for chunk in shared])
+                 for name in ('sources', 'topics', 'stances', 'visibilities', 'is_true')}
+        np.add.at(model.posted_stance_sums, (posts['sources'], posts['topics']), posts['stances'])
+        np.add.at(model.n_posted_stances, (posts['sources'], posts['topics']), 1)
+        posts['estimated_source_beliefs'] = model.posted_stance_sums[posts['sources'], posts['topics']] / \
+            model.n_posted_stances[posts['sources'], posts['topics']]
+        model.post_id_counter += len(posts['sources'])
+
+        # Deliveries (post, edge), grouped by receiver group. Stable: within a group, the deliveries stay in the order
+        # of the posts (i.e., of their sources). Each chunk writes its deliveries to their merged positions.
+        offsets, bounds = group_offsets(np.array([chunk['delivery_counts'] for chunk in shared]))
+        deliveries = {name: np.empty(bounds[-1], dtype=np.int64) for name in ('post_index', 'edges')}
+
+        def scatter_deliveries(chunk, post_offset, chunk_offsets):
+            self.scatter(deliveries, {'post_index': chunk['post_index'] + post_offset, 'edges': chunk['edges']},
+                         chunk['delivery_counts'], chunk_offsets)
+
+        self.map(scatter_deliveries, shared, post_offsets[:-1], offsets)
+
+        # Update stage (per receiver group): the accepted posts, in round order per group (see apply_updates())
+        bounds = bounds.tolist()
+        judged = self.map(self.update_group, range(self.n_groups), [tick] * self.n_groups, [posts] * self.n_groups,
+                          [deliveries['post_index'][start:end] for start, end in zip(bounds[:-1], bounds[1:])],
+                          [deliveries['edges'][start:end] for start, end in zip(bounds[:-1], bounds[1:])])
+
+        # Merged in round order (rounds over all receivers), each group writing its updates to their positions
+        rank_counts = np.zeros((self.n_groups, max(len(group['rank_counts']) for group in judged)), dtype=np.int64)
+        for group_index, group in enumerate(judged):
+            rank_counts[group_index, :len(group['rank_counts'])] = group['rank_counts']
+        offsets, round_bounds = group_offsets(rank_counts)
+        updates = {name: np.empty(round_bounds[-1], dtype=judged[0]['updates'][name].dtype)
+                   for name in judged[0]['updates']}
+        self.map(self.scatter, [updates] * self.n_groups, [group['updates'] for group in judged], rank_counts,
+                 offsets)
+
+        # SIT belief updates (in rounds over all receivers), computed in float64
+        beliefs = model.belief_array.astype(np.float64)
+        self.apply_updates(beliefs, updates, round_bounds)
+        updated = np.concatenate([group['updated'] for group in judged])
+        old_beliefs = model.belief_array[updated].astype(np.float64)
+        model.belief_array[updated] = beliefs[updated]
+        new_beliefs = model.belief_array[updated].astype(np.float64)  # as stored (e.g., float32)
+
+        # Online KPIs (net change per agent & topic in this tick)
+        for topic_index in range(self.n_topics):
+            model.kpis.update_many(topic_index, old_beliefs[:, topic_index], new_beliefs[:, topic_index])
+
+        schedule.n_active_agents = sum(group['n_receivers'] for group in judged)
+        schedule.steps += 1
+        schedule.time += schedule.stage_time * len(schedule.stage_list)
+
+    def scatter(self, outputs, arrays, counts, offsets):
+        """
+        Writes the items of one chunk (or group), grouped stably, to their positions in the merged arrays (see
+        group_offsets()). The chunks write to disjoint positions, so they can run on the thread pool.
+        :param outputs: dict, merged arrays (written in place)
+        :param arrays:  dict, this chunk's items per name (like outputs), grouped
+        :param counts:  np.ndarray, number of this chunk's items per group
+        :param offsets: np.ndarray, position of this chunk's first item of each group in the merged arrays
+        """
+        starts = np.cumsum(counts) - counts
+        positions = np.repeat(offsets - starts, counts) + np.arange(int(counts.sum()))
+        for name, array in arrays.items():
+            outputs[name][positions] = array
+
+    def share_chunk(self, chunk, tick):
+        """
+        Share stage of one chunk of sources: their posts & which followers receive them.
+        :param chunk:   int
+        :param tick:    int
+        :return:        dict, the posts ('sources', 'topics', 'stances', 'visibilities', 'is_true') and their
+                        deliveries ('post_index': post index in this chunk, 'edges': edge index), grouped by receiver
+                        group (in the order of the posts), & 'delivery_counts' per receiver group
+        """
+        rng = self.rng(tick, SHARE_STAGE, chunk)
+        model = self.model
+        agents = np.arange(self.chunk_starts[chunk], min(self.chunk_starts[chunk] + self.chunk_size, model.n_agents))
+
+        # Number of posts (see BaseAgent.sample_number_of_posts): more vocal with (more) extreme beliefs
+        beliefs = model.belief_array[agents, Topic.VAX.value]
+        extreme = (beliefs < 15) | (beliefs > 85)
+        moderate = (beliefs < 30) | (beliefs > 70)
+        mu = self.vocality_mu[agents] + np.where(extreme, 2, np.where(moderate, 1, 0))
+        n_posts = np.rint(np.maximum(0, rng.normal(mu, self.vocality_sigma[agents]))).astype(np.int64)
+
+        # Posts (see Post): stance ~ N(belief, 5) clipped to [0,100], fact-check result, (ranked) visibility
+        sources = np.repeat(agents, n_posts)
+        n = len(sources)
+        topics = rng.integers(self.n_topics, size=n)
+        stances = np.clip(rng.normal(model.belief_array[sources, topics], 5), 0, 100)
+        p_low, p_middle, p_high = model.factcheck_probabilities
+        is_true = rng.random(n) < np.where(stances <= 20, p_low, np.where(stances <= 80, p_middle, p_high))
+        visibilities = np.abs(50 - stances) / 50
+        if model.ranking_intervention:
+            visibilities = visibilities * np.where(is_true, FactCheckResult.TRUE.value, FactCheckResult.FALSE.value)
+
+        # Each post goes to all followers of its source that update their beliefs
+        n_followers = np.diff(self.indptr)[sources]
+        post_index = np.repeat(np.arange(n), n_followers)
+        row_starts = np.cumsum(n_followers) - n_followers
+        edges = np.repeat(self.indptr[sources], n_followers) + np.arange(len(post_index)) - \
+            np.repeat(row_starts, n_followers)
+        receives = self.updates_beliefs[self.indices[edges]]
+        post_index, edges = post_index[receives], edges[receives]
+
+        # Grouped by receiver group (stable: in the order of the posts; radix sort for up to 2**16 groups)
+        receiver_groups = self.indices[edges] // (self.chunk_size * self.chunks_per_group)
+        if self.n_groups <= 2 ** 16:
+            receiver_groups = receiver_groups.astype(np.uint16)
+        order = np.argsort(receiver_groups, kind='stable')
+
+        return {'sources': sources, 'topics': topics, 'stances': stances, 'visibilities': visibilities,
+                'is_true': is_true, 'post_index': post_index[order], 'edges': edges[order],
+                'delivery_counts': np.bincount(receiver_groups, minlength=self.n_groups)}
+
+    def update_chunk(self, chunk, tick, posts, post_index, edges):
+        """
+        Update stage of one chunk of receivers: which of the delivered posts are seen & judged as truthful.
+        :param chunk:       int
+        :param tick:        int
+        :param posts:       dict, all posts of the tick (see step())
+        :param post_index:  np.ndarray, the posts delivered to this chunk (index into posts), in the order of the posts
+        :param edges:       np.ndarray, edge index of each delivery
+        :return:            dict, the accepted posts ('receivers', 'post_index', 'edges'; grouped by receiver, in the
+                            order of the posts) & 'n_receivers'
+        """
+        rng = self.rng(tick, UPDATE_STAGE, chunk)
+
+        # Received posts, in the order of their sources, per receiver
+        receivers = self.indices[edges]
+        rows = receivers - self.chunk_starts[chunk]
+        if self.chunk_size <= 2 ** 16:
+            rows = rows.astype(np.uint16)  # (stable sort of 16-bit ints: radix sort)
+        order = np.argsort(rows, kind='stable')
+        post_index, edges, receivers = post_index[order], edges[order], receivers[order]
+        n_receivers = int(np.count_nonzero(np.diff(receivers))) + 1 if len(receivers) > 0 else 0
+
+        # Seen (probability = visibility), then judged as truthful (see NormalUser.judge_truthfulness_realistic)
+        seen = rng.random(len(post_index)) < posts['visibilities'][post_index]
+        post_index, edges, receivers = post_index[seen], edges[seen], receivers[seen]
+        p_judged_as_truthful = np.where(self.high_media_literacy[receivers],
+                                        np.where(posts['is_true'][post_index], 0.8, 0.2), 1.0)
+        accepted = rng.random(len(post_index)) < p_judged_as_truthful
+
+        return {'receivers': receivers[accepted], 'post_index': post_index[accepted], 'edges': edges[accepted],
+                'n_receivers': n_receivers}
+
+    def update_group(self, group, tick, posts, post_index, edges):
+        """
+        Update stage of one receiver group (see update_chunk()), and the components of its SIT updates that do not
+        depend on the receivers' beliefs, in round order (see apply_updates()).
+        :param group:       int
+        :param tick:        int
+        :param posts:       dict, all posts of the tick (see step())
+        :param post_index:  np.ndarray, the posts delivered to this group (index into posts), in the order of the posts
+        :param edges:       np.ndarray, edge index of each delivery
+        :return:            dict, 'updates' (per name, in round order), 'rank_counts' (number of updates per round),
+                            'updated' (receivers with accepted posts, in order) & 'n_receivers'
+        """
+        # Deliveries per chunk (radix sort for up to 2**16 chunks per group)
+        chunks = np.arange(group * self.chunks_per_group,
+                           min((group + 1) * self.chunks_per_group, len(self.chunk_starts)))
+        if len(chunks) > 1:
+            chunk_index = self.indices[edges] // self.chunk_size - chunks[0]
+            if len(chunks) <= 2 ** 16:
+                chunk_index = chunk_index.astype(np.uint16)
+            order = np.argsort(chunk_index, kind='stable')
+            post_index, edges = post_index[order], edges[order]
+            bounds = np.searchsorted(chunk_index[order], np.arange(len(chunks) + 1)).tolist()
+        else:
+            bounds = [0, len(edges)]
+        accepted = [self.update_chunk(chunk, tick, posts, post_index[start:end], edges[start:end])
+                    for chunk, start, end in zip(chunks.tolist(), bounds[:-1], bounds[1:])]
+        rows = np.concatenate([chunk['receivers'] for chunk in accepted])
+        post_index = np.concatenate([chunk['post_index'] for chunk in accepted])
+        edges = np.concatenate([chunk['edges'] for chunk in accepted])
+
+        # Rank of each post within its receiver's posts --> rounds (radix sort for ranks below 2**16)
+        n = len(rows)
+        group_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if n > 0 else np.zeros(0, dtype=np.int64)
+        ranks = np.arange(n) - np.repeat(group_starts, np.diff(np.r_[group_starts, n]))
+        if n > 0 and ranks.max() < 2 ** 16:
+            ranks = ranks.astype(np.uint16)
+        order = np.argsort(ranks, kind='stable')
+        post_index, edges = post_index[order], edges[order]
+
+        updates = {'rows': rows[order], 'topics': posts['topics'][post_index], 'stances': posts['stances'][post_index],
+                   'estimated_source_beliefs': posts['estimated_source_beliefs'][post_index],
+                   # Components that do not depend on the receiver's belief
+                   'impact_factors': self.immediacy[edges] * self.n_sources[self.indices[edges]] / 1e6,
+                   'rel_n_followers': self.rel_n_followers[posts['sources'][post_index]]}
+
+        return {'updates': updates, 'rank_counts': np.bincount(ranks), 'updated': rows[group_starts],
+                'n_receivers': sum(chunk['n_receivers'] for chunk in accepted)}
+
+    def apply_updates(self, beliefs, updates, round_bounds):
+        """
+        SIT belief updates (see BaseAgent.calculate_belief_update), post by post per receiver: in round k, each
+        receiver applies its k-th accepted post (vectorized over all receivers). Rounds with at least chunk_size
+        updates per thread are split over the thread pool.
+        :param beliefs:         np.ndarray, (n_agents, n_topics) float64 beliefs (updated in place)
+        :param updates:         dict, per accepted post in round order: 'rows' (receiver), 'topics', 'stances',
+                                'estimated_source_beliefs', 'impact_factors' & 'rel_n_followers'
+        :param round_bounds:    np.ndarray, bounds of the rounds in updates
+        """
+        rows, topics, stances = updates['rows'], updates['topics'], updates['stances']
+        estimated_source_beliefs = updates['estimated_source_beliefs']
+        impact_factors, rel_n_followers = updates['impact_factors'], updates['rel_n_followers']
+        std_dev = self.model.update_elasticity_std_dev
+
+        def update(start, end):
+            # Updates of one round (or of a slice of it): every receiver appears at most once
+            row, topic = rows[start:end], topics[start:end]
+            belief = beliefs[row, topic]
+
+            belief_similarity = 100 - np.abs(belief - estimated_source_beliefs[start:end])
+            strength = (rel_n_followers[start:end] + belief_similarity) / 2
+            update_elasticity = np.exp(-0.5 * ((belief - 50) / std_dev) ** 2)
+            beliefs[row, topic] = belief + strength * impact_factors[start:end] * \
+                (stances[start:end] - belief) * update_elasticity
+
+        for round_start, round_end in zip(round_bounds[:-1].tolist(), round_bounds[1:].tolist()):
+            n_slices = min(self.n_threads, (round_end - round_start) // self.chunk_size)
+            if n_slices > 1 and self.pool is not None:
+                slice_bounds = np.linspace(round_start, round_end, n_slices + 1).astype(np.int64).tolist()
+                self.map(update, slice_bounds[:-1], slice_bounds[1:])
+            else:
+                update(round_start, round_end)
@@ -3,6 +3,9 @@ from enums import *
 
 
 class Post:
+    # Fixed, compact layout (no instance dict)
+    __slots__ = ('unique_id', 'source', 'stances', 'visibility', 'factcheck_result', 'visibility_ranking_intervention',
+                 'estimated_source_beliefs', 'source_rel_n_followers', 'ranked_visibility')
 
     def __init__(self, unique_id, source, stances=None):
         self.unique_id = unique_id
@@ -13,9 +16,15 @@ class Post:
             # stances represented in the post. self.stances is {Topic: int_belief}
             self.stances = self.sample_stances(based_on_agent=self.source)
         self.visibility = self.estimate_visibility()
-        self.factcheck_result = FactCheckResult.sample(stances=self.stances)  # currently: TRUE or FALSE
+        self.factcheck_result = FactCheckResult.sample(stances=self.stances,  # currently: TRUE or FALSE
+                                                       probabilities=self.source.model.factcheck_probabilities)
         self.visibility_ranking_intervention = self.get_adjusted_visibility()
 
+        # Source-dependent quantities, shared by all receivers. Set by the source when sharing (see prepare_posts).
+        self.estimated_source_beliefs = None
+        self.source_rel_n_followers = None
+        self.ranked_visibility = None
+
     @staticmethod
     def sample_stances(max_n_topics=1, based_on_agent=None) -> dict:
         """
@@ -90,3 +99,59 @@ class Post:
         adjusted_visibility = self.visibility * self.factcheck_result.value
 
         return adjusted_visibility
+
+
+class PostBatch:
+    """
+    Summary of all posts one source shares in one tick, for the aggregated exposure mode (see MisinfoPy).
+    Instead of one Post object (and one coin toss per receiver) per post, the stances, fact-check results and
+    visibilities of the batch are drawn at once. Receivers then draw how many of the posts they see and accept from
+    binomial distributions (see BaseAgent.share_post_batch).
+
+    For the belief update, a batch behaves like one post (with the visibility-weighted average stance) that is
+    applied once per accepted post. It has the attributes of a Post that calculate_belief_update needs.
+    """
+    __slots__ = ('unique_id', 'source', 'n_posts', 'stances', 'stance_sums', 'p_seen', 'p_accepted_high_literacy',
+                 'estimated_source_beliefs', 'source_rel_n_followers')
+
+    def __init__(self, unique_id, source, n_posts, ranking_intervention=False, factcheck_probabilities=(0.0, 0.5, 0.8)):
+        """
+        :param unique_id:               int, id of the first post of the batch (the batch uses n_posts ids)
+        :param source:                  BaseAgent
+        :param n_posts:                 int, > 0
+        :param ranking_intervention:    bool
+        :param factcheck_probabilities: tuple, see FactCheckResult.get_ground_truth_probability
+        """
+        self.unique_id = unique_id
+        self.source = source
+        self.n_posts = n_posts
+
+        # Stances, like Post.sample_stances: N(belief, 5), clipped to [0,100]
+        topic = str(Topic.get_random())
+        stances = np.clip(np.random.normal(loc=source.beliefs[topic], scale=5, size=n_posts), 0, 100)
+
+        # Fact-check results, like FactCheckResult.sample
+        p_low, p_middle, p_high = factcheck_probabilities
+        p_true = np.where(stances <= 20, p_low, np.where(stances <= 80, p_middle, p_high))
+        is_true = np.random.random(n_posts) < p_true
+
+        # Visibility (extremeness), adjusted if the ranking intervention is on (see Post.get_adjusted_visibility)
+        visibility = np.abs(50 - stances) / 50
+        if ranking_intervention:
+            visibility = visibility * np.where(is_true, FactCheckResult.TRUE.value, FactCheckResult.FALSE.value)
+
+        # Probability that a post of the batch is seen, and that a seen post is judged as truthful by an agent with
+        # high media literacy (see judge_truthfulness_realistic). Agents with low media literacy accept all posts.
+        total_visibility = float(visibility.sum())
+        self.p_seen = total_visibility / n_posts
+        if total_visibility > 0:
+            self.p_accepted_high_literacy = float(np.dot(visibility, np.where(is_true, 0.8, 0.2))) / total_visibility
+            self.stances = {topic: float(np.dot(visibility, stances)) / total_visibility}
+        else:
+            self.p_accepted_high_literacy = 0.0
+            self.stances = {topic: float(stances.mean())}
+        self.stance_sums = {topic: float(stances.sum())}
+
+        # Source-dependent quantities, set by the source when sharing (see share_post_batch)
+        self.estimated_source_beliefs = None
+        self.source_rel_n_followers = None
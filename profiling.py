@@ -0,0 +1,304 @@
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import time
+from collections import Counter
+
+# Own code (functions defined in this directory) vs. Mesa, numpy & the standard library
+REPO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PROFILING_FILE = os.path.abspath(__file__)
+
+MODES = ('deterministic', 'sampling')
+
+
+def hot_functions(model=None):
+    """
+    The functions of the model that time is attributed to (besides the top functions of our own code).
+    Imported here (instead of at module level), so that profiling.py can be imported without the model.
+    :param model:   MisinfoPy or None, if given, its model reporters count as data collectors as well
+    :return:        dict, {name: [code objects]}
+    """
+    from mesa.datacollection import DataCollector
+    from agents import BaseAgent
+    from posts import Post
+
+    data_collectors = [DataCollector.collect.__code__]
+    if model is not None:
+        data_collectors += [reporter.__code__ for reporter in model.data_collector.model_reporters.values()]
+
+    return {'calculate_belief_update': [BaseAgent.calculate_belief_update.__code__],
+            'estimate_belief_similarity': [BaseAgent.estimate_belief_similarity.__code__],
+            'sample_seen_posts': [BaseAgent.sample_seen_posts.__code__],
+            'Post.__init__': [Post.__init__.__code__],
+            'data collectors': data_collectors}
+
+
+def code_key(code):
+    """
+    :param code:    code object
+    :return:        tuple, (filename, first line, function name), the key of a function in pstats
+    """
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def frame_label(key):
+    """
+    :param key:     tuple, (filename, first line, function name)
+    :return:        str, label of a frame in a collapsed stack (without ';' and ' ', which separate frames & counts)
+    """
+    filename, line, name = key
+    label = f'{name}@{os.path.basename(filename)}:{line}' if line else name  # built-ins have no file
+    return label.replace(';', ',').replace(' ', '_')
+
+
+class StepProfiler:
+    """
+    Profiles the ticks of MisinfoPy (step() and the ticks of run_iter()), see MisinfoPy.profile().
+    The model enables it at the start of each tick and disables it at the end, so set-up and the code around the run
+    (e.g., writing results) are not included. One profiler can be shared by several models (e.g., a whole sweep).
+
+    Modes:
+        'deterministic':    cProfile, exact call counts & times (~2x slower while enabled). Exported as pstats, the
+                            collapsed stacks are reconstructed from the call graph (proportionally, like flameprof).
+        'sampling':         a profiling timer (SIGPROF, Unix only, main thread) samples the model's call stack every
+                            interval seconds of CPU time (low overhead, only approximate times). Exported as collapsed
+                            stacks (no pstats).
+    """
+
+    def __init__(self, mode='deterministic', interval=0.005):
+        """
+        :param mode:        str, 'deterministic' or 'sampling'
+        :param interval:    float, seconds between two samples (only for mode='sampling')
+        """
+        if mode not in MODES:
+            raise ValueError(f'Unknown profiling mode: {mode} (expected one of {MODES})')
+        if mode == 'sampling' and not hasattr(signal, 'setitimer'):
+            raise ValueError('The sampling mode needs signal.setitimer (Unix).')
+
+        self.mode = mode
+        self.interval = interval
+        self.profiled_time = 0.0  # wall time (seconds) spent in profiled ticks
+        self.n_ticks = 0
+        self.hot_functions = hot_functions()
+
+        self._depth = 0  # step() may be called from within run_iter() --> only the outermost call counts
+        self._start_time = None
+
+        if mode == 'deterministic':
+            self._profile = cProfile.Profile()
+        else:
+            self._samples = Counter()  # {tuple of code keys (root first): n_samples}
+            self._root_frame = None
+            self._previous_handler = None
+
+    # –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    # Called by the model
+    # –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def add_model(self, model):
+        """
+        Also attributes the model reporters of this model to the data collectors.
+        :param model:   MisinfoPy
+        """
+        codes = self.hot_functions['data collectors']
+        codes += [code for code in hot_functions(model)['data collectors'] if code not in codes]
+
+    def enable(self):
+        """Starts profiling (at the start of a tick)."""
+        self._depth += 1
+        if self._depth > 1:
+            return
+
+        self._start_time = time.perf_counter()
+        if self.mode == 'deterministic':
+            self._profile.enable()
+        else:
+            self._root_frame = sys._getframe(1)  # the model's frame: the sampled stacks start here
+            self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def disable(self):
+        """Stops profiling (at the end of a tick)."""
+        self._depth -= 1
+        if self._depth > 0:
+            return
+
+        if self.mode == 'deterministic':
+            self._profile.disable()
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler)
+            self._root_frame = None
+        self.profiled_time += time.perf_counter() - self._start_time
+        self.n_ticks += 1
+
+    def close(self):
+        """Stops profiling, in case a tick was interrupted (e.g., by an exception)."""
+        while self._depth > 0:
+            self.disable()
+
+    def _sample(self, signal_number, frame):
+        """Signal handler (SIGPROF): records the interrupted call stack, up to the model's frame."""
+        stack = []
+        while frame is not None:
+            stack.append(code_key(frame.f_code))
+            if frame is self._root_frame:
+                break
+            frame = frame.f_back
+        else:
+            return  # outside of the tick (e.g., the timer fired while disabling it)
+
+        self._samples[tuple(reversed(stack))] += 1
+
+    # –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+    # Results
+    # –––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+    def stats(self):
+        """
+        :return:    pstats.Stats (only for mode='deterministic')
+        """
+        if self.mode != 'deterministic':
+            raise ValueError('pstats are only available for deterministic profiles.')
+
+        return pstats.Stats(self._profile)
+
+    def collapsed_stacks(self, max_depth=64):
+        """
+        Collapsed stacks (Brendan Gregg's format, input of flamegraph.pl, speedscope, etc.).
+        :param max_depth:   int, stacks are cut at this depth (only for mode='deterministic')
+        :return:            Counter, {tuple of code keys (root first): microseconds (deterministic) or n_samples}
+        """
+        if self.mode == 'sampling':
+            return Counter(self._samples)
+
+        stats = self.stats().stats  # {key: (primitive calls, calls, own time, cumulative time, {caller key: same})}
+        callees = {}
+        for key, (_, _, _, _, callers) in stats.items():
+            for caller, edge in callers.items():
+                callees.setdefault(caller, []).append((key, edge[3]))
+
+        stacks = Counter()
+
+        def add(stack, key, time_in_stack):
+            # The share of key's (cumulative) time that was spent in this stack is split among its callees like
+            # key's time is split overall
+            _, _, own_time, cumulative_time, _ = stats[key]
+            share = time_in_stack / cumulative_time if cumulative_time > 0 else 0.0
+            stack = stack + (key,)
+            stacks[stack] += int(round(own_time * share * 1e6))
+            if len(stack) >= max_depth:
+                return
+            for callee, edge_time in callees.get(key, []):
+                if callee not in stack and edge_time > 0:  # cut recursion
+                    add(stack, callee, edge_time * share)
+
+        # Roots: functions without (profiled) callers, i.e., the model's tick
+        for key, (_, _, _, cumulative_time, callers) in stats.items():
+            if not callers:
+                add((), key, cumulative_time)
+
+        return Counter({stack: value for stack, value in stacks.items() if value > 0})
+
+    def summary(self, n_own_functions=10):
+        """
+        Attributes the profiled time to the hot functions of the model & the top functions of our own code.
+        :param n_own_functions: int, number of own functions (by own time) to include besides the hot functions
+        :return:                list of dicts, one per function: {'Function', 'Calls' (None if sampled),
+                                'Own time', 'Cumulative time' (seconds), 'Share' (of the cumulative time of all ticks)}
+        """
+        own_times, cumulative_times, n_calls = self._function_times()
+        rows = []
+
+        for name, codes in self.hot_functions.items():
+            keys = [code_key(code) for code in codes]
+            rows.append({'Function': name,
+                         'Calls': sum(n_calls[key] for key in keys) if n_calls is not None else None,
+                         'Own time': sum(own_times[key] for key in keys),
+                         'Cumulative time': sum(cumulative_times[key] for key in keys)})
+
+        hot_keys = {code_key(code) for codes in self.hot_functions.values() for code in codes}
+        own_keys = [key for key in own_times
+                    if key[0].startswith(REPO_DIRECTORY) and key[0] != PROFILING_FILE and key not in hot_keys]
+        for key in sorted(own_keys, key=lambda k: own_times[k], reverse=True)[:n_own_functions]:
+            rows.append({'Function': frame_label(key),
+                         'Calls': n_calls[key] if n_calls is not None else None,
+                         'Own time': own_times[key],
+                         'Cumulative time': cumulative_times[key]})
+
+        for row in rows:
+            row['Share'] = row['Cumulative time'] / self.profiled_time if self.profiled_time > 0 else 0.0
+
+        return rows
+
+    def _function_times(self):
+        """
+        :return:    tuple, (own times, cumulative times, calls (None if sampled)), each a Counter {code key: ...}
+        """
+        own_times, cumulative_times = Counter(), Counter()
+
+        if self.mode == 'deterministic':
+            n_calls = Counter()
+            for key, (_, calls, own_time, cumulative_time, _) in self.stats().stats.items():
+                own_times[key] = own_time
+                cumulative_times[key] = cumulative_time
+                n_calls[key] = calls
+            return own_times, cumulative_times, n_calls
+
+        # Sampling: time of a sample = profiled time / n_samples
+        n_samples = sum(self._samples.values())
+        seconds_per_sample = self.profiled_time / n_samples if n_samples > 0 else 0.0
+        for stack, count in self._samples.items():
+            own_times[stack[-1]] += count * seconds_per_sample
+            for key in set(stack):  # count recursive functions once
+                cumulative_times[key] += count * seconds_per_sample
+        return own_times, cumulative_times, None
+
+    def print_summary(self, n_own_functions=10):
+        """
+        Prints where the time of the profiled ticks went.
+        :param n_own_functions: int
+        """
+        print(f"\nProfile ({self.mode}): {self.n_ticks} ticks, {self.profiled_time:.2f}s")
+        print(f"{'Function':<60} {'Calls':>10} {'Own [s]':>9} {'Cum. [s]':>9} {'Share':>6}")
+        for row in self.summary(n_own_functions):
+            calls = row['Calls'] if row['Calls'] is not None else '-'
+            print(f"{row['Function'][:60]:<60} {calls:>10} {row['Own time']:>9.3f} {row['Cumulative time']:>9.3f} "
+                  f"{row['Share']:>6.1%}")
+
+    def save(self, path):
+        """
+        Writes path.pstats (only if deterministic) and path.collapsed (one 'frame;frame;... value' line per stack).
+        :param path:    str, path without extension
+        :return:        list of str, the written files
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        files = []
+        if self.mode == 'deterministic':
+            self.stats().dump_stats(path + '.pstats')
+            files.append(path + '.pstats')
+
+        with open(path + '.collapsed', 'w') as file:
+            for stack, value in sorted(self.collapsed_stacks().items()):
+                file.write(';'.join(frame_label(key) for key in stack) + f' {value}\n')
+        files.append(path + '.collapsed')
+
+        return files
+
+
+def add_profile_arguments(parser):
+    """
+    Adds the --profile options to the argument parser of an entry point (main.py, experiments.py).
+    :param parser:  argparse.ArgumentParser
+    """
+    parser.add_argument('--profile', nargs='?', const='results/profile', default=None, metavar='PATH',
+                        help='profile the ticks and write PATH.pstats & PATH.collapsed (default: results/profile)')
+    parser.add_argument('--profile-mode', choices=MODES, default='deterministic',
+                        help='deterministic (cProfile) or sampling (low overhead)')
+    parser.add_argument('--profile-interval', type=float, default=0.005,
+                        help='seconds between two samples (sampling mode)')
@@ -0,0 +1,57 @@
+from mesa.time import StagedActivation
+
+
+class SparseStagedActivation(StagedActivation):
+    """
+    StagedActivation that only activates the agents that are active in the sparse stages.
+    E.g., only agents that received posts in the share_post_stage need to run the update_beliefs_stage.
+    Agents are activated (via activate()) during the preceding stages, and the active set is emptied after each sparse
+    stage. Like this, the cost of a sparse stage scales with the activity in the network instead of its population.
+    """
+
+    def __init__(self, model, stage_list=None, sparse_stages=None, shuffle=False, shuffle_between_stages=False):
+        """
+        :param model:                   MisinfoPy
+        :param stage_list:              list of str, names of the stages (i.e., agent methods), in the order to run them
+        :param sparse_stages:           list of str, the stages that are only run for active agents
+        :param shuffle:                 bool, whether to shuffle the order of agents each step
+        :param shuffle_between_stages:  bool, whether to shuffle the agents after each stage
+        """
+        super().__init__(model, stage_list, shuffle, shuffle_between_stages)
+        self.sparse_stages = set(sparse_stages) if sparse_stages is not None else set()
+        self.active_agents = {}  # {unique_id: agent}
+        self.n_active_agents = 0  # how many agents were active in the last sparse stage
+
+    def activate(self, agent):
+        """
+        Marks the agent as active for the next sparse stage.
+        :param agent:   BaseAgent
+        """
+        self.active_agents[agent.unique_id] = agent
+
+    def step(self):
+        """Executes all the stages for all (active) agents."""
+        agent_keys = list(self._agents.keys())
+        if self.shuffle:
+            self.model.random.shuffle(agent_keys)
+
+        for stage in self.stage_list:
+            if stage in self.sparse_stages:
+                # Same (relative) order as in a full stage
+                if self.shuffle:
+                    stage_keys = [key for key in agent_keys if key in self.active_agents]
+                else:
+                    stage_keys = sorted(self.active_agents)
+                self.active_agents = {}
+                self.n_active_agents = len(stage_keys)
+            else:
+                stage_keys = agent_keys
+
+            for agent_key in stage_keys:
+                getattr(self._agents[agent_key], stage)()  # Run stage
+
+            if self.shuffle_between_stages:
+                self.model.random.shuffle(agent_keys)
+            self.time += self.stage_time
+
+        self.steps += 1
@@ -0,0 +1,333 @@
+import multiprocessing
+import time
+import numpy as np
+import pandas as pd
+from misinfo_model import MisinfoPy
+from agents import *
+
+# Uncertain parameters and their ranges (lower bound, upper bound)
+PROBLEM = {
+    'n_edges': (0.5, 5.5),                  # edges per node of the Barabasi Albert graph (rounded to 1-5)
+    'disinformer_ratio': (0.01, 0.3),       # share of Disinformers among the agents
+    'media_literacy_coverage': (0.0, 0.5),  # share of agents selected for the media literacy intervention
+    'vocality_mu': (0.5, 2.0),              # NormalUser vocality
+    'vocality_sigma': (0.3, 1.2),
+    'elasticity_std_dev': (5.0, 30.0),      # std_dev of the update elasticity
+    'p_true_low': (0.0, 0.3),               # fact-check probabilities (stances in [0,20], (20,80], (80,100])
+    'p_true_middle': (0.3, 0.7),
+    'p_true_high': (0.6, 1.0),
+}
+
+# KPIs computed from the final beliefs of one run
+KPIS = {
+    'Avg belief': lambda beliefs: float(np.mean(beliefs)),
+    'Fraction above threshold': lambda beliefs: float(np.mean(beliefs >= 50.0)),
+}
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Sampling
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def scale_samples(unit_samples, problem):
+    """
+    Scales samples from the unit hypercube to the parameter ranges.
+    :param unit_samples:    np.ndarray, (n_samples, n_parameters) in [0,1]
+    :param problem:         dict, {parameter_name: (lower_bound, upper_bound)}
+    :return:                pd.DataFrame, one column per parameter
+    """
+    bounds = np.array(list(problem.values()), dtype=float)
+    samples = bounds[:, 0] + unit_samples * (bounds[:, 1] - bounds[:, 0])
+
+    return pd.DataFrame(samples, columns=list(problem))
+
+
+def latin_hypercube_sample(n_samples, problem=None, seed=0):
+    """
+    Latin hypercube sample: each parameter's range is cut into n_samples strata, and each stratum is used once.
+    :param n_samples:   int
+    :param problem:     dict, {parameter_name: (lower_bound, upper_bound)}, default: PROBLEM
+    :param seed:        int
+    :return:            pd.DataFrame, (n_samples, n_parameters)
+    """
+    if problem is None:
+        problem = PROBLEM
+
+    rng = np.random.default_rng(seed)
+    n_parameters = len(problem)
+    strata = np.array([rng.permutation(n_samples) for _ in range(n_parameters)]).T
+    unit_samples = (strata + rng.random((n_samples, n_parameters))) / n_samples
+
+    return scale_samples(unit_samples, problem)
+
+
+def saltelli_sample(n_base, problem=None, seed=0):
+    """
+    Sample for the Sobol indices (Saltelli scheme): two independent matrices A and B, plus for each parameter i the
+    matrix AB_i (A, with column i taken from B). In total n_base * (n_parameters + 2) rows, ordered [A, B, AB_1, ...].
+    :param n_base:      int, number of rows of A (and B)
+    :param problem:     dict, {parameter_name: (lower_bound, upper_bound)}, default: PROBLEM
+    :param seed:        int
+    :return:            pd.DataFrame
+    """
+    if problem is None:
+        problem = PROBLEM
+
+    rng = np.random.default_rng(seed)
+    n_parameters = len(problem)
+    matrix_a = rng.random((n_base, n_parameters))
+    matrix_b = rng.random((n_base, n_parameters))
+
+    blocks = [matrix_a, matrix_b]
+    for i in range(n_parameters):
+        matrix_ab = matrix_a.copy()
+        matrix_ab[:, i] = matrix_b[:, i]
+        blocks.append(matrix_ab)
+
+    return scale_samples(np.vstack(blocks), problem)
+
+
+def morris_sample(n_trajectories, problem=None, n_levels=4, seed=0):
+    """
+    Sample for the Morris method (elementary effects): each trajectory starts at a random grid point and changes one
+    parameter at a time (in random order) by delta = n_levels / (2 * (n_levels - 1)).
+    In total n_trajectories * (n_parameters + 1) rows.
+    :param n_trajectories:  int
+    :param problem:         dict, {parameter_name: (lower_bound, upper_bound)}, default: PROBLEM
+    :param n_levels:        int, (even) number of grid levels per parameter
+    :param seed:            int
+    :return:                pd.DataFrame
+    """
+    if problem is None:
+        problem = PROBLEM
+
+    rng = np.random.default_rng(seed)
+    n_parameters = len(problem)
+    delta = n_levels / (2 * (n_levels - 1))
+    start_levels = np.arange(n_levels // 2) / (n_levels - 1)  # start points, from which +delta stays in [0,1]
+
+    trajectories = []
+    for _ in range(n_trajectories):
+        point = rng.choice(start_levels, size=n_parameters)
+        trajectory = [point.copy()]
+        for i in rng.permutation(n_parameters):
+            point[i] += delta
+            trajectory.append(point.copy())
+        trajectories.append(np.array(trajectory))
+
+    return scale_samples(np.vstack(trajectories), problem)
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Running the model
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def n_edges_level(value):
+    """
+    Rounds a sampled n_edges to its integer level: half up (not to even), so that each of 1-5 gets the same share of
+    (0.5, 5.5); the upper bound itself (e.g., a Morris grid level) counts as 5.
+    :param value:   float, in PROBLEM['n_edges']
+    :return:        int
+    """
+    return min(int(np.floor(value + 0.5)), int(PROBLEM['n_edges'][1]))
+
+
+def run_sample(parameters, n_agents=1000, max_run_length=60, seed=None):
+    """
+    Runs the model once with the given parameter values.
+    :param parameters:      dict, {parameter_name: value} (all parameters of PROBLEM)
+    :param n_agents:        int
+    :param max_run_length:  int
+    :param seed:            int or None
+    :return:                dict, {kpi_name: value}
+    """
+    disinformer_ratio = parameters['disinformer_ratio']
+    model = MisinfoPy(n_agents=n_agents,
+                      n_edges=n_edges_level(parameters['n_edges']),
+                      agent_ratio={NormalUser.__name__: 1 - disinformer_ratio,
+                                   Disinformer.__name__: disinformer_ratio},
+                      media_literacy_intervention=(parameters['media_literacy_coverage'], SelectAgentsBy.RANDOM),
+                      normal_user_vocality=(parameters['vocality_mu'], parameters['vocality_sigma']),
+                      update_elasticity_std_dev=parameters['elasticity_std_dev'],
+                      factcheck_probabilities=(parameters['p_true_low'],
+                                               parameters['p_true_middle'],
+                                               parameters['p_true_high']),
+                      seed=seed)
+
+    snapshot = None
+    for snapshot in model.run_iter(max_run_length):
+        pass
+    beliefs = np.array(snapshot.beliefs, dtype=float)
+
+    return {name: kpi(beliefs) for name, kpi in KPIS.items()}
+
+
+def _run_sample_task(task):
+    """
+    :param task:    tuple, (parameters, n_agents, max_run_length, seed)
+    :return:        dict, {kpi_name: value}
+    """
+    return run_sample(*task)
+
+
+def evaluate(samples, n_agents=1000, max_run_length=60, n_processes=None, batch_size=4, seed=0, verbose=True):
+    """
+    Runs the model for each sample (in parallel batches, one model run per task).
+    Each row gets its own seed (seed + row), so results do not depend on the number of processes.
+    :param samples:         pd.DataFrame, one row per model run (e.g., from latin_hypercube_sample())
+    :param n_agents:        int
+    :param max_run_length:  int
+    :param n_processes:     int or None, number of worker processes (None: all CPUs, 1: no multiprocessing)
+    :param batch_size:      int, how many runs are sent to a worker at once
+    :param seed:            int
+    :param verbose:         bool, whether to print progress
+    :return:                pd.DataFrame, one column per KPI (same index as samples)
+    """
+    tasks = [(row._asdict(), n_agents, max_run_length, seed + i)
+             for i, row in enumerate(samples.itertuples(index=False))]
+
+    start_time = time.time()
+    results = []
+    if n_processes == 1:
+        result_iterator = map(_run_sample_task, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(n_processes)
+        result_iterator = pool.imap(_run_sample_task, tasks, chunksize=batch_size)
+
+    try:
+        for result in result_iterator:
+            results.append(result)
+            if verbose and len(results) % batch_size == 0:
+                print(f"{len(results)}/{len(tasks)} runs done ({round(time.time() - start_time, 1)} seconds)")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return pd.DataFrame(results, index=samples.index)
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Sensitivity indices
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def sobol_indices(outputs, n_base, problem=None):
+    """
+    First-order (Saltelli 2010) and total-order (Jansen) Sobol indices, from the outputs of a saltelli_sample().
+    :param outputs:     pd.DataFrame, one column per KPI, rows in the order of saltelli_sample()
+    :param n_base:      int, as used in saltelli_sample()
+    :param problem:     dict, default: PROBLEM
+    :return:            pd.DataFrame, rows: (KPI, parameter), columns: 'S1', 'ST'
+    """
+    if problem is None:
+        problem = PROBLEM
+
+    rows = []
+    for kpi in outputs.columns:
+        y = outputs[kpi].to_numpy()
+        y_a, y_b = y[:n_base], y[n_base:2 * n_base]
+        variance = np.var(np.concatenate([y_a, y_b]))
+
+        for i, parameter in enumerate(problem):
+            y_ab = y[(2 + i) * n_base:(3 + i) * n_base]
+            first_order = np.mean(y_b * (y_ab - y_a)) / variance
+            total_order = 0.5 * np.mean((y_a - y_ab) ** 2) / variance
+            rows.append({'KPI': kpi, 'Parameter': parameter, 'S1': first_order, 'ST': total_order})
+
+    return pd.DataFrame(rows).set_index(['KPI', 'Parameter'])
+
+
+def morris_indices(samples, outputs, problem=None):
+    """
+    Elementary-effects statistics (mu_star: mean absolute effect, sigma: std of the effects), from the outputs of a
+    morris_sample().
+    :param samples:     pd.DataFrame, from morris_sample()
+    :param outputs:     pd.DataFrame, one column per KPI
+    :param problem:     dict, default: PROBLEM
+    :return:            pd.DataFrame, rows: (KPI, parameter), columns: 'mu_star', 'mu', 'sigma'
+    """
+    if problem is None:
+        problem = PROBLEM
+
+    n_parameters = len(problem)
+    bounds = np.array(list(problem.values()), dtype=float)
+    unit_samples = (samples.to_numpy() - bounds[:, 0]) / (bounds[:, 1] - bounds[:, 0])
+    n_trajectories = len(samples) // (n_parameters + 1)
+
+    rows = []
+    for kpi in outputs.columns:
+        y = outputs[kpi].to_numpy()
+        effects = [[] for _ in range(n_parameters)]
+
+        for t in range(n_trajectories):
+            start = t * (n_parameters + 1)
+            for step in range(n_parameters):
+                difference = unit_samples[start + step + 1] - unit_samples[start + step]
+                i = int(np.argmax(np.abs(difference)))  # the parameter changed in this step
+                effects[i].append((y[start + step + 1] - y[start + step]) / difference[i])
+
+        for i, parameter in enumerate(problem):
+            parameter_effects = np.array(effects[i])
+            rows.append({'KPI': kpi, 'Parameter': parameter,
+                         'mu_star': np.mean(np.abs(parameter_effects)),
+                         'mu': np.mean(parameter_effects),
+                         'sigma': np.std(parameter_effects, ddof=1) if len(parameter_effects) > 1 else 0.0})
+
+    return pd.DataFrame(rows).set_index(['KPI', 'Parameter'])
+
+
+def linear_indices(samples, outputs):
+    """
+    Standardized regression coefficients (for a Latin hypercube sample). Only meaningful if the model is roughly
+    linear in the parameters (see 'R2').
+    :param samples:     pd.DataFrame, e.g., from latin_hypercube_sample()
+    :param outputs:     pd.DataFrame, one column per KPI
+    :return:            pd.DataFrame, rows: (KPI, parameter), columns: 'SRC', 'R2'
+    """
+    x = samples.to_numpy()
+    x = (x - x.mean(axis=0)) / x.std(axis=0)
+    design = np.column_stack([np.ones(len(x)), x])
+
+    rows = []
+    for kpi in outputs.columns:
+        y = outputs[kpi].to_numpy()
+        y = (y - y.mean()) / y.std()
+        coefficients, _, _, _ = np.linalg.lstsq(design, y, rcond=None)
+        r_squared = 1 - np.sum((y - design @ coefficients) ** 2) / np.sum(y ** 2)
+
+        for parameter, coefficient in zip(samples.columns, coefficients[1:]):
+            rows.append({'KPI': kpi, 'Parameter': parameter, 'SRC': coefficient, 'R2': r_squared})
+
+    return pd.DataFrame(rows).set_index(['KPI', 'Parameter'])
+
+
+if __name__ == '__main__':
+
+    method = 'morris'  # 'lhs', 'sobol' or 'morris'
+    n_agents = 1000
+    max_run_length = 60
+    n_processes = None
+    batch_size = 4
+
+    if method == 'lhs':
+        samples = latin_hypercube_sample(n_samples=100)
+    elif method == 'sobol':
+        n_base = 64
+        samples = saltelli_sample(n_base)
+    else:
+        samples = morris_sample(n_trajectories=10)
+    print(f"{method}: {len(samples)} model runs")
+
+    outputs = evaluate(samples, n_agents, max_run_length, n_processes, batch_size)
+
+    if method == 'lhs':
+        indices = linear_indices(samples, outputs)
+    elif method == 'sobol':
+        indices = sobol_indices(outputs, n_base)
+    else:
+        indices = morris_indices(samples, outputs)
+    print(indices)
+
+    pd.concat([samples, outputs], axis=1).to_csv(f'results/sensitivity_{method}_runs.csv', index=False)
+    indices.to_csv(f'results/sensitivity_{method}_indices.csv')
@@ -0,0 +1,246 @@
+import glob
+import hashlib
+import json
+import os
+import socket
+import sys
+import time
+import numpy as np
+
+SHARD_FILE_PATTERN = 'shard_*_of_*.jsonl'
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Grid & partition
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def grid_cells(n_scenarios, n_policies, n_replications):
+    """
+    :param n_scenarios:     int
+    :param n_policies:      int
+    :param n_replications:  int
+    :return:                list of tuples, (scenario index, policy index, replication), in the order of the sweep
+    """
+    return [(i, j, replication)
+            for i in range(n_scenarios) for j in range(n_policies) for replication in range(n_replications)]
+
+
+def shard_cells(cells, shard_index, shard_count):
+    """
+    Deterministic partition of the grid: shard k gets the cells k, k + shard_count, k + 2 * shard_count, ...
+    (round robin, so each shard gets a similar mix of cheap & expensive scenarios).
+    :param cells:       list of tuples, see grid_cells()
+    :param shard_index: int, domain [0, shard_count)
+    :param shard_count: int
+    :return:            list of tuples, the cells of this shard
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f'Invalid shard {shard_index} of {shard_count} (expected 0 <= shard index < shard count).')
+
+    return cells[shard_index::shard_count]
+
+
+def cell_seed(base_seed, cell):
+    """
+    Seed of a cell, derived from the base seed & the cell only (not from the shard or the order in which cells run).
+    :param base_seed:   int
+    :param cell:        tuple, (scenario index, policy index, replication)
+    :return:            int, domain [0, 2**32)
+    """
+    return int(np.random.SeedSequence(base_seed, spawn_key=tuple(cell)).generate_state(1)[0])
+
+
+def config_hash(config):
+    """
+    :param config:  dict, JSON-serializable configuration of the sweep
+    :return:        str, identifies the configuration (shards of the same sweep have the same hash)
+    """
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Partial results of a shard
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+# One JSON-lines file per shard: a header (configuration of the sweep, its hash, the shard & its cells), then one line
+# per finished cell (cell, seed, host, data). Only the shard itself writes to its file, so the shards can share a
+# directory on a shared filesystem without locks. Each line is flushed & synced, so an interrupted shard loses at most
+# the cell it was running, and rerunning the same shard command resumes after the last finished cell.
+
+def shard_path(directory, shard_index, shard_count):
+    """
+    :return:    str, path of the partial results of a shard
+    """
+    return os.path.join(directory, f'shard_{shard_index:03d}_of_{shard_count:03d}.jsonl')
+
+
+def read_shard(path):
+    """
+    :param path:    str, partial results of a shard
+    :return:        tuple, (header (dict), records (list of dicts, one per finished cell), size of the valid part of
+                    the file (bytes; a truncated last line, e.g., of an interrupted shard, is ignored))
+    """
+    header = None
+    records = []
+    valid_size = 0
+    with open(path, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break  # truncated last line
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if header is None:
+                header = entry
+            else:
+                entry['cell'] = tuple(entry['cell'])
+                records.append(entry)
+            valid_size += len(line)
+
+    if header is None or header.get('type') != 'header':
+        raise ValueError(f'{path} is not a shard file (no header).')
+
+    return header, records, valid_size
+
+
+class ShardWriter:
+    """
+    Writes the partial results of one shard (see shard_path()). If the file exists already (e.g., the shard was
+    interrupted), it is resumed: the finished cells are kept (see done_cells) and new cells are appended.
+    """
+
+    def __init__(self, directory, config, shard_index, shard_count, cells):
+        """
+        :param directory:   str
+        :param config:      dict, JSON-serializable configuration of the sweep (must be the same for all shards)
+        :param shard_index: int
+        :param shard_count: int
+        :param cells:       list of tuples, the cells of this shard
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = shard_path(directory, shard_index, shard_count)
+        self.config_hash = config_hash(config)
+        self.done_cells = {}  # {cell: record}
+
+        if os.path.exists(self.path):
+            header, records, valid_size = read_shard(self.path)
+            if header['config_hash'] != self.config_hash:
+                raise ValueError(f'{self.path} belongs to a sweep with another configuration '
+                                 f'({header["config_hash"]} instead of {self.config_hash}).')
+            self.done_cells = {record['cell']: record for record in records}
+            self.file = open(self.path, 'r+b')
+            self.file.truncate(valid_size)
+            self.file.seek(valid_size)
+        else:
+            self.file = open(self.path, 'wb')
+            self.write_line({'type': 'header',
+                             'config': config,
+                             'config_hash': self.config_hash,
+                             'shard_index': shard_index,
+                             'shard_count': shard_count,
+                             'cells': [list(cell) for cell in cells],
+                             'created': time.strftime('%Y-%m-%dT%H:%M:%S')})
+
+    def write(self, cell, seed, data, **extra):
+        """
+        :param cell:    tuple, (scenario index, policy index, replication)
+        :param seed:    int, seed of the cell
+        :param data:    JSON-serializable results of the cell
+        :param extra:   keyword arguments, additional (descriptive) fields, e.g., scenario=..., policy=...
+        """
+        record = {'type': 'cell', 'cell': list(cell), 'seed': seed}
+        record.update(extra)
+        record.update({'host': socket.gethostname(), 'finished': time.strftime('%Y-%m-%dT%H:%M:%S'), 'data': data})
+        self.write_line(record)
+        self.done_cells[tuple(cell)] = record
+
+    def write_line(self, entry):
+        self.file.write(json.dumps(entry).encode() + b'\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Merging
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def shard_status(directory):
+    """
+    Collects the partial results of all shards in a directory & checks them against the grid of their sweep.
+    :param directory:   str
+    :return:            dict, {'config': dict, 'shards': [(path, n_done, n_assigned)], 'records': {cell: record},
+                        'missing': [cells], 'duplicates': {cell: [paths]}, 'unknown': [cells outside of the grid]}
+    """
+    paths = sorted(glob.glob(os.path.join(directory, SHARD_FILE_PATTERN)))
+    if not paths:
+        raise ValueError(f'No shard files ({SHARD_FILE_PATTERN}) in {directory}.')
+
+    config = None
+    hash_of_config = None
+    shards = []
+    records = {}
+    sources = {}  # {cell: [paths]}
+    for path in paths:
+        header, shard_records, _ = read_shard(path)
+        if hash_of_config is None:
+            config, hash_of_config = header['config'], header['config_hash']
+        elif header['config_hash'] != hash_of_config:
+            raise ValueError(f'{path} belongs to a sweep with another configuration '
+                             f'({header["config_hash"]} instead of {hash_of_config}).')
+
+        shards.append((path, len(shard_records), len(header['cells'])))
+        for record in shard_records:
+            cell = record['cell']
+            if record['seed'] != cell_seed(config['seed'], cell):
+                raise ValueError(f'{path}: cell {cell} was run with seed {record["seed"]} instead of '
+                                 f'{cell_seed(config["seed"], cell)}.')
+            records[cell] = record
+            sources.setdefault(cell, []).append(path)
+
+    cells = grid_cells(len(config['scenarios']), len(config['policies']), config['n_replications'])
+    return {'config': config,
+            'shards': shards,
+            'records': records,
+            'missing': [cell for cell in cells if cell not in sources],
+            'duplicates': {cell: paths for cell, paths in sources.items() if len(paths) > 1},
+            'unknown': [cell for cell in sources if cell not in set(cells)]}
+
+
+def merge_shards(directory, config=None):
+    """
+    Combines the partial results of all shards of a sweep. Checks that they belong to the same sweep (& to config, if
+    given) and that every cell of the grid is present exactly once.
+    :param directory:   str
+    :param config:      dict or None, expected configuration of the sweep
+    :return:            tuple, (config (dict), {cell: record})
+    """
+    status = shard_status(directory)
+    if config is not None and config_hash(config) != config_hash(status['config']):
+        raise ValueError(f'The shards in {directory} belong to a sweep with another configuration '
+                         f'({config_hash(status["config"])} instead of {config_hash(config)}).')
+
+    problems = []
+    if status['missing']:
+        problems.append(f"{len(status['missing'])} missing cells, e.g., {status['missing'][:5]}")
+    if status['duplicates']:
+        examples = list(status['duplicates'].items())[:5]
+        problems.append(f"{len(status['duplicates'])} cells present more than once, e.g., {examples}")
+    if status['unknown']:
+        problems.append(f"{len(status['unknown'])} cells outside of the grid, e.g., {status['unknown'][:5]}")
+    if problems:
+        raise ValueError(f'Cannot merge the shards in {directory}: ' + '; '.join(problems))
+
+    return status['config'], status['records']
+
+
+if __name__ == '__main__':
+
+    # Progress of a sharded sweep: python sharding.py DIR
+    status = shard_status(sys.argv[1] if len(sys.argv) > 1 else 'results/shards')
+    for path, n_done, n_assigned in status['shards']:
+        print(f'{os.path.basename(path)}: {n_done}/{n_assigned} cells')
+    print(f"missing: {len(status['missing'])}, duplicates: {len(status['duplicates'])}, "
+          f"outside of the grid: {len(status['unknown'])}")
@@ -0,0 +1,23 @@
+class TickSnapshot:
+    """
+    Lightweight state of a model after one tick, as yielded by MisinfoPy.run_iter().
+
+    beliefs is a zero-copy, read-only view on the model's belief array. It reflects the state of the model after this
+    tick only until the model is stepped again. (Use beliefs.copy() to keep it.)
+    """
+    __slots__ = ('tick', 'beliefs', 'metrics', 'counters')
+
+    def __init__(self, tick, beliefs, metrics, counters):
+        """
+        :param tick:        int, number of ticks that have been run so far
+        :param beliefs:     np.ndarray, (n_agents,) read-only view on the beliefs (on one topic)
+        :param metrics:     dict, {metric_name: value}, e.g., the model reporters of the DataCollector
+        :param counters:    dict, {counter_name: int}, e.g., how many posts were created in this tick
+        """
+        self.tick = tick
+        self.beliefs = beliefs
+        self.metrics = metrics
+        self.counters = counters
+
+    def __repr__(self):
+        return f'TickSnapshot(tick={self.tick}, metrics={self.metrics}, counters={self.counters})'
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+
+class BeliefHistogram:
+    """
+    Fixed-bin histogram of the agents' beliefs (on one topic), as a compressed summary of a belief distribution.
+    Its size is constant in n_agents. Histograms with the same bins merge exactly (by adding their counts), so summaries
+    of several replications (or workers) can be combined. Quantiles are exact up to the bin width.
+
+    To reproduce a belief-distribution plot from a histogram, use the bin centers weighted by the counts, e.g.:
+        sns.histplot(x=hist.bin_centers, weights=hist.counts, bins=25, binrange=(0, 100))
+    """
+
+    def __init__(self, n_bins=100, domain=(0, 100), counts=None):
+        """
+        :param n_bins:  int, number of equally wide bins
+        :param domain:  tuple, (min_belief, max_belief)
+        :param counts:  array-like or None, counts per bin (if None: empty histogram)
+        """
+        self.n_bins = n_bins
+        self.domain = domain
+
+        if counts is None:
+            counts = np.zeros(n_bins, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_beliefs(cls, beliefs, n_bins=100, domain=(0, 100)):
+        """
+        :param beliefs: array-like of floats
+        :param n_bins:  int
+        :param domain:  tuple, (min_belief, max_belief)
+        :return:        BeliefHistogram
+        """
+        histogram = cls(n_bins, domain)
+        histogram.add(beliefs)
+
+        return histogram
+
+    @property
+    def bin_edges(self):
+        """
+        :return: np.ndarray, (n_bins + 1,)
+        """
+        return np.linspace(self.domain[0], self.domain[1], self.n_bins + 1)
+
+    @property
+    def bin_centers(self):
+        """
+        :return: np.ndarray, (n_bins,)
+        """
+        edges = self.bin_edges
+        return (edges[:-1] + edges[1:]) / 2
+
+    @property
+    def n(self):
+        """
+        :return: int, number of beliefs in the histogram
+        """
+        return int(self.counts.sum())
+
+    def add(self, beliefs):
+        """
+        Adds the beliefs to the histogram. (Values outside of the domain are counted in the first/last bin.)
+        :param beliefs: array-like of floats
+        """
+        beliefs = np.clip(np.asarray(beliefs, dtype=float), self.domain[0], self.domain[1])
+        counts, _ = np.histogram(beliefs, bins=self.n_bins, range=self.domain)
+        self.counts += counts
+
+    def merge(self, other):
+        """
+        Merges two histograms (e.g., of different replications).
+        :param other:   BeliefHistogram, with the same bins
+        :return:        BeliefHistogram, new histogram
+        """
+        if self.n_bins != other.n_bins or tuple(self.domain) != tuple(other.domain):
+            raise ValueError('Only histograms with the same bins can be merged.')
+
+        return BeliefHistogram(self.n_bins, self.domain, self.counts + other.counts)
+
+    def rebin(self, n_bins):
+        """
+        Combines neighboring bins, e.g., from 100 bins to the 25 bins used in the belief-distribution plots.
+        :param n_bins:  int, must divide the current number of bins
+        :return:        BeliefHistogram, new histogram
+        """
+        if self.n_bins % n_bins != 0:
+            raise ValueError(f'Cannot rebin {self.n_bins} bins into {n_bins} bins.')
+
+        counts = self.counts.reshape(n_bins, -1).sum(axis=1)
+
+        return BeliefHistogram(n_bins, self.domain, counts)
+
+    def mean(self):
+        """
+        :return: float, approximate mean belief (beliefs at their bin centers)
+        """
+        return float(np.dot(self.counts, self.bin_centers) / self.n)
+
+    def quantile(self, q):
+        """
+        Approximate quantile (linear interpolation within the bin). The error is at most one bin width.
+        :param q:   float, [0,1]
+        :return:    float
+        """
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)]) / self.n
+
+        return float(np.interp(q, cumulative, self.bin_edges))
+
+    def fraction_above(self, threshold):
+        """
+        Fraction of beliefs >= threshold. Exact if the threshold is a bin edge (e.g., 50.0 with 100 bins).
+        :param threshold:   float
+        :return:            float, [0,1]
+        """
+        first_bin = np.searchsorted(self.bin_edges, threshold)
+
+        return float(self.counts[first_bin:].sum() / self.n)
+
+
+class BeliefHistogramSeries:
+    """
+    One BeliefHistogram per tick (e.g., of one replication). Also mergeable (tick by tick).
+
+    Added ticks are collected in a list and only stacked into the counts array when it is read, so adding T ticks is
+    O(T) (not O(T^2) like stacking at each tick).
+    """
+
+    def __init__(self, n_bins=100, domain=(0, 100), counts=None):
+        """
+        :param n_bins:  int
+        :param domain:  tuple, (min_belief, max_belief)
+        :param counts:  array-like or None, (n_ticks, n_bins) counts
+        """
+        self.n_bins = n_bins
+        self.domain = domain
+
+        if counts is None:
+            counts = np.zeros((0, n_bins), dtype=np.int64)
+        self._counts = np.asarray(counts, dtype=np.int64).reshape(-1, n_bins)
+        self._added_counts = []  # counts of the ticks added since the last read of counts
+
+    @property
+    def counts(self):
+        """
+        :return: np.ndarray, (n_ticks, n_bins) counts
+        """
+        if self._added_counts:
+            self._counts = np.vstack([self._counts] + self._added_counts)
+            self._added_counts = []
+
+        return self._counts
+
+    def __len__(self):
+        return len(self._counts) + len(self._added_counts)
+
+    def __getitem__(self, tick):
+        """
+        :param tick:    int
+        :return:        BeliefHistogram, of that tick
+        """
+        return BeliefHistogram(self.n_bins, self.domain, self.counts[tick])
+
+    def add(self, beliefs):
+        """
+        Adds the histogram of the next tick.
+        :param beliefs: array-like of floats, all beliefs at that tick
+        """
+        histogram = BeliefHistogram.from_beliefs(beliefs, self.n_bins, self.domain)
+        self._added_counts.append(histogram.counts)
+
+    def merge(self, other):
+        """
+        :param other:   BeliefHistogramSeries, with the same bins and number of ticks
+        :return:        BeliefHistogramSeries, new series
+        """
+        if self.n_bins != other.n_bins or tuple(self.domain) != tuple(other.domain) or len(self) != len(other):
+            raise ValueError('Only series with the same bins and number of ticks can be merged.')
+
+        return BeliefHistogramSeries(self.n_bins, self.domain, self.counts + other.counts)
+
+    def to_frame(self, **labels):
+        """
+        Converts the series into a DataFrame with one row per tick (columns: labels, 'Tick', 'bin_0', 'bin_1', ...).
+        :param labels:  constant columns, e.g., Policy='...', Replication=0
+        :return:        pd.DataFrame
+        """
+        data = pd.DataFrame(self.counts, columns=[f'bin_{i}' for i in range(self.n_bins)])
+        data.insert(0, 'Tick', np.arange(len(self)))
+        for position, (name, value) in enumerate(labels.items()):
+            data.insert(position, name, value)
+
+        return data
+
+    @classmethod
+    def from_frame(cls, data, domain=(0, 100)):
+        """
+        Inverse of to_frame() (for the rows of one series, sorted by tick).
+        :param data:    pd.DataFrame
+        :param domain:  tuple, (min_belief, max_belief)
+        :return:        BeliefHistogramSeries
+        """
+        bin_columns = [column for column in data.columns if str(column).startswith('bin_')]
+        counts = data.sort_values('Tick')[bin_columns].to_numpy()
+
+        return cls(len(bin_columns), domain, counts)
@@ -0,0 +1,238 @@
+import json
+import os
+import sys
+import time
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Memory
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def reset_peak_rss():
+    """
+    Resets the peak resident set size of this process (Linux >= 4.0), so that the next peak_rss() is the peak of one
+    cell only. Elsewhere, the peak cannot be reset and peak_rss() is the peak since the start of the process.
+    :return:    bool, whether the peak was reset
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """
+    :return:    float or None, peak resident set size (MB) of this process (since the last reset_peak_rss(), if any)
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024  # kB
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024 ** 2 if sys.platform == 'darwin' else max_rss / 1024  # bytes on macOS, kB elsewhere
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Sweep telemetry
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class SweepTelemetry:
+    """
+    Live progress & a structured log for a sweep over scenario x policy x replication cells.
+
+    For each cell: start_cell(), tick() after each tick of the run, end_cell(). Progress (cell, tick, ticks/s,
+    agent-updates/s of the current cell, ETA of the sweep) is printed at most every print_interval seconds. end_cell()
+    appends one JSON line per cell to the log (wall time, peak RSS, posts created, ticks, agent updates, throughput).
+    The ETA assumes the remaining ticks take as long as the ticks so far (set-up of the models included).
+    """
+
+    def __init__(self, n_cells, max_run_length, log_path=None, stream=sys.stdout, print_interval=1.0):
+        """
+        :param n_cells:         int, number of cells in the sweep
+        :param max_run_length:  int, ticks per cell
+        :param log_path:        str or None, path of the JSON-lines log (appended to)
+        :param stream:          file-like, where progress is printed
+        :param print_interval:  float, min. seconds between two progress lines
+        """
+        self.n_cells = n_cells
+        self.max_run_length = max_run_length
+        self.log_path = log_path
+        self.stream = stream
+        self.print_interval = print_interval
+        self.live = hasattr(stream, 'isatty') and stream.isatty()  # terminal: overwrite the progress line
+
+        self.start_time = time.perf_counter()
+        self.n_cells_done = 0
+        self.n_ticks_done = 0  # of finished cells
+
+        self.cell = None
+        self.cell_start_time = None
+        self.last_print_time = 0.0
+        self.n_ticks = 0
+        self.n_posts = 0
+        self.n_agent_updates = 0
+
+        self.log_file = None
+        if log_path is not None:
+            directory = os.path.dirname(log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.log_file = open(log_path, 'a')
+
+    def start_cell(self, **cell):
+        """
+        :param cell:    keyword arguments that identify the cell, e.g., scenario=..., policy=..., replication=...
+                        (written to the log, non-JSON values as str)
+        """
+        self.cell = cell
+        self.n_ticks = 0
+        self.n_posts = 0
+        self.n_agent_updates = 0
+        reset_peak_rss()
+        self.cell_start_time = time.perf_counter()
+
+    def tick(self, snapshot):
+        """
+        :param snapshot:    TickSnapshot, of the tick that was just run
+        """
+        self.n_ticks += 1
+        self.n_posts += snapshot.counters['n_posts']
+        self.n_agent_updates += snapshot.counters['n_active_agents']
+
+        now = time.perf_counter()
+        if now - self.last_print_time >= self.print_interval:
+            self.last_print_time = now
+            self.print_progress(now)
+
+    def end_cell(self, **extra):
+        """
+        :param extra:   keyword arguments, additional fields for the log (e.g., seed=...)
+        :return:        dict, the log record of the cell
+        """
+        wall_time = time.perf_counter() - self.cell_start_time
+        record = {key: value if isinstance(value, (int, float, bool, type(None))) else str(value)
+                  for key, value in self.cell.items()}
+        record.update(extra)
+        record.update({'wall_time': wall_time,
+                       'peak_rss_mb': peak_rss(),
+                       'n_posts': self.n_posts,
+                       'n_ticks': self.n_ticks,
+                       'n_agent_updates': self.n_agent_updates,
+                       'ticks_per_second': self.n_ticks / wall_time if wall_time > 0 else None,
+                       'agent_updates_per_second': self.n_agent_updates / wall_time if wall_time > 0 else None,
+                       'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')})
+
+        if self.log_file is not None:
+            self.log_file.write(json.dumps(record) + '\n')
+            self.log_file.flush()  # the log is complete up to the last cell, even if the sweep is aborted
+
+        self.n_cells_done += 1
+        self.n_ticks_done += self.n_ticks
+        self.cell = None
+        self.last_print_time = 0.0  # print the progress of the next cell right away
+
+        return record
+
+    def eta(self, now=None):
+        """
+        :param now:     float or None, time.perf_counter()
+        :return:        float or None, estimated seconds until the sweep is done (None if no tick was run yet)
+        """
+        now = time.perf_counter() if now is None else now
+        n_ticks_done = self.n_ticks_done + (self.n_ticks if self.cell is not None else 0)
+        if n_ticks_done == 0:
+            return None
+        n_ticks_left = self.n_cells * self.max_run_length - n_ticks_done
+        return (now - self.start_time) / n_ticks_done * n_ticks_left
+
+    def print_progress(self, now=None):
+        """Prints one progress line (overwritten on a terminal)."""
+        now = time.perf_counter() if now is None else now
+        cell_time = now - self.cell_start_time
+        eta = self.eta(now)
+
+        cell = ' '.join(f'{key}={value}' for key, value in self.cell.items())
+        line = (f"[cell {self.n_cells_done + 1}/{self.n_cells}] {cell} | tick {self.n_ticks}/{self.max_run_length} | "
+                f"{self.n_ticks / cell_time:.1f} ticks/s, {self.n_agent_updates / cell_time:,.0f} agent-updates/s | "
+                f"ETA {format_duration(eta) if eta is not None else '?'}")
+
+        if self.live:
+            self.stream.write('\r\033[K' + line)
+        else:
+            self.stream.write(line + '\n')
+        self.stream.flush()
+
+    def close(self):
+        """Prints the total & closes the log."""
+        if self.live:
+            self.stream.write('\n')
+        total_time = time.perf_counter() - self.start_time
+        self.stream.write(f"{self.n_cells_done}/{self.n_cells} cells, {self.n_ticks_done} ticks in "
+                          f"{format_duration(total_time)}"
+                          + (f", log: {self.log_path}" if self.log_path is not None else '') + '\n')
+
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+def format_duration(seconds):
+    """
+    :param seconds: float
+    :return:        str, h:mm:ss
+    """
+    seconds = int(round(seconds))
+    return f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Reading the log
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def read_cell_log(path):
+    """
+    :param path:    str, JSON-lines log of a SweepTelemetry
+    :return:        pd.DataFrame, one row per cell
+    """
+    import pandas as pd
+
+    with open(path) as file:
+        return pd.DataFrame([json.loads(line) for line in file if line.strip()])
+
+
+def summarize_cell_log(path, by='scenario'):
+    """
+    Per group of cells (e.g., per scenario): mean & max wall time, max peak RSS, mean posts & throughput.
+    Helps to spot pathological cells and to size the hardware for a sweep.
+    :param path:    str, JSON-lines log of a SweepTelemetry
+    :param by:      str or list of str, the cell field(s) to group by
+    :return:        pd.DataFrame, empty if no cell ran (e.g., a resumed shard whose cells were all done)
+    """
+    import pandas as pd
+
+    aggregations = {'n_cells': ('wall_time', 'size'),
+                    'mean_wall_time': ('wall_time', 'mean'),
+                    'max_wall_time': ('wall_time', 'max'),
+                    'max_peak_rss_mb': ('peak_rss_mb', 'max'),
+                    'mean_n_posts': ('n_posts', 'mean'),
+                    'mean_ticks_per_second': ('ticks_per_second', 'mean'),
+                    'mean_agent_updates_per_second': ('agent_updates_per_second', 'mean')}
+
+    log = read_cell_log(path)
+    if log.empty:
+        return pd.DataFrame(columns=list(aggregations))
+
+    return log.groupby(by).agg(**aggregations)
@@ -0,0 +1,351 @@
+import json
+import struct
+import time
+import zlib
+from array import array
+import numpy as np
+from enums import *
+
+# File format (little-endian):
+#   header: MAGIC, uint32 version, uint32 length of the metadata, metadata (JSON, utf-8),
+#           float64[n_agents] initial beliefs (on the traced topic)
+#   chunks: uint32 n_events, uint32 n_bytes, zlib-compressed columns (each column contiguous, in the order of COLUMNS)
+# Chunks are written as soon as the buffer is full, so the trace of an aborted run is readable up to its last chunk.
+MAGIC = b'MPYTRACE'
+VERSION = 1
+HEADER = struct.Struct('<8sII')
+CHUNK_HEADER = struct.Struct('<II')
+
+# (name, numpy dtype); seen & judged_truthful are stored as bit flags
+COLUMNS = (('tick', '<u4'),
+           ('post_id', '<u4'),
+           ('source', '<u4'),
+           ('receiver', '<u4'),
+           ('flags', 'u1'),
+           ('belief_delta', '<f4'))
+SEEN = 1
+JUDGED_TRUTHFUL = 2
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Recording
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class EventTraceWriter:
+    """
+    Streams one event per received post & receiver to a compact, chunked binary file (see MisinfoPy.trace_events()):
+    (tick, post_id, source, receiver, seen, judged_truthful, belief_delta), 17 bytes per event before compression.
+    belief_delta is the update of the receiver's belief on the traced topic by this post (float32, 0.0 if the post was
+    not seen or judged as not truthful).
+
+    Events are buffered column-wise in typed arrays (bounded: about chunk_size events; the buffer is flushed after the
+    receiver that fills it) and written as one zlib-compressed chunk.
+    """
+
+    def __init__(self, path, model, topic=Topic.VAX, chunk_size=65536, compression_level=1, record_unseen=True,
+                 metadata=None):
+        """
+        :param path:                str
+        :param model:               MisinfoPy
+        :param topic:               Topic, belief_delta refers to the beliefs on this topic
+        :param chunk_size:          int, max. number of buffered events
+        :param compression_level:   int, zlib level (1: fast)
+        :param record_unseen:       bool, whether to record the received posts that were not seen as well (needed for
+                                    the reach of posts, about half of the events)
+        :param metadata:            dict or None, additional (JSON-serializable) metadata, e.g., scenario & seed
+        """
+        self.path = path
+        self.model = model
+        self.topic = str(topic)
+        self.topic_index = topic.value
+        self.chunk_size = chunk_size
+        self.compression_level = compression_level
+        self.record_unseen = record_unseen
+        self.n_events = 0
+        self.n_bytes = 0
+
+        # Buffer: one typed array per column (in the order of COLUMNS)
+        self.columns = [array(typecode) for typecode in ('I', 'I', 'I', 'I', 'B', 'f')]
+        self.ticks, self.post_ids, self.sources, self.receivers, self.flags, self.belief_deltas = self.columns
+
+        header = {'n_agents': model.n_agents,
+                  'topic': str(topic),
+                  'record_unseen': record_unseen,
+                  'columns': [[name, dtype] for name, dtype in COLUMNS],
+                  'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        if metadata is not None:
+            header['metadata'] = metadata
+        header = json.dumps(header).encode('utf-8')
+
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(header)))
+        self.file.write(header)
+        self.file.write(np.ascontiguousarray(model.belief_array[:, self.topic_index], dtype='<f8').tobytes())
+
+    def record_receiver(self, receiver, received_posts, seen_posts, judged_as_truthful, belief_deltas):
+        """
+        Records the events of one receiver in the current tick (one call per receiver, instead of one per event).
+        :param receiver:            BaseAgent
+        :param received_posts:      list of Posts, all posts the receiver received (incl. the seen ones)
+        :param seen_posts:          list of Posts
+        :param judged_as_truthful:  list of bools, per seen post
+        :param belief_deltas:       list of floats, per seen post
+        """
+        tick = self.model.schedule.steps + 1  # the tick that is being run (as in TickSnapshot.tick)
+        if self.record_unseen:
+            seen = {post.unique_id for post in seen_posts}
+            unseen_posts = [post for post in received_posts if post.unique_id not in seen]
+            posts = seen_posts + unseen_posts
+        else:
+            unseen_posts = []
+            posts = seen_posts
+        n_events = len(posts)
+
+        self.ticks.extend([tick] * n_events)
+        self.post_ids.extend([post.unique_id for post in posts])
+        self.sources.extend([post.source.unique_id for post in posts])
+        self.receivers.extend([receiver.unique_id] * n_events)
+        self.flags.extend([SEEN | JUDGED_TRUTHFUL if judged else SEEN for judged in judged_as_truthful])
+        self.flags.frombytes(bytes(len(unseen_posts)))  # unseen: no flags
+        self.belief_deltas.extend(belief_deltas)
+        self.belief_deltas.frombytes(bytes(4 * len(unseen_posts)))  # unseen: 0.0
+
+        if len(self.ticks) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered events as one chunk."""
+        n_events = len(self.ticks)
+        if n_events == 0:
+            return
+
+        data = zlib.compress(b''.join(column.tobytes() for column in self.columns), self.compression_level)
+        self.file.write(CHUNK_HEADER.pack(n_events, len(data)))
+        self.file.write(data)
+
+        for column in self.columns:
+            del column[:]
+        self.n_events += n_events
+        self.n_bytes += CHUNK_HEADER.size + len(data)
+
+    def close(self):
+        """Writes the remaining events & closes the file."""
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Reading
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+class EventTrace:
+    """
+    Reads an event trace (written by EventTraceWriter) chunk by chunk, so memory stays bounded by the chunk size.
+    """
+
+    def __init__(self, path):
+        """
+        :param path:    str
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            magic, version, header_length = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{path} is not an event trace (version {VERSION}).')
+            self.header = json.loads(file.read(header_length).decode('utf-8'))
+            self.initial_beliefs = np.frombuffer(file.read(8 * self.header['n_agents']), dtype='<f8').copy()
+            self.data_offset = file.tell()
+
+        self.n_agents = self.header['n_agents']
+        self.metadata = self.header.get('metadata', {})
+
+    def chunks(self):
+        """
+        Incomplete chunks at the end (e.g., of an aborted run) are skipped.
+        :return:    generator of dicts, {column name: np.ndarray} (+ 'seen' & 'judged_truthful' as bool arrays)
+        """
+        with open(self.path, 'rb') as file:
+            file.seek(self.data_offset)
+            while True:
+                chunk_header = file.read(CHUNK_HEADER.size)
+                if len(chunk_header) < CHUNK_HEADER.size:
+                    return
+                n_events, n_bytes = CHUNK_HEADER.unpack(chunk_header)
+                data = file.read(n_bytes)
+                if len(data) < n_bytes:
+                    return
+                data = zlib.decompress(data)
+
+                chunk = {}
+                offset = 0
+                for name, dtype in COLUMNS:
+                    column = np.frombuffer(data, dtype=dtype, count=n_events, offset=offset)
+                    chunk[name] = column
+                    offset += column.nbytes
+                chunk['seen'] = (chunk['flags'] & SEEN) > 0
+                chunk['judged_truthful'] = (chunk['flags'] & JUDGED_TRUTHFUL) > 0
+                yield chunk
+
+    def events(self):
+        """
+        Reads the whole trace at once (for small traces).
+        :return:    pd.DataFrame, one row per event
+        """
+        import pandas as pd
+
+        columns = ['tick', 'post_id', 'source', 'receiver', 'seen', 'judged_truthful', 'belief_delta']
+        frames = [pd.DataFrame({name: chunk[name] for name in columns}) for chunk in self.chunks()]
+        if len(frames) == 0:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+#   Replay
+# ––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––––
+
+def replay_kpis(path, kpis=None, n_ticks=None):
+    """
+    Recomputes the online KPIs per tick from the initial beliefs & the belief deltas of a trace, without rerunning the
+    simulation. (Beliefs are reconstructed from float32 deltas, i.e., up to ~1e-4 belief points after 60 ticks.)
+    :param path:    str, event trace
+    :param kpis:    dict or None, {name: BeliefKPI} (default: default_kpis())
+    :param n_ticks: int or None, number of ticks of the run (default: the last tick with events)
+    :return:        pd.DataFrame, one row per tick (index: tick, 0 = start)
+    """
+    import pandas as pd
+    from kpis import KPITracker, default_kpis
+
+    trace = EventTrace(path)
+    if kpis is None:
+        kpis = default_kpis()
+
+    belief_array = np.zeros((trace.n_agents, len(Topic)))
+    topic = [t for t in Topic if str(t) == trace.header['topic']][0]
+    beliefs = belief_array[:, topic.value]
+    beliefs[:] = trace.initial_beliefs
+
+    tracker = KPITracker(belief_array)
+    for name, kpi in kpis.items():
+        if kpi.topic.value != topic.value:
+            raise ValueError(f'KPI {name} is not on the traced topic ({topic}).')
+        tracker.register(name, kpi)
+
+    rows = [tracker.values()]
+    tick = 0
+
+    def advance(to_tick):
+        # Ticks up to to_tick are complete
+        nonlocal tick
+        while tick < to_tick:
+            tick += 1
+            if tick > 1:
+                rows.append(tracker.values())
+            tracker.start_tick()
+
+    for chunk in trace.chunks():
+        changed = chunk['belief_delta'] != 0
+        ticks = chunk['tick'][changed]
+        receivers = chunk['receiver'][changed]
+        deltas = chunk['belief_delta'][changed].astype(float)
+
+        # Per tick (in the order of the events): new belief = belief before the tick + cumulative deltas (per receiver)
+        boundaries = np.flatnonzero(np.diff(ticks)) + 1
+        for tick_receivers, tick_deltas, tick_ticks in zip(np.split(receivers, boundaries),
+                                                           np.split(deltas, boundaries),
+                                                           np.split(ticks, boundaries)):
+            if len(tick_ticks) == 0:
+                continue
+            advance(int(tick_ticks[0]))
+
+            order = np.argsort(tick_receivers, kind='stable')  # keeps the order of the events per receiver
+            sorted_receivers = tick_receivers[order]
+            sorted_deltas = tick_deltas[order]
+            starts = np.flatnonzero(np.r_[True, sorted_receivers[1:] != sorted_receivers[:-1]])
+            cumulative = np.cumsum(sorted_deltas)
+            offsets = np.repeat(cumulative[starts] - sorted_deltas[starts], np.diff(np.r_[starts, len(order)]))
+            new_beliefs = beliefs[sorted_receivers] + cumulative - offsets
+            old_beliefs = new_beliefs - sorted_deltas
+
+            tracker.update_many(topic.value, old_beliefs, new_beliefs)
+            ends = np.r_[starts[1:], len(order)] - 1
+            beliefs[sorted_receivers[ends]] = new_beliefs[ends]
+
+    advance(max(tick, n_ticks if n_ticks is not None else 0) + 1)
+
+    return pd.DataFrame(rows).rename_axis('tick')
+
+
+def post_exposure_stats(path):
+    """
+    Cascade statistics per post (posts are not reshared in the model, so a post's cascade is its direct exposure):
+    how many agents received, saw and accepted (i.e., judged as truthful) it, and how much it moved their beliefs.
+    (If the trace was recorded with record_unseen=False, n_received only counts the agents that saw the post.)
+    :param path:    str, event trace
+    :return:        pd.DataFrame, one row per post with events (index: post_id)
+    """
+    import pandas as pd
+
+    trace = EventTrace(path)
+    columns = {'source': [], 'tick': [], 'n_received': [], 'n_seen': [], 'n_accepted': [],
+               'belief_shift': [], 'abs_belief_shift': []}
+    post_ids = []
+
+    # Per chunk: partial sums per post (a post's events may span two chunks --> summed again below)
+    for chunk in trace.chunks():
+        ids, inverse = np.unique(chunk['post_id'], return_inverse=True)
+        n = len(ids)
+        deltas = chunk['belief_delta'].astype(float)
+        first = np.zeros(n, dtype=int)
+        first[inverse[::-1]] = np.arange(len(inverse))[::-1]
+
+        post_ids.append(ids)
+        columns['source'].append(chunk['source'][first])
+        columns['tick'].append(chunk['tick'][first])
+        columns['n_received'].append(np.bincount(inverse, minlength=n))
+        columns['n_seen'].append(np.bincount(inverse, weights=chunk['seen'], minlength=n))
+        columns['n_accepted'].append(np.bincount(inverse, weights=chunk['judged_truthful'], minlength=n))
+        columns['belief_shift'].append(np.bincount(inverse, weights=deltas, minlength=n))
+        columns['abs_belief_shift'].append(np.bincount(inverse, weights=np.abs(deltas), minlength=n))
+
+    if len(post_ids) == 0:
+        return pd.DataFrame(columns=list(columns)).rename_axis('post_id')
+
+    stats = pd.DataFrame({name: np.concatenate(values) for name, values in columns.items()},
+                         index=pd.Index(np.concatenate(post_ids), name='post_id'))
+    stats = stats.groupby(level=0).agg({'source': 'first', 'tick': 'first', 'n_received': 'sum', 'n_seen': 'sum',
+                                        'n_accepted': 'sum', 'belief_shift': 'sum', 'abs_belief_shift': 'sum'})
+    return stats.astype({'n_received': int, 'n_seen': int, 'n_accepted': int})
+
+
+def cascade_summary(path):
+    """
+    Summary of the cascades (see post_exposure_stats) of a trace.
+    :param path:    str, event trace
+    :return:        dict
+    """
+    stats = post_exposure_stats(path)
+    n_received = stats['n_received'].sum()
+
+    return {'n_posts': len(stats),
+            'n_events': int(n_received),
+            'mean_reach': float(stats['n_received'].mean()),
+            'max_reach': int(stats['n_received'].max()),
+            'mean_seen': float(stats['n_seen'].mean()),
+            'seen_rate': float(stats['n_seen'].sum() / n_received),
+            'acceptance_rate': float(stats['n_accepted'].sum() / max(stats['n_seen'].sum(), 1)),
+            'mean_abs_belief_shift': float(stats['abs_belief_shift'].mean()),
+            'top_sources_by_belief_shift': stats.groupby('source')['abs_belief_shift'].sum()
+                                                .nlargest(5).round(3).to_dict()}
+
+
+if __name__ == '__main__':
+
+    import sys
+
+    for trace_path in sys.argv[1:]:
+        print(f'{trace_path}: {EventTrace(trace_path).metadata}')
+        print(replay_kpis(trace_path).tail().to_string())
+        print(cascade_summary(trace_path))
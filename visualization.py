@@ -1,11 +1,81 @@
 import matplotlib.colors as colors
 import matplotlib.cm as cmx
 from matplotlib import pyplot as plt
+import numpy as np
 from numpy import interp
-from mesa.visualization.modules import ChartModule, NetworkModule
-from mesa.visualization.ModularVisualization import ModularServer
+from mesa.visualization.modules import ChartModule
+from mesa.visualization.ModularVisualization import ModularServer, VisualizationElement
 
 from agents import *
+from network import DynamicNetwork
+
+
+def build_belief_color_lut(cmap_name='PiYG', n_entries=256):
+    """
+    Precomputes the lookup table (LUT) that maps belief bins to colors. Belief domain [0,100] is split into n_entries
+    equally wide bins, exactly like matplotlib does when it maps a normalized value onto a colormap.
+    With PiYG, a diverging colormap:
+          100 --> green
+          50 --> white
+          0 --> red
+    :param cmap_name:   str, name of the matplotlib colormap
+    :param n_entries:   int, number of bins/colors
+    :return:            np.ndarray, (n_entries, 3) with (r,g,b) floats per bin
+    """
+    c_norm = colors.Normalize(vmin=0, vmax=100)  # because belief can be any value in [0,100]
+    scalar_map = cmx.ScalarMappable(norm=c_norm, cmap=plt.get_cmap(cmap_name, n_entries))
+
+    bin_beliefs = (np.arange(n_entries) + 0.5) / n_entries * 100  # center of each bin
+    rgba = scalar_map.to_rgba(bin_beliefs)
+    rgb = rgba[:, :3] * 256  # only adjust RGB, not transparency
+
+    return rgb
+
+
+# Computed once (at import), instead of once per node on every redraw
+BELIEF_RGB_LUT = build_belief_color_lut()
+BELIEF_COLOR_LUT = [f'rgb{tuple(c_val)}' for c_val in BELIEF_RGB_LUT.tolist()]  # as css color strings
+
+
+# Series of the charts (labels of the model reporters of data_collector & data_collector2)
+AVG_BELIEF_SERIES = [{"Label": "Avg Vax-Belief", "Color": "blue"},
+                     {"Label": "Avg Vax-Belief above threshold", "Color": "green"},
+                     {"Label": "Avg Vax-Belief below threshold", "Color": "red"}]
+
+INDIVIDUAL_BELIEF_SERIES = [{"Label": "Agent 0", "Color": "#FFCA03"},    # yellow
+                            {"Label": "Agent 1", "Color": "#FF9300"},    # orange
+                            {"Label": "Agent 2", "Color": "#F90716"},    # red
+                            {"Label": "Agent 3", "Color": "#FF00E4"},    # pink
+                            {"Label": "Agent 4", "Color": "#9C19E0"},    # purple
+                            {"Label": "Agent 5", "Color": "#3E00FF"},    # blue
+                            {"Label": "Agent 6", "Color": "#3EDBF0"},    # light blue
+                            {"Label": "Agent 7", "Color": "#54E346"},    # light green
+                            {"Label": "Agent 8", "Color": "#27AA80"},    # green
+                            {"Label": "Agent 9", "Color": "#D06224"},    # brown
+                            {"Label": "Agent 10", "Color": "#000000"}]   # black
+
+
+def get_color_indices(beliefs):
+    """
+    Maps the beliefs (vectorized) onto the bins of the belief color LUT.
+    :param beliefs:     array-like of floats, domain [0,100]
+    :return:            np.ndarray of ints, domain [0, len(BELIEF_COLOR_LUT))
+    """
+    n_entries = len(BELIEF_COLOR_LUT)
+    beliefs = np.asarray(beliefs, dtype=float)
+    color_indices = (beliefs / 100 * n_entries).astype(int)
+    color_indices = np.clip(color_indices, 0, n_entries - 1)
+
+    return color_indices
+
+
+def get_node_colors(beliefs) -> list:
+    """
+    Returns the css color strings of all provided beliefs (vectorized over the belief array).
+    :param beliefs:     array-like of floats, domain [0,100]
+    :return:            list of str, e.g., ['rgb(142.4, 1.0, 82.0)', ...]
+    """
+    return [BELIEF_COLOR_LUT[idx] for idx in get_color_indices(beliefs)]
 
 
 def get_node_color(agent):
@@ -15,23 +85,278 @@ def get_node_color(agent):
     :return: c_val, tuple: (r,g,b)  all three are floats
     """
     belief = agent.beliefs[str(Topic.VAX)]
-    # Map belief value to color value
-    # with PiYG, a diverging colormap:
-    #       100 --> green
-    #       50 --> white
-    #       0 --> red
-    c_norm = colors.Normalize(vmin=0, vmax=100)  # because belief can be any value in [0,100]
-    scalar_map = cmx.ScalarMappable(norm=c_norm, cmap=plt.get_cmap('PiYG'))
-
-    c_val = scalar_map.to_rgba(belief)
-    new_c_val = []
-    for idx, val in enumerate(c_val):
-        if idx != 3:  # only adjust RGB, not transparency
-            new_c_val.append(val * 256)
-    c_val = tuple(new_c_val)
+    # Map belief value to color value (via the precomputed LUT)
+    idx = get_color_indices([belief])[0]
+    c_val = tuple(BELIEF_RGB_LUT[idx].tolist())
     return c_val
 
 
+class IncrementalNetworkModule(VisualizationElement):
+    """
+    Network visualization (with d3) that only sends what changed.
+    The static structure (nodes & edges) is sent once per model. Afterwards, each tick only the colors of the nodes
+    that moved to another color bin are sent.
+
+    For large networks (more than max_nodes agents), a level of detail can be chosen (see LevelOfDetail). The sample or
+    the clusters are chosen once per model and cached, and at most edge_budget edges are rendered.
+
+    A dynamic network (see MisinfoPy's dynamic_network) is shown as a snapshot of its edges when the model is first
+    rendered; afterwards, only the beliefs are updated (rewired edges are not redrawn).
+    """
+    package_includes = ["d3.min.js"]
+    local_includes = ["js/IncrementalNetworkModule_d3.js"]
+
+    def __init__(self, canvas_height=500, canvas_width=500, level_of_detail=LevelOfDetail.SAMPLE, max_nodes=1000,
+                 edge_budget=10000):
+        """
+        :param canvas_height:   int
+        :param canvas_width:    int
+        :param level_of_detail: LevelOfDetail, used if the network has more than max_nodes nodes
+        :param max_nodes:       int, maximal number of rendered nodes (i.e., sample size or number of clusters)
+        :param edge_budget:     int, maximal number of rendered edges
+        """
+        super().__init__()
+        self.canvas_height = canvas_height
+        self.canvas_width = canvas_width
+        self.level_of_detail = level_of_detail
+        self.max_nodes = max_nodes
+        self.edge_budget = edge_budget
+        self.js_code = f"elements.push(new IncrementalNetworkModule({canvas_width}, {canvas_height}));"
+
+        # State of what the browser currently shows
+        self.model = None
+        self.network = None  # StaticNetwork, the edges that are shown
+        self.color_indices = None
+
+        # Cached per model: which agents are shown (SAMPLE) or which cluster each agent belongs to (CLUSTERS)
+        self.sample = None
+        self.cluster_labels = None
+        self.cluster_sizes = None
+
+    def render(self, model, beliefs=None, network=None):
+        """
+        :param model:   MisinfoPy
+        :param beliefs: np.ndarray or None, snapshot of the beliefs on Topic.VAX (default: the model's current beliefs)
+        :param network: StaticNetwork or None, the edges to show for a new model (default: see static_snapshot())
+        :return:        dict, either {'type': 'full', 'nodes': [...], 'edges': [...]}
+                        or {'type': 'update', 'colors': {node_index: color}}
+        """
+        # A new model (e.g., after a reset): choose what to show & send the whole network
+        if model is not self.model:
+            self.model = model
+            self.network = network if network is not None else static_snapshot(model.network)
+            self.select_level_of_detail(model)
+            color_indices = get_color_indices(self.get_displayed_beliefs(model, beliefs))
+            portrayal = self.full_portrayal(model, color_indices)
+        else:
+            color_indices = get_color_indices(self.get_displayed_beliefs(model, beliefs))
+            changed = np.flatnonzero(color_indices != self.color_indices)
+            portrayal = {'type': 'update',
+                         'colors': {int(idx): BELIEF_COLOR_LUT[color_indices[idx]] for idx in changed}}
+
+        self.color_indices = color_indices
+
+        return portrayal
+
+    def select_level_of_detail(self, model):
+        """
+        Chooses (once per model) the sample or the clusters that will be shown.
+        :param model:   MisinfoPy
+        """
+        network = self.network
+        self.sample = None
+        self.cluster_labels = None
+        self.cluster_sizes = None
+
+        if network.n_nodes <= self.max_nodes or self.level_of_detail.__eq__(LevelOfDetail.FULL):
+            return
+
+        if self.level_of_detail.__eq__(LevelOfDetail.SAMPLE):
+            self.sample = degree_stratified_sample(network.n_followers, self.max_nodes)
+        elif self.level_of_detail.__eq__(LevelOfDetail.CLUSTERS):
+            self.cluster_labels = hub_clusters(network, self.max_nodes)
+            self.cluster_sizes = np.bincount(self.cluster_labels)
+
+    def get_displayed_beliefs(self, model, beliefs=None):
+        """
+        :param model:   MisinfoPy
+        :param beliefs: np.ndarray or None, snapshot of the beliefs on Topic.VAX (default: the model's current beliefs)
+        :return:        np.ndarray, beliefs of the displayed nodes (i.e., agents or mean belief of clusters)
+        """
+        if beliefs is None:
+            beliefs = model.get_vax_beliefs()
+        beliefs = np.asarray(beliefs, dtype=float)
+
+        if self.sample is not None:
+            beliefs = beliefs[self.sample]
+        elif self.cluster_labels is not None:
+            beliefs = np.bincount(self.cluster_labels, weights=beliefs) / self.cluster_sizes
+
+        return beliefs
+
+    def full_portrayal(self, model, color_indices):
+        """
+        Portrays the whole (displayed) network. The model ensures there is always 1 agent per node.
+        :param model:           MisinfoPy
+        :param color_indices:   np.ndarray, bins of the belief color LUT (one per displayed node)
+        :return:                dict,   {'type': 'full',
+                                         'nodes': [portrayal_details],
+                                         'edges': [portrayal_details]}
+        """
+        network = self.network
+        sources = np.repeat(np.arange(network.n_nodes), network.n_followers)
+        targets = network.indices
+        widths = np.ones(len(targets))
+
+        if self.sample is not None:
+            node_ids = self.sample
+            tooltips = [f"{agent_id}" for agent_id in node_ids.tolist()]
+            sizes = np.full(len(node_ids), 5)
+
+            # Only edges among the sampled agents, renamed to their position in the sample
+            position = np.full(network.n_nodes, -1)
+            position[node_ids] = np.arange(len(node_ids))
+            among_sample = (position[sources] >= 0) & (position[targets] >= 0)
+            sources, targets = position[sources[among_sample]], position[targets[among_sample]]
+            widths = widths[among_sample]
+
+        elif self.cluster_labels is not None:
+            tooltips = [f"cluster {cluster}: {size} agents" for cluster, size in enumerate(self.cluster_sizes.tolist())]
+            sizes = 3 + 2 * np.log1p(self.cluster_sizes)
+
+            # Edges between clusters, weighted by how many agent-edges they contain
+            sources, targets = self.cluster_labels[sources], self.cluster_labels[targets]
+            between_clusters = sources != targets
+            pairs, counts = np.unique(np.stack([sources[between_clusters], targets[between_clusters]]), axis=1,
+                                      return_counts=True)
+            order = np.argsort(-counts, kind='stable')  # strongest connections first
+            sources, targets = pairs[0][order], pairs[1][order]
+            widths = 0.5 + np.log1p(counts[order]) / 2
+
+        else:
+            tooltips = [f"{agent_id}" for agent_id in range(network.n_nodes)]
+            sizes = np.full(network.n_nodes, 5)
+
+        # Respect the edge budget (the same edges are kept for the whole run)
+        if len(targets) > self.edge_budget:
+            if self.cluster_labels is not None:
+                kept = np.arange(self.edge_budget)
+            else:
+                kept = np.sort(np.random.default_rng(0).choice(len(targets), self.edge_budget, replace=False))
+            sources, targets, widths = sources[kept], targets[kept], widths[kept]
+
+        portrayal = dict()
+        portrayal['type'] = 'full'
+        portrayal['nodes'] = [{"shape": "circle",
+                               "color": BELIEF_COLOR_LUT[color_idx],
+                               "size": size,
+                               "tooltip": tooltip
+                               }
+                              for color_idx, size, tooltip in zip(color_indices.tolist(), sizes.tolist(), tooltips)]
+
+        portrayal['edges'] = [{'source': source,
+                               'target': target,
+                               'color': 'black',
+                               'width': width,
+                               # to adjust line-width based on edge-weight, use instead:
+                               # 'width': get_edge_width(network.weight(source, target)),
+                               'directed': True
+                               }
+                              for source, target, width in zip(sources.tolist(), targets.tolist(), widths.tolist())]
+
+        return portrayal
+
+
+def static_snapshot(network):
+    """
+    :param network: StaticNetwork or DynamicNetwork
+    :return:        StaticNetwork, the network itself or a (CSR) snapshot of the current edges of a dynamic network
+    """
+    if isinstance(network, DynamicNetwork):
+        return network.to_static()
+
+    return network
+
+
+def degree_stratified_sample(n_followers, n_select, n_strata=10, seed=0):
+    """
+    Samples agents such that all degree classes are represented. The agents are stratified by their (log) number of
+    followers and each stratum is sampled proportionally to its size, but with at least 1 agent per stratum.
+    Like this, the few hubs are still shown even in a small sample.
+    :param n_followers: np.ndarray, number of followers per agent
+    :param n_select:    int, sample size
+    :param n_strata:    int, number of degree classes
+    :param seed:        int, random seed (the sample should be reproducible)
+    :return:            np.ndarray, sorted ids of the sampled agents
+    """
+    rng = np.random.default_rng(seed)
+    log_degrees = np.log1p(n_followers)
+    edges = np.linspace(log_degrees.min(), log_degrees.max(), n_strata + 1)[1:-1]
+    strata = np.digitize(log_degrees, edges)
+
+    stratum_sizes = np.bincount(strata, minlength=n_strata)
+    quotas = np.minimum(stratum_sizes, np.maximum(np.round(stratum_sizes / len(strata) * n_select), 1))
+    quotas[stratum_sizes == 0] = 0
+
+    # Remove surplus (due to rounding & minimum of 1) from the biggest strata
+    while quotas.sum() > n_select:
+        quotas[np.argmax(quotas)] -= 1
+
+    sample = [rng.choice(np.flatnonzero(strata == stratum), int(quota), replace=False)
+              for stratum, quota in enumerate(quotas) if quota > 0]
+
+    return np.sort(np.concatenate(sample))
+
+
+def hub_clusters(network, n_clusters):
+    """
+    Partitions the agents into clusters around the agents with the most followers (hubs). Every agent joins the
+    cluster of its closest hub (multi-source breadth first search, ignoring edge directions).
+    Agents that cannot reach any hub form one additional cluster; then only n_clusters - 1 hubs are used, so that there
+    are never more than n_clusters clusters.
+    :param network:     StaticNetwork
+    :param n_clusters:  int
+    :return:            np.ndarray, cluster label per agent, domain [0, n_clusters)
+    """
+    hubs = np.argsort(-network.n_followers, kind='stable')[:n_clusters]
+    labels = nearest_hub_labels(network, hubs)
+    if np.any(labels < 0):
+        hubs = hubs[:n_clusters - 1]
+        labels = nearest_hub_labels(network, hubs)
+        labels[labels < 0] = len(hubs)
+
+    return labels
+
+
+def nearest_hub_labels(network, hubs):
+    """
+    :param network: StaticNetwork
+    :param hubs:    np.ndarray, agent ids
+    :return:        np.ndarray, per agent: index (in hubs) of its closest hub, or -1 if it cannot reach any hub
+    """
+    labels = np.full(network.n_nodes, -1)
+    labels[hubs] = np.arange(len(hubs))
+    frontier = hubs
+
+    while len(frontier) > 0:
+        owners, neighbors = [], []
+        for indptr, indices in ((network.indptr, network.indices), (network.rev_indptr, network.rev_indices)):
+            starts, ends = indptr[frontier], indptr[frontier + 1]
+            counts = ends - starts
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+            neighbors.append(indices[offsets + np.arange(counts.sum())])
+            owners.append(np.repeat(frontier, counts))
+        owners, neighbors = np.concatenate(owners), np.concatenate(neighbors)
+
+        # Unlabeled neighbors join the cluster of the first frontier agent that reaches them
+        unlabeled = labels[neighbors] < 0
+        neighbors, first = np.unique(neighbors[unlabeled], return_index=True)
+        labels[neighbors] = labels[owners[unlabeled][first]]
+        frontier = neighbors
+
+    return labels
+
+
 def get_edge_width(weight=1, weight_borders=(0, 100)):
     """
     Returns how wide the edge should be displayed.
@@ -54,7 +379,10 @@ def show_visualization(model,
                        n_edges=3,
                        agent_ratio=None,
                        media_literacy_intervention=(0.0, SelectAgentsBy.RANDOM),
-                       ranking_intervention=False):
+                       ranking_intervention=False,
+                       level_of_detail=LevelOfDetail.SAMPLE,
+                       max_nodes=1000,
+                       edge_budget=10000):
     """
     Internal function to show the visualization.
     :param model:       MisinfoPy
@@ -63,57 +391,20 @@ def show_visualization(model,
     :param agent_ratio: dict {user_type: percentage}
     :param media_literacy_intervention:  tuple: (percentage_reached, how_to_select_agents)  (float, Enum)
     :param ranking_intervention:         boolean
+    :param level_of_detail:              LevelOfDetail, how to render networks with more than max_nodes agents
+    :param max_nodes:                    int, maximal number of rendered nodes
+    :param edge_budget:                  int, maximal number of rendered edges
     """
 
     if agent_ratio is None:
         agent_ratio = {NormalUser.__name__: 0.9, Disinformer.__name__: 0.1}
 
-    def network_portrayal(G):
-        """
-        Internal function to portray a network.
-        :param G:   Graph, MultiDiGraph
-        :return:    dict,   {'nodes': [portrayal_details],
-                             'edges': [portrayal_details]}
-        """
-        # The model ensures there is always 1 agent per node
-        portrayal = dict()
-        portrayal['nodes'] = [{"shape": "circle",
-                               "color": f'rgb{get_node_color(agent)}',
-                               "size": 5,
-                               "tooltip": f"{round(agent.unique_id)}"
-                               }
-                              for (id, agent) in G.nodes.data("agent")]
-
-        portrayal['edges'] = [{'source': source,
-                               'target': target,
-                               'color': 'black',
-                               'width': 1,
-                               # to adjust line-width based on edge-weight, use instead:
-                               # 'width': get_edge_width(G.edges[source, target, key]['weight']),
-                               'directed': True
-                               }
-                              for (source, target, key) in G.edges]
-
-        return portrayal
-
-    network = NetworkModule(network_portrayal, 500, 500, library='d3')
-    chart_avg_belief = ChartModule([{"Label": "Avg Vax-Belief", "Color": "blue"},
-                                    {"Label": "Avg Vax-Belief above threshold", "Color": "green"},
-                                    {"Label": "Avg Vax-Belief below threshold", "Color": "red"}],
-                                   data_collector_name="data_collector")
-
-    chart_indiv_belief = ChartModule([{"Label": "Agent 0", "Color": "#FFCA03"},    # yellow
-                                      {"Label": "Agent 1", "Color": "#FF9300"},    # orange
-                                      {"Label": "Agent 2", "Color": "#F90716"},    # red
-                                      {"Label": "Agent 3", "Color": "#FF00E4"},    # pink
-                                      {"Label": "Agent 4", "Color": "#9C19E0"},    # purple
-                                      {"Label": "Agent 5", "Color": "#3E00FF"},    # blue
-                                      {"Label": "Agent 6", "Color": "#3EDBF0"},    # light blue
-                                      {"Label": "Agent 7", "Color": "#54E346"},    # light green
-                                      {"Label": "Agent 8", "Color": "#27AA80"},    # green
-                                      {"Label": "Agent 9", "Color": "#D06224"},    # brown
-                                      {"Label": "Agent 10", "Color": "#000000"}],  # black
-                                     data_collector_name="data_collector2")
+    network = IncrementalNetworkModule(500, 500,
+                                       level_of_detail=level_of_detail,
+                                       max_nodes=max_nodes,
+                                       edge_budget=edge_budget)
+    chart_avg_belief = ChartModule(AVG_BELIEF_SERIES, data_collector_name="data_collector")
+    chart_indiv_belief = ChartModule(INDIVIDUAL_BELIEF_SERIES, data_collector_name="data_collector2")
 
     server = ModularServer(model,  # class name
                            [network, chart_avg_belief, chart_indiv_belief],